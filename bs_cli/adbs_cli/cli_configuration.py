@@ -24,6 +24,7 @@ class ApiEndpoints(str, Enum):
     DEPLOYMENT_REVERT = "ioc/deployment/revert"
     DEPLOYMENT_STATUS = "deployment/{task_id}/status"
     DEPLOYMENT_REPORT = "deployment/{task_id}/report"
+    DEPLOYMENT_EVENTS = "deployment/{task_id}/events"
     DEPLOYMENT_INFO = "deployment/info"
     DEPLOYMENT_FACILITIY = "deployments/{component_name}/{facility}"
     DEPLOYMENT_INITIAL = "initial/deployment"
@@ -136,11 +136,67 @@ def generate_deployment_report(file_content: str, component_name: str, tag: str)
         click.echo(line, nl=False)
     click.echo(f"Report downloaded successfully to {file_path}")
 
+ELOG_WAIT_SECONDS = 60 # How long to wait for a queued ELOG entry after the deployment completes
+
+def follow_deployment_events(task_id: str) -> dict:
+    """Follow the deployment's event stream, return the final event, or None if the stream is unavailable.
+    A completed deployment's ELOG entry is sent in the background, so the stream is followed up to
+    ELOG_WAIT_SECONDS longer for the elog_url"""
+    events_request = Request(api=Api.DEPLOYMENT)
+    events_request.set_endpoint(ApiEndpoints.DEPLOYMENT_EVENTS,
+                                task_id=task_id)
+    try:
+        response = events_request.get_streaming_request(log=False)
+        if (not response.ok): # ex: older deployment controller without the events endpoint
+            return None
+        final_event = None
+        elog_deadline = None
+        for line in response.iter_lines(chunk_size=1024):
+            if (elog_deadline and datetime.now() > elog_deadline):
+                break
+            if not line:
+                continue
+            event = json.loads(line.decode('utf-8'))
+            # Display progress and status here
+            progress = event.get("progress", None)
+            if (progress):   # \033[K clears from cursor to end of line
+                click.echo(f"\r\033[K{progress['percent']}% - {progress['current_step']}  ", nl=False)
+            if (final_event and event.get("result")): # ELOG entry sent (or given up on)
+                final_event["result"] = event["result"]
+            if (event.get("status") in ("completed", "failed")):
+                final_event = event
+                if ((event.get("result") or {}).get("elog_status") != "pending"):
+                    break
+                click.echo("\n== ADBS == Waiting for the ELOG entry...", nl=False)
+                elog_deadline = datetime.now() + timedelta(seconds=ELOG_WAIT_SECONDS)
+            elif (final_event and (final_event.get("result") or {}).get("elog_status") != "pending"):
+                break
+        return final_event
+    except Exception as e:
+        logging.info(f"Deployment event stream unavailable, polling instead: {e}")
+    return None
+
 def poll_deployment(response, deployment_status_request: Request):
-    """Poll deployment until complete, return (report_response, elog_url)"""
+    """Follow deployment until complete, return (report_response, elog_url)"""
     data = response.json()
     task_id = data.get("task_id", None)
     elog_url = ""
+    final_event = follow_deployment_events(task_id)
+    if (final_event and final_event["status"] == "completed"):
+        elog_url = (final_event.get("result") or {}).get("elog_url", "")
+        click.echo("\n== ADBS == Completed deployment. ")
+    elif (final_event):
+        click.echo(f"\n== ADBS == Deployment failed: {final_event.get('error')}")
+    else:
+        elog_url = poll_deployment_status(task_id, deployment_status_request)
+    # Download report
+    deployment_status_request.set_endpoint(ApiEndpoints.DEPLOYMENT_REPORT,
+                                            task_id=task_id)
+    return deployment_status_request.get_request(log=False), elog_url
+
+def poll_deployment_status(task_id: str, deployment_status_request: Request) -> str:
+    """Poll deployment status until complete (fallback when the event stream is unavailable), return elog_url"""
+    elog_url = ""
     sleep(2) # Wait a bit for deployment status
     for _ in range(30):  # 5 min max
         deployment_status_request.set_endpoint(ApiEndpoints.DEPLOYMENT_STATUS,
@@ -159,10 +215,7 @@ def poll_deployment(response, deployment_status_request: Request):
             break
 
         sleep(10)
-    # Download report
-    deployment_status_request.set_endpoint(ApiEndpoints.DEPLOYMENT_REPORT,
-                                            task_id=task_id)
-    return deployment_status_request.get_request(log=False), elog_url
+    return elog_url
 
 @click.command()
 def configure_user():
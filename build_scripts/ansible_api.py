@@ -1,6 +1,7 @@
 import os
+import time
+import selectors
 import subprocess
-import sys
 import logging
 
 logger = logging.getLogger('my_logger')
@@ -31,42 +32,84 @@ def run_ansible_playbook(inventory: str, playbook: str, host_pattern: str, extra
         logger.info(f"Running ansible playbook...\n{command}")
         return run_process(command, custom_env, return_output)
 
-def run_process(command: list, custom_env: dict, return_output: bool = False):
-    # Determine the appropriate arguments based on the Python version
-    if sys.version_info >= (3, 7):
-        # For Python 3.7 and above
-        text = {
-            'text': True
-        }
-    else:
-        # For Python 3.6 and below
-        text = {
-            'universal_newlines': True
-        }
+# ProcessOutputStats, read_process_lines and run_process are the same in build_scripts/ansible_api.py and
+# deploy_controller/ansible_api.py, each image only ships its own copy (checked by test_process_lines.py)
+class ProcessOutputStats(object):
+    """ Throughput counter for the output of a process, per stream """
+    def __init__(self):
+        self.start_time = time.monotonic()
+        self.end_time = None
+        self.lines = {'stdout': 0, 'stderr': 0}
+        self.bytes = {'stdout': 0, 'stderr': 0}
 
-    # Use subprocess.Popen to forward output directly
+    def add(self, stream_name: str, line: str):
+        self.lines[stream_name] += 1
+        self.bytes[stream_name] += len(line)
+
+    def finish(self):
+        self.end_time = time.monotonic()
+
+    def elapsed(self) -> float:
+        return (self.end_time or time.monotonic()) - self.start_time
+
+    def summary(self) -> str:
+        total_kb = sum(self.bytes.values()) / 1024
+        elapsed = self.elapsed()
+        rate = total_kb / elapsed if elapsed > 0 else 0.0
+        return "stdout: {} lines / {:.1f} KB, stderr: {} lines / {:.1f} KB, {:.1f}s ({:.1f} KB/s)".format(
+            self.lines['stdout'], self.bytes['stdout'] / 1024, self.lines['stderr'], self.bytes['stderr'] / 1024,
+            elapsed, rate)
+
+def read_process_lines(process: subprocess.Popen):
+    """ Yield (stream_name, line) from a binary Popen's stdout and stderr in arrival order.
+        Both pipes are drained together, so a process writing heavily to one can't stall on the other """
+    selector = selectors.DefaultSelector()
+    partial_lines = {}
+    for stream_name, stream in (('stdout', process.stdout), ('stderr', process.stderr)):
+        selector.register(stream, selectors.EVENT_READ, stream_name)
+        partial_lines[stream_name] = b''
+    while selector.get_map():
+        for key, _ in selector.select():
+            stream_name = key.data
+            data = os.read(key.fd, 65536)
+            if not data: # EOF
+                selector.unregister(key.fileobj)
+                key.fileobj.close()
+                if partial_lines[stream_name]:
+                    yield stream_name, partial_lines[stream_name].decode('utf-8', errors='replace')
+                continue
+            lines = (partial_lines[stream_name] + data).split(b'\n')
+            partial_lines[stream_name] = lines.pop()
+            for line in lines:
+                yield stream_name, line.decode('utf-8', errors='replace') + '\n'
+    selector.close()
+
+def run_process(command: list, custom_env: dict, return_output: bool = False, stats: ProcessOutputStats = None):
+    """ Run command, draining stdout and stderr together as lines arrive.
+        return_output: return (stdout, stderr, return_code), otherwise log each line in arrival order
+        (stderr lines tagged with [stderr]) and return the return_code.
+        stats: optional ProcessOutputStats filled with the output volume of the process """
+    stats = stats or ProcessOutputStats()
     process = subprocess.Popen(
         command,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        **text,
         env=custom_env
     )
 
-    if (return_output):
-        # Capture the output and error streams
-        stdout, stderr = process.communicate()
-        return stdout, stderr, process.returncode
-
-    # logger.info output in real-time
-    for line in iter(process.stdout.readline, ''):
-        logger.debug(line.strip())  # Print each line as it is output
-
-    # Ensure all stderr is also handled
-    for line in iter(process.stderr.readline, ''):
-        logger.debug(line.strip())
-
-    process.stdout.close()
-    process.stderr.close()
+    outputs = {'stdout': [], 'stderr': []}
+    for stream_name, line in read_process_lines(process):
+        stats.add(stream_name, line)
+        if (return_output):
+            outputs[stream_name].append(line)
+        elif (stream_name == 'stderr'):
+            logger.debug('[stderr] ' + line.rstrip('\n'))
+        else:
+            logger.debug(line.rstrip('\n'))  # Print each line as it is output
     return_code = process.wait()
-    return return_code
\ No newline at end of file
+    stats.finish()
+    logger.info("Process output: " + stats.summary())
+
+    if (return_output):
+        return ''.join(outputs['stdout']), ''.join(outputs['stderr']), return_code
+    return return_code
@@ -1,12 +1,14 @@
 import sys
 import yaml
 import os
+import json
 import subprocess
 import requests
 from ansible_api import run_ansible_playbook, run_process
 from artifact_api import ArtifactApi
 from start_test import Test
 from logger_setup import setup_logger, switch_log_file
+from ioc_manifest import IOC_MANIFEST_NAME, new_ioc_manifest, scan_ioc_boot_dirs
 
 # Define exit codes
 EXIT_SUCCESS = 0
@@ -237,6 +239,8 @@ endif"""
                     logger.error(f"Failed to copy {src_path}: {str(e)}")
                     # Continue with other items
             
+            self.write_ioc_manifest(target_dir)
+
             # Create tarball
             tarball_path_user = tarball_path.replace("/mnt/eed/ad-build/scratch", "$AD_BUILD_SCRATCH")
             logger.info(f"Creating tarball {tarball_path_user}")
@@ -257,6 +261,17 @@ endif"""
             logger.error(f"Failed to package IOC: {str(e)}")
             raise
 
+    def write_ioc_manifest(self, app_dir: str):
+        """
+        Write the IOC manifest (folder, architecture, binary of every st.cmd under iocBoot/cpuBoot, see
+        ioc_manifest.py) into the packaged app dir, so deployments don't have to scan the release for it.
+        """
+        iocs = scan_ioc_boot_dirs(app_dir)
+        manifest_path = os.path.join(app_dir, IOC_MANIFEST_NAME)
+        with open(manifest_path, 'w') as f:
+            json.dump(new_ioc_manifest(iocs), f, indent=2)
+        logger.info(f"Wrote IOC manifest with {len(iocs)} IOCs to {manifest_path}")
+
     def run_build(self, config_yaml: dict, verbose: bool=False):
         """
         Run the build of the app, then create build_results directory
@@ -1,20 +1,28 @@
 import os
+import re
+import json
+import time
+import selectors
 import subprocess
-import sys
 import logging
+from collections import deque
 
 logger = logging.getLogger('my_logger')
 
 def run_ansible_playbook(inventory: str, playbook: str, host_pattern: str, extra_vars: str, custom_env: dict = None,
-                          return_output: bool = False, no_color: bool = False, check_mode: bool = False):
+                          return_output: bool = False, no_color: bool = False, check_mode: bool = False,
+                          extra_inventories: list = None, on_line=None, log_file: str = None,
+                          max_output_lines: int = None):
         if (no_color):
             os.environ['ANSIBLE_NOCOLOR'] = 'True'
         command = ['ansible-playbook']
         if (custom_env):
-            if (custom_env['ADBS_OS_ENVIRONMENT'].lower() == 'rhel7'): # Special case for rhel7
+            if (custom_env.get('ADBS_OS_ENVIRONMENT', '').lower() == 'rhel7'): # Special case for rhel7
                 command = ['python3', '-m', 'ansible', 'playbook']
+        command += ['-i', inventory]
+        for extra_inventory in (extra_inventories or []): # ex: generated group_vars for a batched run
+            command += ['-i', extra_inventory]
         command += [
-            '-i', inventory,
             '-l', host_pattern,
             playbook
         ]
@@ -29,44 +37,214 @@ def run_ansible_playbook(inventory: str, playbook: str, host_pattern: str, extra
             command += ['--check']
 
         logger.info(f"Running ansible playbook...\n{command}")
+        if (on_line or log_file or max_output_lines):
+            return run_process_streaming(command, custom_env, on_line, log_file, max_output_lines)
         return run_process(command, custom_env, return_output)
 
-def run_process(command: list, custom_env: dict, return_output: bool = False):
-    # Determine the appropriate arguments based on the Python version
-    if sys.version_info >= (3, 7):
-        # For Python 3.7 and above
-        text = {
-            'text': True
-        }
-    else:
-        # For Python 3.6 and below
-        text = {
-            'universal_newlines': True
-        }
-
-    # Use subprocess.Popen to forward output directly
+def run_ansible_adhoc(inventory: str, host_pattern: str, module: str, module_args: str, custom_env: dict = None):
+        """ Run one ansible module against host_pattern (ex: copy, stat), results in json (see parse_adhoc_json_output) """
+        command = ['ansible', host_pattern, '-i', inventory, '-m', module, '-a', module_args]
+        env = dict(custom_env or os.environ, ANSIBLE_LOAD_CALLBACK_PLUGINS='1', ANSIBLE_STDOUT_CALLBACK='json',
+                   ANSIBLE_NOCOLOR='True')
+        logger.info(f"Running ansible ad-hoc command...\n{command}")
+        return run_process(command, env, return_output=True)
+
+def parse_adhoc_json_output(stdout: str) -> dict:
+    """ Parse the output of run_ansible_adhoc(), returns {host: module result}.
+        Failed and unreachable hosts have 'failed' or 'unreachable' set in their result """
+    result = json.loads(stdout[stdout.index('{'):])
+    host_results = {}
+    for play in result.get('plays', []):
+        for task in play.get('tasks', []):
+            host_results.update(task.get('hosts', {}))
+    return host_results
+
+# Ansible default stdout callback lines, used for progress events
+TASK_LINE_PATTERN = re.compile(r'^(TASK|RUNNING HANDLER) \[(?P<task>.*)\]')
+PLAY_LINE_PATTERN = re.compile(r'^PLAY \[(?P<play>.*)\]')
+HOST_LINE_PATTERN = re.compile(r'^(?P<status>ok|changed|skipping|failed|fatal|unreachable): \[(?P<host>[^\]]+)\]')
+
+def parse_progress_line(line: str) -> dict:
+    """ Return a progress event for a line of ansible-playbook output, or None.
+        ex: 'TASK [Copy tarball] ****' -> {'type': 'task', 'task': 'Copy tarball'} """
+    match = TASK_LINE_PATTERN.match(line)
+    if match:
+        return {'type': 'task', 'task': match.group('task')}
+    match = HOST_LINE_PATTERN.match(line)
+    if match:
+        return {'type': 'host', 'status': match.group('status'), 'host': match.group('host')}
+    match = PLAY_LINE_PATTERN.match(line)
+    if match:
+        return {'type': 'play', 'play': match.group('play')}
+    if line.startswith('PLAY RECAP'):
+        return {'type': 'recap'}
+    return None
+
+def get_inventory_group_hosts(inventory: str, groups: list) -> dict:
+    """ Return {group: [hosts]} for each group, including hosts of child groups """
+    stdout, stderr, return_code = run_process(['ansible-inventory', '-i', inventory, '--list'], None, return_output=True)
+    if (return_code != 0):
+        raise RuntimeError(f"ansible-inventory failed: {stderr}")
+    inventory_dict = json.loads(stdout)
+
+    def resolve(group: str, seen: set) -> list:
+        if group in seen: # Guard against cyclic children
+            return []
+        seen.add(group)
+        hosts = list(inventory_dict.get(group, {}).get('hosts', []))
+        for child in inventory_dict.get(group, {}).get('children', []):
+            hosts += [host for host in resolve(child, seen) if host not in hosts]
+        return hosts
+    return {group: resolve(group, set()) for group in groups}
+
+def parse_json_callback_output(stdout: str) -> dict:
+    """ Parse the output of a playbook run with ANSIBLE_STDOUT_CALLBACK=json.
+        Returns {'stats': {host: {...}}, 'host_tasks': {host: [(task_name, status, msg)]}} """
+    # Skip anything printed before the json document (ex: warnings)
+    result = json.loads(stdout[stdout.index('{'):])
+    host_tasks = {}
+    for play in result.get('plays', []):
+        for task in play.get('tasks', []):
+            task_name = task.get('task', {}).get('name', '')
+            for host, host_result in task.get('hosts', {}).items():
+                if host_result.get('unreachable'):
+                    status = 'unreachable'
+                elif host_result.get('failed'):
+                    status = 'failed'
+                elif host_result.get('skipped'):
+                    status = 'skipping'
+                elif host_result.get('changed'):
+                    status = 'changed'
+                else:
+                    status = 'ok'
+                host_tasks.setdefault(host, []).append((task_name, status, host_result.get('msg', '')))
+    return {'stats': result.get('stats', {}), 'host_tasks': host_tasks}
+
+TRUNCATED_OUTPUT_PREFIX = "... (" # Start of the note run_process_streaming() puts in front of truncated output
+
+# ProcessOutputStats, read_process_lines and run_process are the same in build_scripts/ansible_api.py and
+# deploy_controller/ansible_api.py, each image only ships its own copy (checked by test_process_lines.py)
+class ProcessOutputStats(object):
+    """ Throughput counter for the output of a process, per stream """
+    def __init__(self):
+        self.start_time = time.monotonic()
+        self.end_time = None
+        self.lines = {'stdout': 0, 'stderr': 0}
+        self.bytes = {'stdout': 0, 'stderr': 0}
+
+    def add(self, stream_name: str, line: str):
+        self.lines[stream_name] += 1
+        self.bytes[stream_name] += len(line)
+
+    def finish(self):
+        self.end_time = time.monotonic()
+
+    def elapsed(self) -> float:
+        return (self.end_time or time.monotonic()) - self.start_time
+
+    def summary(self) -> str:
+        total_kb = sum(self.bytes.values()) / 1024
+        elapsed = self.elapsed()
+        rate = total_kb / elapsed if elapsed > 0 else 0.0
+        return "stdout: {} lines / {:.1f} KB, stderr: {} lines / {:.1f} KB, {:.1f}s ({:.1f} KB/s)".format(
+            self.lines['stdout'], self.bytes['stdout'] / 1024, self.lines['stderr'], self.bytes['stderr'] / 1024,
+            elapsed, rate)
+
+def read_process_lines(process: subprocess.Popen):
+    """ Yield (stream_name, line) from a binary Popen's stdout and stderr in arrival order.
+        Both pipes are drained together, so a process writing heavily to one can't stall on the other """
+    selector = selectors.DefaultSelector()
+    partial_lines = {}
+    for stream_name, stream in (('stdout', process.stdout), ('stderr', process.stderr)):
+        selector.register(stream, selectors.EVENT_READ, stream_name)
+        partial_lines[stream_name] = b''
+    while selector.get_map():
+        for key, _ in selector.select():
+            stream_name = key.data
+            data = os.read(key.fd, 65536)
+            if not data: # EOF
+                selector.unregister(key.fileobj)
+                key.fileobj.close()
+                if partial_lines[stream_name]:
+                    yield stream_name, partial_lines[stream_name].decode('utf-8', errors='replace')
+                continue
+            lines = (partial_lines[stream_name] + data).split(b'\n')
+            partial_lines[stream_name] = lines.pop()
+            for line in lines:
+                yield stream_name, line.decode('utf-8', errors='replace') + '\n'
+    selector.close()
+
+def run_process_streaming(command: list, custom_env: dict, on_line=None, log_file: str = None,
+                          max_output_lines: int = None, stats: ProcessOutputStats = None):
+    """ Run command, reading stdout/stderr incrementally instead of buffering them until exit.
+        on_line(stream_name, line) is called for every line as it arrives.
+        The full output is written to log_file (stderr lines prefixed with [stderr]), while only the last
+        max_output_lines of each stream are kept in memory and returned (None keeps everything).
+        stats: optional ProcessOutputStats filled with the output volume of the process
+        Returns stdout, stderr, return_code like run_process(return_output=True) """
     process = subprocess.Popen(
         command,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        **text,
         env=custom_env
     )
+    stats = stats or ProcessOutputStats()
+    tails = {'stdout': deque(maxlen=max_output_lines), 'stderr': deque(maxlen=max_output_lines)}
+    log = open(log_file, 'w') if log_file else None
+    try:
+        for stream_name, line in read_process_lines(process):
+            tails[stream_name].append(line)
+            stats.add(stream_name, line)
+            if log:
+                log.write(line if stream_name == 'stdout' else f"[stderr] {line}")
+            if on_line:
+                try:
+                    on_line(stream_name, line)
+                except Exception as e: # Progress reporting should never break the run
+                    logger.warning(f"on_line callback failed: {e}")
+    finally:
+        if log:
+            log.close()
+    return_code = process.wait()
+    stats.finish()
+    logger.info("Process output: " + stats.summary())
 
-    if (return_output):
-        # Capture the output and error streams
-        stdout, stderr = process.communicate()
-        return stdout, stderr, process.returncode
-
-    # logger.info output in real-time
-    for line in iter(process.stdout.readline, ''):
-        logger.debug(line.strip())  # Print each line as it is output
+    outputs = {}
+    for stream_name, tail in tails.items():
+        output = ''.join(tail)
+        truncated_lines = stats.lines[stream_name] - len(tail)
+        if truncated_lines > 0:
+            note = f" see {log_file}" if log_file else ""
+            output = f"{TRUNCATED_OUTPUT_PREFIX}{truncated_lines} earlier lines truncated,{note}) ...\n" + output
+        outputs[stream_name] = output
+    return outputs['stdout'], outputs['stderr'], return_code
 
-    # Ensure all stderr is also handled
-    for line in iter(process.stderr.readline, ''):
-        logger.debug(line.strip())
+def run_process(command: list, custom_env: dict, return_output: bool = False, stats: ProcessOutputStats = None):
+    """ Run command, draining stdout and stderr together as lines arrive.
+        return_output: return (stdout, stderr, return_code), otherwise log each line in arrival order
+        (stderr lines tagged with [stderr]) and return the return_code.
+        stats: optional ProcessOutputStats filled with the output volume of the process """
+    stats = stats or ProcessOutputStats()
+    process = subprocess.Popen(
+        command,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=custom_env
+    )
 
-    process.stdout.close()
-    process.stderr.close()
+    outputs = {'stdout': [], 'stderr': []}
+    for stream_name, line in read_process_lines(process):
+        stats.add(stream_name, line)
+        if (return_output):
+            outputs[stream_name].append(line)
+        elif (stream_name == 'stderr'):
+            logger.debug('[stderr] ' + line.rstrip('\n'))
+        else:
+            logger.debug(line.rstrip('\n'))  # Print each line as it is output
     return_code = process.wait()
-    return return_code
\ No newline at end of file
+    stats.finish()
+    logger.info("Process output: " + stats.summary())
+
+    if (return_output):
+        return ''.join(outputs['stdout']), ''.join(outputs['stderr']), return_code
+    return return_code
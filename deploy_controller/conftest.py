@@ -0,0 +1,8 @@
+"""
+Desc: pytest setup for the test_*.py modules. deployment_controller.py refuses to import without the
+ELOG credentials, the unit tests never send to ELOG so placeholders are enough
+"""
+import os
+
+os.environ.setdefault("ELOG_USER_PASSWORD", "test")
+os.environ.setdefault("ELOG_SW_LOG_ID", "test")
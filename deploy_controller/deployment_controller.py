@@ -6,11 +6,25 @@ note - this would have to run 24/7 as a service
 """
 import os
 import shutil
+import subprocess
 import uuid
 from ruamel.yaml import YAML # Using ruamel instead of pyyaml because it keeps the comments
 import logging
 import ansible_api
+import rollout
 import tarfile
+import hashlib
+from release_cache import ReleaseCache, link_file, link_tree, file_digest, owner_writable
+from http_client import HttpClient
+from read_cache import TtlCache
+from job_queue import JobQueue
+from locks import DeploymentLock, args_digest
+from workspace import WorkspaceManager
+from report_store import ReportStore
+from elog_outbox import ElogOutbox
+from prestage import PrestageRegistry
+from release_delta import merge_members, compute_delta, write_delta
+from ioc_manifest import IOC_MANIFEST_NAME, new_ioc_manifest, read_ioc_manifest, scan_ioc_boot_dirs
 import requests
 
 import redis
@@ -18,10 +32,15 @@ import uvicorn
 import json
 import time
 import asyncio
-from fastapi import FastAPI, BackgroundTasks, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
+import threading
+from contextlib import asynccontextmanager, ExitStack
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Request, Query, Header
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, Response
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, NamedTuple
+from types import MappingProxyType
 from datetime import datetime
 from dateutil import parser
 
@@ -42,12 +61,14 @@ if is_prod:
     BACKEND_URL = "https://ad-build.slac.stanford.edu/api/cbs/v1/"
     ELOG_ENDPOINT = "https://accel-webapp.slac.stanford.edu/api/elog-apptoken/v1/entries"
     ANSIBLE_PLAYBOOKS_PATH = "/sdf/group/ad/eed/ad-build/build-system-playbooks/"
+    REPORT_STORE_SHARED_PATH = "/sdf/group/ad/eed/ad-build/deployment-reports/reports.db"
     ELOG_URL_PREFIX = "https://accel-webapp.slac.stanford.edu/elog/"
     ELOG_URL_POSTFIX = "?logbooks=sw_log"
 else: 
     BACKEND_URL = "https://ad-build-dev.slac.stanford.edu/api/cbs/v1/"
     ELOG_ENDPOINT = "https://accel-webapp-dev.slac.stanford.edu/api/elog-apptoken/v1/entries"
     ANSIBLE_PLAYBOOKS_PATH = "/sdf/group/ad/eed/ad-build/dev-build-system-playbooks/"
+    REPORT_STORE_SHARED_PATH = "/sdf/group/ad/eed/ad-build/dev-deployment-reports/reports.db"
     ELOG_URL_PREFIX = "https://accel-webapp-dev.slac.stanford.edu/elog/"
     ELOG_URL_POSTFIX = "?logbooks=sw_log"
 
@@ -58,10 +79,29 @@ if (ELOG_USER_PASSWORD == None):
 if (ELOG_SW_LOG_ID == None):
     raise ValueError("Missing environment variable - ELOG_SW_LOG_ID")
 ELOG_HEADERS = {"x-vouch-idp-accesstoken": ELOG_USER_PASSWORD}
+# ELOG entries are queued in a redis outbox and sent in the background with retries (see elog_outbox.py),
+# sync and return_elog requests send inline first since the caller wants the elog_url in the response
+ELOG_SEND_INTERVAL = float(os.getenv("ELOG_SEND_INTERVAL", "5")) # seconds between outbox drains
+ELOG_BATCH_SIZE = int(os.getenv("ELOG_BATCH_SIZE", "10"))        # entries sent per drain
+ELOG_RATE_LIMIT = float(os.getenv("ELOG_RATE_LIMIT", "2"))       # max submissions per second per process
+ELOG_MAX_ATTEMPTS = int(os.getenv("ELOG_MAX_ATTEMPTS", "8"))     # backoff doubles from 30s, capped at 1 hour
 
 APP_PATH = "/app"
 REQUEST_TIMEOUT = 60  # seconds, for all external HTTP calls
 
+# Pooled keep-alive session shared by every backend/ELOG call (thread safe, used from deployment threads)
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))  # connections kept per host
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))             # retries for idempotent verbs only
+http_client = HttpClient(REQUEST_TIMEOUT, pool_maxsize=HTTP_POOL_MAXSIZE, retries=HTTP_RETRIES)
+
+# Release cache - tagged releases are kept on disk so repeat deployments of a tag skip the download
+RELEASE_CACHE_PATH = os.getenv("RELEASE_CACHE_PATH", f"{APP_PATH}/release_cache")
+RELEASE_CACHE_MAX_BYTES = int(os.getenv("RELEASE_CACHE_MAX_BYTES", str(20 * 1024**3))) # 20GB default
+release_cache = ReleaseCache(RELEASE_CACHE_PATH, RELEASE_CACHE_MAX_BYTES)
+
+# IOC manifest - IOC/CPU metadata parsed from the st.cmd files (see ioc_manifest.py), packaged with the release
+# at build time (Build.write_ioc_manifest in build_scripts/start_build.py) or cached per tag in the release cache
+
 # Container deployment secrets are loaded per-app from environment variables.
 # Naming convention: CONTAINER_{APP_KEY}_{SECRET}
 # where APP_KEY = component_name uppercased with hyphens replaced by underscores
@@ -80,6 +120,30 @@ USED_OS_LIST = ["rhel7", "rocky9"]
 
 FACILITIES_LIST = ["LCLS", "FACET", "TESTFAC", "DEV", "SANDBOX"]
 
+# Playbook output - only the last lines of each playbook are kept in memory and in the summary (ELOG, task
+# record), the full output is spilled to a log file and appended to the report file
+ANSIBLE_OUTPUT_TAIL_LINES = int(os.getenv("ANSIBLE_OUTPUT_TAIL_LINES", "2000"))
+PROGRESS_UPDATE_INTERVAL = 1 # seconds, minimum time between playbook progress writes to the task record
+
+# Facility rollout - how many facility playbooks run at once, overridable per request
+ROLLOUT_MAX_PARALLEL = int(os.getenv("ROLLOUT_MAX_PARALLEL", "4"))
+
+# Deployment concurrency (per uvicorn worker) - deployments run on their own bounded pool instead of the
+# event loop's default executor, requests over the limit wait on the event loop without holding a thread
+DEPLOYMENT_CONCURRENCY = int(os.getenv("DEPLOYMENT_CONCURRENCY", "4"))
+deployment_executor = ThreadPoolExecutor(max_workers=DEPLOYMENT_CONCURRENCY, thread_name_prefix="deployment")
+
+# Form of the merged multi-OS release handed to the ioc_deploy.yml playbook (passed as 'release_format')
+#   directory - the merged extracted directory only ('release_dir'), no tarball is written
+#   tar       - uncompressed tarball ('tarball'), cheap to write and to copy on a fast network
+#   tar.gz    - gzip tarball ('tarball'), compressed with pigz when installed
+MERGED_ARTIFACT_FORMATS = ["directory", "tar", "tar.gz"]
+MERGED_ARTIFACT_FORMAT = os.getenv("MERGED_ARTIFACT_FORMAT", "tar.gz")
+# Selective release - targeted IOC deployments only materialize the boot dirs of the IOCs being deployed and
+# the bin/lib arch dirs they run on, common runtime dirs (db, dbd, ...) are always kept (passed as 'selective_release')
+SELECTIVE_RELEASE = os.getenv("SELECTIVE_RELEASE", "false").lower() == "true"
+RELEASE_ARCH_DIRS = ["bin", "lib"]
+
 yaml = YAML()
 yaml.default_flow_style = False  # Make the output more readable
 
@@ -94,28 +158,76 @@ class DeploymentTask:
         self.temp_dir = None
         self.result = None
         self.error = None
+        self.component_lookup = None # ComponentLookup for the deployed component, not saved to redis
 
     def update_progress(self, step: str, percent: int, details: str = None):
         self.progress = {"current_step": step, "percent": percent, "details": details}
         self.updated_at = datetime.now().isoformat()
         self.status = "running"
         if self.save_callback:
-            self.save_callback(self)  # Auto-save
+            self.save_callback(self, ["status", "progress", "updated_at"])  # Auto-save
     
     def complete(self, result):
         self.status = "completed"
         self.result = result
         self.progress["percent"] = 100
+        self.updated_at = datetime.now().isoformat()
         if self.save_callback:
-            self.save_callback(self)  # Auto-save
+            self.save_callback(self, ["status", "result", "progress", "updated_at"])  # Auto-save
     
     def fail(self, error):
         self.status = "failed"
         self.error = error
         self.updated_at = datetime.now().isoformat()
         if self.save_callback:
-            self.save_callback(self)  # Auto-save
+            self.save_callback(self, ["status", "error", "updated_at"])  # Auto-save
         
+class DeploymentSlots(object):
+    """ Bounded deployment concurrency with queue depth counters, only used from the event loop thread """
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.semaphore = None # Created on first use so it binds to uvicorn's running loop
+        self.queued = 0
+        self.running = 0
+        self.finished = 0
+        self.max_queued = 0
+        self.total_wait_s = 0.0
+
+    def is_full(self) -> bool:
+        return self.running + self.queued >= self.limit
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.limit)
+        start = time.monotonic()
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.queued -= 1
+        self.total_wait_s += time.monotonic() - start
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self.finished += 1
+            self.semaphore.release()
+
+    def stats(self) -> dict:
+        started = self.running + self.finished
+        return {'limit': self.limit, 'queued': self.queued, 'running': self.running, 'finished': self.finished,
+                'max_queued': self.max_queued,
+                'avg_wait_ms': round(self.total_wait_s * 1000 / started, 1) if started else 0.0}
+
+deployment_slots = DeploymentSlots(DEPLOYMENT_CONCURRENCY)
+
+async def run_blocking(func, *args):
+    """ Run a short blocking call (ex: a deployment db lookup) off the event loop """
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
 # Redis for storing task information
 redis_client = redis.Redis(
     host='redis',  # k8s service name
@@ -124,35 +236,113 @@ redis_client = redis.Redis(
     db=0
 )
 
-def save_task(task: DeploymentTask):
-    """Save task to Redis"""
-    task_dict = {
-        "task_id": task.task_id,
-        "status": task.status,
-        "progress": task.progress,
-        "started_at": task.started_at,
-        "updated_at": task.updated_at,
-        "result": task.result,
-        "error": task.error
-    }
-    # Auto-expire after 10 mins
-    redis_client.setex(f"task:{task.task_id}", 600, json.dumps(task_dict))
+# Short-TTL cache of deployment db reads, keyed by (facility, component). Writes through the helpers
+# below invalidate the entry. DB_CACHE_BACKEND=redis shares the cache (and invalidation) between workers
+DB_CACHE_TTL = float(os.getenv("DB_CACHE_TTL", "30")) # seconds
+DB_CACHE_BACKEND = os.getenv("DB_CACHE_BACKEND", "memory").lower()
+_cache_redis_getter = (lambda: redis_client) if DB_CACHE_BACKEND == "redis" else None
+component_cache = TtlCache("component", DB_CACHE_TTL, _cache_redis_getter)
+deployment_logs_cache = TtlCache("deployment_logs", DB_CACHE_TTL, _cache_redis_getter)
+
+# Task workspaces (/app/tmp/<task_id>) - ref counted, deleted by the janitor once released (see workspace.py)
+WORKSPACE_LINGER = int(os.getenv("WORKSPACE_LINGER", "600"))      # seconds a finished deployment's report stays downloadable
+WORKSPACE_MAX_AGE = int(os.getenv("WORKSPACE_MAX_AGE", str(6 * 3600))) # seconds, deleted once unreferenced or its holder is gone
+WORKSPACE_HEARTBEAT_TIMEOUT = int(os.getenv("WORKSPACE_HEARTBEAT_TIMEOUT", "300")) # seconds without a heartbeat before a holder is gone
+WORKSPACE_JANITOR_INTERVAL = int(os.getenv("WORKSPACE_JANITOR_INTERVAL", "60"))
+workspaces = WorkspaceManager(f"{APP_PATH}/tmp", lambda: redis_client, WORKSPACE_LINGER, WORKSPACE_MAX_AGE,
+                              WORKSPACE_HEARTBEAT_TIMEOUT)
+
+# Deployment reports - kept gzip compressed in a SQLite report store (see report_store.py) so they stay
+# downloadable after the task record and workspace are gone. Defaults to the shared /sdf/group/ad volume
+# so every controller pod and deployment_worker.py see the same reports. That is NFS, where SQLite's WAL
+# mode isn't safe, so the rollback journal is used unless REPORT_STORE_JOURNAL_MODE says otherwise
+REPORT_STORE_PATH = os.getenv("REPORT_STORE_PATH", REPORT_STORE_SHARED_PATH)
+REPORT_STORE_JOURNAL_MODE = os.getenv("REPORT_STORE_JOURNAL_MODE", "DELETE") # WAL only for a pod-local path
+REPORT_RETENTION_DAYS = int(os.getenv("REPORT_RETENTION_DAYS", "365")) # 0 keeps reports forever
+report_store = ReportStore(REPORT_STORE_PATH, journal_mode=REPORT_STORE_JOURNAL_MODE)
+
+# Deployment locks - one deployment per (component, facility) at a time across workers, see locks.py
+DEPLOYMENT_LOCK_TTL = int(os.getenv("DEPLOYMENT_LOCK_TTL", "60"))                    # seconds, renewed while held
+DEPLOYMENT_LOCK_WAIT_TIMEOUT = int(os.getenv("DEPLOYMENT_LOCK_WAIT_TIMEOUT", "3600")) # seconds to wait for a busy facility
+# Request fields left out of the playbook args digest, deployments that only differ by these still coalesce
+COALESCE_IGNORED_ARGS = ('user', 'coalesce', 'priority', 'sync', 'return_elog', 'max_parallel_facilities',
+                         'canary_facilities', 'abort_on_failure', 'batch_facilities')
+
+# Prestaging - PUT /deployment/prestage copies and verifies a release on the target hosts ahead of the deployment,
+# deployments of the same artifact then pass the staged copy to the playbook (see prestage.py)
+PRESTAGE_DIR = os.getenv("PRESTAGE_DIR", "/var/tmp/adbs_prestage") # on the target hosts
+PRESTAGE_TTL = int(os.getenv("PRESTAGE_TTL", str(7 * 24 * 3600)))    # seconds a staged copy is trusted
+PRESTAGE_FORMATS = ["tar", "tar.gz"] # merged_artifact_format values that can be prestaged
+prestage_registry = PrestageRegistry(lambda: redis_client, PRESTAGE_TTL)
+
+# Delta transfer - with delta_transfer in the request, facilities running an older tag get only the files changed
+# since that tag ('delta_tarball' + 'delta_manifest', see release_delta.py). Both tags must be in the release cache
+DELTA_MAX_RATIO = float(os.getenv("DELTA_MAX_RATIO", "0.5")) # full release instead when more than this fraction changed
+
+# Revert fast path - the last REVERT_KEEP_RELEASES tags deployed to each facility stay pinned in the release cache
+# (and are kept on the hosts by the playbook, passed as 'keep_releases'), so a revert to a pinned tag only switches
+# the IOCs back to the old release ('switch_only') instead of transferring it again. The tarball is still passed
+# as a fallback for hosts that no longer have the release
+REVERT_KEEP_RELEASES = int(os.getenv("REVERT_KEEP_RELEASES", "3"))
+REVERT_PRIORITY = int(os.getenv("REVERT_PRIORITY", "100")) # job queue priority of reverts, ahead of deployments
+
+# Job queue - with JOB_QUEUE_ENABLED, PUT /deployment queues the deployment in redis and deployment_worker.py
+# processes run it, otherwise it runs in the uvicorn worker that got the request
+JOB_QUEUE_ENABLED = os.getenv("JOB_QUEUE_ENABLED", "false").lower() in ("true", "1", "yes", "y")
+JOB_VISIBILITY_TIMEOUT = int(os.getenv("JOB_VISIBILITY_TIMEOUT", "900")) # seconds without a heartbeat before a job is requeued
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+job_queue = JobQueue(lambda: redis_client, "deployments", JOB_VISIBILITY_TIMEOUT, JOB_MAX_ATTEMPTS)
+
+# Task records - a redis hash per task (each field json encoded) so progress updates only rewrite the fields
+# that changed, plus a redis stream of every update for GET /deployment/{task_id}/events
+TASK_TTL = 600 # seconds, records and event streams auto-expire 10 mins after the last update
+TASK_FIELDS = ["task_id", "status", "progress", "started_at", "updated_at", "result", "error"]
+TASK_TERMINAL_STATUSES = ("completed", "failed")
+TASK_EVENTS_MAXLEN = 1000          # updates kept per task stream (approximate trim)
+TASK_EVENTS_POLL_INTERVAL = 0.25   # seconds between stream reads while an events client is connected
+TASK_EVENTS_KEEPALIVE = 15         # seconds of silence before an events client is sent a heartbeat line
+
+def task_key(task_id: str) -> str:
+    return f"task:{task_id}"
+
+def task_events_key(task_id: str) -> str:
+    return f"task:{task_id}:events"
+
+def save_task(task: DeploymentTask, fields: list = None):
+    """Save task fields (all by default) to Redis in one round trip, and publish them on the task's event stream"""
+    values = {field: json.dumps(getattr(task, field)) for field in (fields or TASK_FIELDS)}
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hset(task_key(task.task_id), mapping=values)
+    pipe.expire(task_key(task.task_id), TASK_TTL)
+    pipe.xadd(task_events_key(task.task_id), values, maxlen=TASK_EVENTS_MAXLEN, approximate=True)
+    pipe.expire(task_events_key(task.task_id), TASK_TTL)
+    pipe.execute()
 
 def get_task(task_id: str) -> DeploymentTask:
     """Load task from Redis"""
-    data = redis_client.get(f"task:{task_id}")
+    data = redis_client.hgetall(task_key(task_id))
     if not data:
         return None
     
-    task_dict = json.loads(data)
-    task = DeploymentTask(task_dict["task_id"], save_callback=save_task)
-    task.status = task_dict["status"]
-    task.progress = task_dict["progress"]
-    task.result = task_dict["result"]
-    task.error = task_dict["error"]
-    # Restore datetime fields if needed
+    task_dict = {field: json.loads(value) for field, value in data.items()}
+    task = DeploymentTask(task_id, save_callback=save_task)
+    task.status = task_dict.get("status", task.status)
+    task.progress = task_dict.get("progress", task.progress)
+    task.result = task_dict.get("result")
+    task.error = task_dict.get("error")
+    task.started_at = task_dict.get("started_at", task.started_at)
+    task.updated_at = task_dict.get("updated_at", task.updated_at)
     return task
 
+def format_task_event(event_id: str, values: dict) -> dict:
+    """Decode a task stream entry, the result is trimmed to what GET /deployment/{task_id}/status returns"""
+    event = {"event_id": event_id}
+    event.update({field: json.loads(value) for field, value in values.items()})
+    if event.get("result"):
+        event["result"] = {"summary": event["result"].get("summary"), "elog_url": event["result"].get("elog_url", ""),
+                           "elog_status": event["result"].get("elog_status")}
+    return event
+
 # pydantic models =================================================================================
 class Component(BaseModel):
     component_name: str
@@ -162,6 +352,7 @@ class RevertDict(Component):
     facility: str
     ioc_list: Optional[list] = None
     reboot_iocs: Optional[bool] = False
+    switch_only: Optional[bool] = None # Default: switch if the release is kept on the hosts, False transfers it again
 
 class DeployDict(Component):
     """Unified deployment request model. The playbook field determines app type and which
@@ -172,9 +363,21 @@ class DeployDict(Component):
     playbook: str                          # e.g. "ioc_module/ioc_deploy.yml"
     facilities: Optional[list] = None
     dry_run: Optional[bool] = False
+    # Rollout - facilities in canary_facilities are deployed first, the rest after they finish
+    max_parallel_facilities: Optional[int] = None  # Defaults to ROLLOUT_MAX_PARALLEL
+    canary_facilities: Optional[list] = None        # ex: ["DEV"]
+    abort_on_failure: Optional[bool] = False        # Skip facilities that haven't started once one fails
+    batch_facilities: Optional[bool] = False        # IOC only - one playbook run covers every facility
+    coalesce: Optional[bool] = False # Reuse the outcome of a running deployment of the same tag to a facility
     return_elog: Optional[bool] = False
     # IOC-specific
     ioc_list: Optional[list] = None
+    merged_artifact_format: Optional[str] = None # One of MERGED_ARTIFACT_FORMATS, defaults to MERGED_ARTIFACT_FORMAT
+    selective_release: Optional[bool] = None # Only ship the IOCs in ioc_list, defaults to SELECTIVE_RELEASE
+    use_prestaged: Optional[bool] = True # Use a copy staged by PUT /deployment/prestage when every host has it
+    delta_transfer: Optional[bool] = False # Ship only the files changed since the tag deployed on each facility
+    switch_only: Optional[bool] = False # IOC only - the release is already on the hosts (revert), only switch to it
+    skip_unchanged: Optional[bool] = False # IOC only - leave out IOCs already at tag (see POST /deployment/plan)
     reboot_iocs: Optional[bool] = False
     # PyDM-specific
     subsystem: Optional[str] = ""
@@ -194,6 +397,7 @@ class DeployDict(Component):
     extra_vars: Optional[dict] = None
     # When True, blocks until deployment completes and returns full result (used by CBS webhook)
     sync: Optional[bool] = False
+    priority: Optional[int] = 0 # Job queue only - higher priority deployments are picked up first
 
 class InitialDeploymentDict(Component):
 # Used for the initial deployment endpoint
@@ -227,7 +431,8 @@ def add_log_to_component(facility: str, timestamp: str, user: str, component_to_
         "user": user,
     }
     endpoint = BACKEND_URL + f'deployments/{component_to_update}/{facility}/logs'
-    response = requests.post(endpoint, json=deployment_log, timeout=REQUEST_TIMEOUT)
+    response = http_client.post(endpoint, 'POST deployments/{component}/{facility}/logs', json=deployment_log)
+    deployment_logs_cache.invalidate((facility, component_to_update))
     return True
 
 def add_new_component(facility: str, app_type: str, component_name: str,
@@ -252,7 +457,8 @@ def add_new_component(facility: str, app_type: str, component_name: str,
 
     logging.debug(f"new_component: {new_component}")
     endpoint = BACKEND_URL + 'deployments'
-    response = requests.post(endpoint, json=new_component, timeout=REQUEST_TIMEOUT)
+    response = http_client.post(endpoint, 'POST deployments', json=new_component)
+    component_cache.invalidate((facility, component_name))
     return True
 
 def update_component_in_facility(facility: str, app_type: str, component_to_update: str,
@@ -260,8 +466,8 @@ def update_component_in_facility(facility: str, app_type: str, component_to_upda
     """
     Function to update an existing component in the deployment db
     """
-    # 1) Find the component
-    component = find_component_in_facility(facility, component_to_update)
+    # 1) Find the component, read from the db since the cached copy may predate another worker's write
+    component = find_component_in_facility(facility, component_to_update, use_cache=False)
     if (component is None):
         return False
     # 2) Update tag in original config dict
@@ -286,30 +492,47 @@ def update_component_in_facility(facility: str, app_type: str, component_to_upda
     # 4) Update component in db
     logging.debug(component)
     endpoint = BACKEND_URL + f'deployments/{component_to_update}/{facility}'
-    response = requests.put(endpoint, json=component, timeout=REQUEST_TIMEOUT)
+    response = http_client.put(endpoint, 'PUT deployments/{component}/{facility}', json=component)
+    component_cache.invalidate((facility, component_to_update))
     logging.debug(f"response.json(): {response.json()}")
     return True
 
-def find_component_in_facility(facility: str, component_to_find: str) -> dict:
-    """ Function to return component information """
+def find_component_in_facility(facility: str, component_to_find: str, use_cache: bool = True,
+                               raise_errors: bool = False) -> dict:
+    """ Function to return component information, None if it isn't deployed to the facility
+        use_cache: False to bypass the read cache, for read-modify-write updates
+        raise_errors: raise RuntimeError for a failed lookup (other than not found) instead of returning None """
+    if (use_cache):
+        found, component = component_cache.get((facility, component_to_find))
+        if (found):
+            return component
     endpoint = BACKEND_URL + f'deployments/{component_to_find}/{facility}'
-    response = requests.get(endpoint, timeout=REQUEST_TIMEOUT)
+    response = http_client.get(endpoint, 'GET deployments/{component}/{facility}')
     if (response.ok):
-        return response.json()['payload']
+        component = response.json()['payload']
+        component_cache.set((facility, component_to_find), component)
+        return component
     else: 
+        if (response.status_code == 404): # Only cache not found, other errors may be transient
+            component_cache.set((facility, component_to_find), None)
+        elif (raise_errors):
+            raise RuntimeError(f"Looking up {component_to_find} in {facility} failed with status {response.status_code}")
         return None
 
 def find_recent_deployment_for_component_facility(facility: str, component_to_find: str, deployment_index: int) -> dict:
     """ Function to return recent deployment information 
         deployment_index: 0 is the most recent, 1 is second most recent, etc.
     """
-    endpoint = BACKEND_URL + f'deployments/{component_to_find}/{facility}/logs'
-    response = requests.get(endpoint, timeout=REQUEST_TIMEOUT)
-    if (response.ok):
-        payload = response.json()['payload']
-    else: 
-        logging.debug(f"Unable to find deployment for {component_to_find}, at {facility}, at index {deployment_index}")
-        return None
+    found, payload = deployment_logs_cache.get((facility, component_to_find))
+    if (not found):
+        endpoint = BACKEND_URL + f'deployments/{component_to_find}/{facility}/logs'
+        response = http_client.get(endpoint, 'GET deployments/{component}/{facility}/logs')
+        if (response.ok):
+            payload = response.json()['payload']
+            deployment_logs_cache.set((facility, component_to_find), payload)
+        else: 
+            logging.debug(f"Unable to find deployment for {component_to_find}, at {facility}, at index {deployment_index}")
+            return None
     # Check if we have at least 2 deployments occured
     if len(payload) < 2:
         return {}  # or raise an exception if you prefer
@@ -321,17 +544,101 @@ def find_recent_deployment_for_component_facility(facility: str, component_to_fi
     
     return sorted_payload[deployment_index]
 
-def find_facility_an_ioc_is_in(ioc_to_find: str, component_with_ioc: str) -> list:
+class ComponentLookup(object):
+    """ Memo of find_component_in_facility() results for one component, kept for the lifetime of a
+        deployment task. The first lookup fetches every facility in FACILITIES_LIST concurrently, so
+        resolving many IOCs to facilities is one parallel round of backend calls.
+        Failed lookups (backend errors) read as None and aren't memoized, the next lookup retries them """
+    def __init__(self, component_name: str):
+        self.component_name = component_name
+        self.components = {}
+        self.lock = threading.Lock()
+
+    def prefetch(self, facilities: list):
+        with self.lock:
+            missing = [facility for facility in dict.fromkeys(facilities) if facility not in self.components]
+            if not missing:
+                return
+            def lookup(facility: str) -> tuple:
+                try:
+                    return True, find_component_in_facility(facility, self.component_name, raise_errors=True)
+                except (requests.exceptions.RequestException, RuntimeError) as e:
+                    logging.warning(f"Unable to look up {self.component_name} in {facility}: {e}")
+                    return False, None
+            with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+                for facility, (found, component) in zip(missing, executor.map(lookup, missing)):
+                    if (found):
+                        self.components[facility] = component
+
+    def get(self, facility: str) -> dict:
+        """ Same as find_component_in_facility(facility, component_name) """
+        self.prefetch(FACILITIES_LIST + [facility])
+        return self.components.get(facility)
+
+    def all(self) -> dict:
+        """ Return {facility: component or None} for every facility in FACILITIES_LIST """
+        self.prefetch(FACILITIES_LIST)
+        return {facility: self.components.get(facility) for facility in FACILITIES_LIST}
+
+def find_facility_an_ioc_is_in(ioc_to_find: str, component_with_ioc: str, lookup: ComponentLookup = None) -> list:
     """ Function to return the facility(s) that the ioc is in """
+    lookup = lookup or ComponentLookup(component_with_ioc)
     facilities_the_ioc_exist_in = []
-    for facility in FACILITIES_LIST: # Loop through each facility
-        component = find_component_in_facility(facility, component_with_ioc)
+    for facility, component in lookup.all().items(): # Loop through each facility
         if (component):
             for ioc in component['dependsOn']: # Loop through each ioc
                 if (ioc_to_find in ioc['name']):
                     facilities_the_ioc_exist_in.append(facility)
     return facilities_the_ioc_exist_in
 
+def resolve_ioc_facilities(deploy_request: DeployDict, lookup: ComponentLookup) -> dict:
+    """ Return {facility: [IOC names]} an IOC deployment request covers, same rules as deploy_ioc_sync():
+        component-only (no ioc_list), IOCs to the given facilities, or IOCs to the facilities they are in.
+        Raises ValueError for an IOC that isn't in any facility """
+    if not deploy_request.ioc_list:
+        return {facility: [] for facility in deploy_request.facilities or []}
+    if deploy_request.facilities:
+        return {facility: list(deploy_request.ioc_list) for facility in deploy_request.facilities}
+    facilities_ioc_dict = {}
+    for ioc in deploy_request.ioc_list:
+        facilities = find_facility_an_ioc_is_in(ioc, deploy_request.component_name, lookup)
+        if len(facilities) == 0:
+            raise ValueError(f"IOC not found in deployment database: {ioc}. (If new IOC then please deploy with a facility)")
+        for facility in facilities:
+            facilities_ioc_dict.setdefault(facility, []).append(ioc)
+    return facilities_ioc_dict
+
+def plan_facility(component: dict, tag: str, ioc_names: list) -> dict:
+    """ What deploying tag to the ioc_names of a facility changes, from the facility's deployment db record
+        (None for a new component). 'skip' is set when nothing would change """
+    current_tag = component.get('tag') if component else None
+    deployed_iocs = {ioc['name']: ioc.get('tag') for ioc in (component or {}).get('dependsOn', [])}
+    plan = {"current_tag": current_tag, "new_component": component is None, "component_changes": current_tag != tag,
+            "changing": [], "new": [], "unchanged": []}
+    for name in ioc_names:
+        if name not in deployed_iocs:
+            plan["new"].append(name)
+        elif deployed_iocs[name] != tag:
+            plan["changing"].append({"name": name, "from": deployed_iocs[name], "to": tag})
+        else:
+            plan["unchanged"].append(name)
+    if ioc_names:
+        plan["skip"] = not plan["changing"] and not plan["new"]
+    else: # Component-only
+        plan["skip"] = not plan["component_changes"]
+    return plan
+
+def skip_unchanged_iocs(facilities_ioc_dict: dict, tag: str, lookup: ComponentLookup) -> dict:
+    """ Drop the IOCs already at tag from facilities_ioc_dict, and the facilities left with nothing to deploy """
+    remaining = {}
+    for facility, ioc_names in facilities_ioc_dict.items():
+        plan = plan_facility(lookup.get(facility), tag, ioc_names)
+        if plan["skip"]:
+            logging.info(f"Skipping {facility}, already at {tag}")
+            continue
+        remaining[facility] = [ioc['name'] for ioc in plan["changing"]] + plan["new"] if ioc_names else []
+    return remaining
+
 def extract_date(entry) -> datetime:
     return datetime.fromisoformat(entry['date'])
 
@@ -345,135 +652,496 @@ def create_tarball(directory, tag):
     except Exception as e:
         raise ValueError(f"Error creating tarball: {e}")
 
-def parse_shebang(shebang_line: str):
-    """ Function to extract architecture and binary name from the shebang line """
-    # 1) Get the part of the shebang line after 'bin/'
-    path = shebang_line.split('bin/')[1]  # Split after 'bin/'
-    
-    # 2) Split the path by '/' and get the relevant parts
-    parts = path.split('/')
-    
-    if len(parts) >= 2:
-        architecture = parts[0]  # First part is the architecture (e.g., rhel7-x86_64)
-        binary_name = parts[1]    # Second part is the binary name (e.g., myApp)
-        return architecture, binary_name
-    else:
-        logging.warning(f"Invalid path structure in shebang line: {shebang_line}")
-        return None, None
-
-def extract_ioc_cpu_shebang_info(app_dir_name: str) -> dict:
-    """ Function to process the st.cmd files """
-    # 1) Open and extract the tarball
-    # The directory containing 'iocBoot' is inside the app directory (app_dir_name)
-    iocBoot_dir = os.path.join(app_dir_name, 'iocBoot')
-    # TODO: Need to check cpuBoot as well
-
-    # 3) Check if the iocBoot directory exists
-    if not os.path.exists(iocBoot_dir):
-        logging.error(f"Directory {iocBoot_dir} does not exist in the extracted files.")
-        return []
-    
-    results = []
-
-    # 4) Iterate over the directories in iocBoot
-    for root, dirs, files in os.walk(iocBoot_dir):
-        # 4.1) Skip directories that do not contain st.cmd
-        if 'st.cmd' not in files:
-            continue  # Skip this directory
-
-        # 4.2) Process st.cmd if it's found
-        st_cmd_path = os.path.join(root, 'st.cmd')
-
-        # 4.3) Read the st.cmd file and parse the shebang
-        with open(st_cmd_path, 'r') as f:
-            first_line = f.readline().strip()  # Read the first line (shebang)
-            
-            if first_line.startswith("#!"):
-                architecture, binary_name = parse_shebang(first_line)
-                if architecture and binary_name:
-                    folder_name = os.path.basename(root)  # Get the folder name (e.g., ioc-b34-bs01)
-                    results.append({
-                        'folder_name': folder_name,
-                        'architecture': architecture,
-                        'binary': binary_name
-                    })
-            else:
-                logging.warning(f"No shebang line in {st_cmd_path}")
-    
-    return results
-
-def cleanup_temp_deployment_dir(directory: str):
-    """ for safe cleanup of temporary files (mainly the tarball for the tagged release). 
-        With this, the temporary files will be deleted even if exceptions are thrown"""
+def extract_ioc_cpu_shebang_info(app_dir_name: str, component_name: str = None, tag: str = None) -> list:
+    """ Return [{folder_name, architecture, binary, boot_dir}] for every IOC/CPU in the release.
+        Read from the manifest packaged in the release (Build.write_ioc_manifest), or the one cached for
+        (component_name, tag) on an earlier deployment, scanning st.cmd files only when neither exists """
     try:
-        # Wait a bit to ensure file has been sent
-        time.sleep(5)  
-        if os.path.exists(directory):
-            logging.info(f"Cleaning up temporary directory: {directory}")
-            shutil.rmtree(directory, ignore_errors=True)
-    except Exception as e:
-        logging.error(f"Error cleaning up directory {directory}: {str(e)}")
-
-def download_release_helper(endpoint: str, download_dir: str, tarball_name: str, extract_tarball: bool):
-    response = requests.get(endpoint, timeout=REQUEST_TIMEOUT)
-    # Download file from api, and extract to download_dir
+        with open(os.path.join(app_dir_name, IOC_MANIFEST_NAME), 'r') as f:
+            iocs = read_ioc_manifest(json.load(f))
+    except (OSError, ValueError):
+        iocs = None
+    if iocs is not None:
+        logging.info(f"Using the IOC manifest packaged in the release ({len(iocs)} IOCs)")
+        return iocs
+    if component_name and tag:
+        iocs = read_ioc_manifest(release_cache.load_metadata(component_name, tag, IOC_MANIFEST_NAME))
+        if iocs is not None:
+            logging.info(f"Using the cached IOC manifest for {component_name} {tag} ({len(iocs)} IOCs)")
+            return iocs
+
+    iocs = scan_ioc_boot_dirs(app_dir_name)
+    if component_name and tag:
+        try:
+            release_cache.save_metadata(component_name, tag, IOC_MANIFEST_NAME, new_ioc_manifest(iocs))
+        except OSError as e: # The cache is an optimization, the scan result is still good
+            logging.warning(f"Unable to cache the IOC manifest for {component_name} {tag}: {e}")
+    return iocs
+
+def startup_cmd_template_for(architecture: str, folder_name: str) -> str:
+    """ Figure out which startup.cmd template an IOC/CPU uses """
+    if ('linuxrt' in architecture.lower()):
+        if ('ioc' in folder_name):
+            return 'startup.cmd.linuxRT'
+        return 'startup.cmd.cpu'
+    elif ('rtems' in architecture.lower()):
+        return 'startup.cmd.rtems'
+    # We can assume if not linuxrt or rtems, then it is a softioc/cpu
+    if ('ioc' in folder_name.lower()):
+        return 'startup.cmd.soft'
+    return 'startup.cmd.soft.cpu'
+
+class IocInfo(NamedTuple):
+    """ Deployment metadata of one IOC/CPU of a release, shared (read-only) by every facility of a deployment """
+    name: str
+    architecture: str
+    binary: str
+    boot_dir: str
+    startup_cmd_template: str
+
+    def for_facility(self, facility: str) -> dict:
+        """ ioc_list entry of the playbook for a facility, CPUs use a per facility startup.cmd template """
+        ioc = self._asdict()
+        if ('cpu' in self.startup_cmd_template):
+            ioc['startup_cmd_template'] = f"{self.startup_cmd_template}.{facility.lower()}"
+        return ioc
+
+def build_ioc_index(ioc_info: list) -> MappingProxyType:
+    """ Return a read-only {name: IocInfo} of extract_ioc_cpu_shebang_info() results, in release order """
+    index = {}
+    for ioc in ioc_info:
+        index[ioc['folder_name']] = IocInfo(ioc['folder_name'], ioc['architecture'], ioc['binary'],
+                                            ioc.get('boot_dir', 'iocBoot'),
+                                            startup_cmd_template_for(ioc['architecture'], ioc['folder_name']))
+    return MappingProxyType(index)
+
+def facility_ioc_list(ioc_index: MappingProxyType, facility: str, ioc_names: list) -> list:
+    """ Playbook ioc_list of a facility: the IOCs of ioc_names found in the release, in release order """
+    ioc_names = set(ioc_names)
+    return [ioc.for_facility(facility) for name, ioc in ioc_index.items() if name in ioc_names]
+
+def release_ioc_info(component_name: str, tag: str, app_dirs: list) -> list:
+    """ extract_ioc_cpu_shebang_info() for a release still split into per-OS trees (app_dirs, in overlay order).
+        The result is cached for (component_name, tag), so the merged release never has to be scanned """
+    iocs = read_ioc_manifest(release_cache.load_metadata(component_name, tag, IOC_MANIFEST_NAME))
+    if iocs is not None:
+        return iocs
+    merged = {}
+    for app_dir in app_dirs:
+        for ioc in extract_ioc_cpu_shebang_info(app_dir):
+            merged[(ioc.get('boot_dir', 'iocBoot'), ioc['folder_name'])] = ioc # Last OS wins, like the overlay
+    iocs = list(merged.values())
+    try:
+        release_cache.save_metadata(component_name, tag, IOC_MANIFEST_NAME, new_ioc_manifest(iocs))
+    except OSError as e:
+        logging.warning(f"Unable to cache the IOC manifest for {component_name} {tag}: {e}")
+    return iocs
+
+def unselected_release_paths(tag: str, iocs: list, ioc_names: list) -> set:
+    """ Paths (relative to the release tree, under tag/) a selective release of ioc_names leaves out:
+        boot dirs of the other IOCs, and bin/lib arch dirs only the other IOCs run on.
+        Returns None if an IOC in ioc_names isn't in iocs, the whole release is needed to report it """
+    selected = [ioc for ioc in iocs if ioc['folder_name'] in ioc_names]
+    if set(ioc_names) - set(ioc['folder_name'] for ioc in selected):
+        return None
+    architectures = set(ioc['architecture'] for ioc in selected)
+    excluded = set()
+    for ioc in iocs:
+        if ioc['folder_name'] not in ioc_names:
+            excluded.add(os.path.join(tag, ioc.get('boot_dir', 'iocBoot'), ioc['folder_name']))
+        if ioc['architecture'] not in architectures:
+            for arch_dir in RELEASE_ARCH_DIRS:
+                excluded.add(os.path.join(tag, arch_dir, ioc['architecture']))
+    return excluded
+
+class StreamTee(object):
+    """ Read-only file-like object over a response's chunk iterator that also writes every
+        chunk it hands out to copy_file. Lets tarfile extract while the download is in flight. """
+    def __init__(self, chunks, copy_file):
+        self.chunks = iter(chunks)
+        self.copy_file = copy_file
+        self.buffer = bytearray()
+        self.offset = 0 # Start of the unread bytes in buffer, consumed bytes are dropped in bulk
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self.buffer) - self.offset < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            if chunk:
+                self.copy_file.write(chunk)
+                if self.offset:
+                    del self.buffer[:self.offset]
+                    self.offset = 0
+                self.buffer += chunk
+        end = len(self.buffer) if size < 0 else min(self.offset + size, len(self.buffer))
+        data = bytes(self.buffer[self.offset:end])
+        self.offset = end
+        return data
+
+    def drain(self):
+        """ Copy whatever the reader didn't consume (ex: gzip trailer) so the tarball is complete """
+        for chunk in self.chunks:
+            if chunk:
+                self.copy_file.write(chunk)
+
+def download_release_helper(endpoint: str, download_dir: str, tarball_name: str, extract_tarball: bool,
+                            extract_dir: str = None):
+    response = http_client.get(endpoint, 'GET component/{component}/release/{tag}', stream=True)
+    # Download file from api, and extract to extract_dir (defaults to download_dir)
     # Download the .tar.gz file
     tarball_filepath = os.path.join(download_dir, tarball_name)
-    if response.status_code == 200:
+    extract_dir = extract_dir or download_dir
+    if response.status_code != 200:
+        logging.info(f'Failed to retrieve the file. Status code: {response.status_code}')
+        response.close()
+        return False
+    try:
         # Download response to tarball file
         stream_size = 1024*1024 # Write in chunks (1MB) since tarball can be big
-        with open(tarball_filepath, 'wb') as file: 
-            for chunk in response.iter_content(chunk_size=stream_size): 
-                if (chunk):
-                    file.write(chunk)
-        logging.info('Tarball downloaded successfully')
+        chunks = response.iter_content(chunk_size=stream_size)
         logging.debug(f'Extract tarball: {extract_tarball}')
         logging.debug(f'download tarball: {tarball_filepath}')
-        if (extract_tarball):
-            # Extract the .tar.gz file
-            logging.info('Extracting tarball...')
-            
-            with tarfile.open(tarball_filepath, 'r:gz') as tar:
-                # Extract with modified permissions
-                tar.extractall(path=download_dir, filter="data")
-                logging.info(f'{tarball_filepath} extracted to {download_dir}')
+        with open(tarball_filepath, 'wb') as file: 
+            if (extract_tarball):
+                # Extract while downloading, the tarball is written to disk as its bytes are read
+                logging.info('Downloading and extracting tarball...')
+                stream = StreamTee(chunks, file)
+                with tarfile.open(fileobj=stream, mode='r|gz') as tar:
+                    # Extract with modified permissions
+                    tar.extractall(path=extract_dir, filter="data")
+                stream.drain()
+                logging.info(f'{tarball_filepath} extracted to {extract_dir}')
+            else:
+                for chunk in chunks: 
+                    if (chunk):
+                        file.write(chunk)
+    finally:
+        response.close() # Also when extraction fails halfway, so the connection isn't left open
+    logging.info('Tarball downloaded successfully')
+    return True
 
-        return True
+def fetch_release_to_cache(component_name: str, tag: str, os_name: str, endpoint: str):
+    """ Return the cached release for (component, tag, os), downloading it on a cache miss """
+    def fill(tarball_path: str, tree_dir: str) -> bool:
+        return download_release_helper(endpoint, os.path.dirname(tarball_path), os.path.basename(tarball_path),
+                                       extract_tarball=True, extract_dir=tree_dir)
+    return release_cache.fetch(component_name, tag, os_name, fill)
+
+def create_merged_artifact(download_dir: str, tag: str, merged_format: str) -> str:
+    """ Package the merged extracted release (download_dir/tag) for the playbook.
+        Returns the artifact path, which is the extracted directory itself for 'directory' """
+    if merged_format not in MERGED_ARTIFACT_FORMATS:
+        raise ValueError(f"Invalid merged_artifact_format: {merged_format}, must be one of {MERGED_ARTIFACT_FORMATS}")
+    extracted_dir = os.path.join(download_dir, tag)
+    if (merged_format == 'directory'):
+        logging.info(f'Using merged directory as release artifact: {extracted_dir}')
+        return extracted_dir
+    merged_tarball_path = os.path.join(download_dir, f'{tag}.{merged_format}')
+    logging.info(f'Creating merged {merged_format} from extracted contents...')
+    if (merged_format == 'tar.gz' and shutil.which('pigz')):
+        # Parallel gzip, the pure python gzip is single threaded
+        # --mode: files linked from the release cache are read-only, the release keeps its owner write bit
+        subprocess.run(['tar', '--use-compress-program=pigz', '--mode=u+w', '-cf', merged_tarball_path,
+                        '-C', download_dir, tag], check=True)
     else:
-        logging.info(f'Failed to retrieve the file. Status code: {response.status_code}')
-        return False
-
-def download_release(component_name: str, tag: str, download_dir: str, all_os: bool, extract_tarball: bool = False):
-    """ Download a components tagged release from the backend -> github """
+        mode = 'w:gz' if merged_format == 'tar.gz' else 'w'
+        with tarfile.open(merged_tarball_path, mode) as tar:
+            tar.add(extracted_dir, arcname=tag, filter=owner_writable)
+    logging.info(f'Merged artifact created: {merged_tarball_path}')
+    return merged_tarball_path
+
+def download_release(component_name: str, tag: str, download_dir: str, all_os: bool, extract_tarball: bool = False,
+                     merged_format: str = 'tar.gz', ioc_names: list = None, cached_only: bool = False):
+    """ Download a components tagged release from the backend -> github.
+        Releases go through the release cache, then are hard linked into download_dir.
+        For all_os, the merged release is packaged as merged_format (see MERGED_ARTIFACT_FORMATS)
+        and ioc_names (optional) limits it to those IOCs (see unselected_release_paths).
+        cached_only uses the release cache alone, returns False instead of downloading a missing release """
 
     endpoint = BACKEND_URL + f'component/{component_name}/release/{tag}'
-    valid_tag_release = False
+    def fetch_release(os_name: str, os_endpoint: str):
+        if (cached_only):
+            return release_cache.lookup(component_name, tag, os_name)
+        return fetch_release_to_cache(component_name, tag, os_name, os_endpoint)
+
     if (all_os): # This is needed if app has a build for one or more OSes
-        for current_os in USED_OS_LIST:
-            new_endpoint = endpoint + f'?os={current_os}'
-            tarball_name = f'{tag}-{current_os}.tar.gz'
-            found_release = download_release_helper(new_endpoint, download_dir, tarball_name, extract_tarball)
-            if (found_release): # Just need to find at least one release otherwise the tag or app doesn't exist
-                valid_tag_release = True
-        if (valid_tag_release):
-            logging.info('Creating merged tarball from extracted contents...')
-    
-            # New tarball will be named after the tag
-            merged_tarball_path = os.path.join(download_dir, f'{tag}.tar.gz')
-            # The extracted directory name is just the tag
-            extracted_dir = os.path.join(download_dir, tag)
-            # Create new tarball with all extracted contents
-            with tarfile.open(merged_tarball_path, 'w:gz') as tar:
-                tar.add(extracted_dir, arcname=tag)
-            logging.info(f'Merged tarball created: {merged_tarball_path}')
+        def fetch_releases() -> list:
+            # Fetch every OS concurrently, then overlay in USED_OS_LIST order so the last OS still wins
+            with ThreadPoolExecutor(max_workers=len(USED_OS_LIST)) as executor:
+                futures = [executor.submit(fetch_release, current_os, endpoint + f'?os={current_os}')
+                           for current_os in USED_OS_LIST]
+                return [future.result() for future in futures]
+
+        def link_releases(cached_releases: list):
+            excluded = None
+            if (ioc_names and extract_tarball):
+                app_dirs = [os.path.join(cached_release.tree, tag) for cached_release in cached_releases]
+                excluded = unselected_release_paths(tag, release_ioc_info(component_name, tag, app_dirs), ioc_names)
+                if (excluded is None):
+                    logging.info(f"IOCs {ioc_names} not all found in {component_name} {tag}, using the full release")
+                else:
+                    logging.info(f"Selective release for {ioc_names}, leaving out {len(excluded)} IOC/arch dirs")
+            if (extract_tarball):
+                for cached_release in cached_releases:
+                    link_tree(cached_release.tree, download_dir, exclude=excluded)
     else:
-        tarball_name = f'{tag}.tar.gz'
-        valid_tag_release = download_release_helper(endpoint, download_dir, tarball_name, extract_tarball)
+        def fetch_releases() -> list:
+            return [fetch_release(None, endpoint)]
+
+        def link_releases(cached_releases: list):
+            link_file(cached_releases[0].tarball, os.path.join(download_dir, f'{tag}.tar.gz'))
+            if (extract_tarball):
+                link_tree(cached_releases[0].tree, download_dir)
 
+    valid_tag_release = link_cached_releases(fetch_releases, link_releases)
+    if (valid_tag_release and all_os):
+        create_merged_artifact(download_dir, tag, merged_format)
     return valid_tag_release
 
+def link_cached_releases(fetch_releases, link_releases, attempts: int = 3) -> bool:
+    """ link_releases(cached_releases) with the releases from fetch_releases() (None for missing ones),
+        holding the release cache read lock so no object is evicted halfway through linking.
+        Releases evicted between the fetch and the lock are fetched again.
+        Returns False if no release exists (the tag or app doesn't exist) """
+    for attempt in range(attempts):
+        cached_releases = [cached_release for cached_release in fetch_releases() if cached_release]
+        if not cached_releases:
+            return False
+        with release_cache.reading():
+            if all(release_cache.is_present(cached_release) for cached_release in cached_releases):
+                link_releases(cached_releases)
+                return True
+        logging.warning(f"Cached release evicted before it was linked, fetching again (attempt {attempt + 1})")
+    raise RuntimeError("Release cache objects keep getting evicted, raise RELEASE_CACHE_MAX_BYTES")
+
+def release_content_id(component_name: str, tag: str) -> str:
+    """ Identity of the merged multi-OS release of a tag: the release cache digests of its per-OS releases.
+        None if none of them is cached """
+    digests = []
+    for current_os in USED_OS_LIST:
+        cached_release = release_cache.lookup(component_name, tag, current_os)
+        digests.append(cached_release.digest if cached_release else None)
+    if not any(digests):
+        return None
+    return hashlib.sha256(json.dumps(digests).encode()).hexdigest()
+
+def prestage_path(component_name: str, tag: str, merged_format: str) -> str:
+    """ Where a prestaged release is kept on the target hosts """
+    return f"{PRESTAGE_DIR}/{component_name}/{tag}.{merged_format}"
+
+def prestaged_facilities(component_name: str, tag: str, merged_format: str, facilities: list) -> dict:
+    """ Return {facility: staged record} for the facilities whose every host has this release prestaged """
+    if merged_format not in PRESTAGE_FORMATS or not prestage_registry.staged(component_name, tag):
+        return {}
+    try:
+        content_id = release_content_id(component_name, tag)
+        facility_hosts = ansible_api.get_inventory_group_hosts(get_inventory_path(), facilities)
+    except (ValueError, RuntimeError, OSError) as e: # Transfer as usual
+        logging.warning(f"Unable to check prestaged copies of {component_name} {tag}: {e}")
+        return {}
+    staged = {}
+    for facility in facilities:
+        record = prestage_registry.staged_copy(component_name, tag, facility_hosts.get(facility, []),
+                                               content_id, merged_format)
+        if record:
+            staged[facility] = record
+    return staged
+
+def prestage_playbook_vars(record: dict) -> dict:
+    """ Playbook vars telling ioc_deploy.yml to use the staged copy instead of transferring the tarball """
+    if not record:
+        return {}
+    return {'prestaged_tarball': record['path'], 'prestaged_sha256': record['sha256'], 'skip_transfer': True}
+
+def remove_prestaged_copies(component_name: str, tag: str, host_entries: dict):
+    """ Delete staged copies ({host: staged record}) from the hosts (ad-hoc ansible file state=absent) and drop
+        their records. Hosts that can't be reached keep their copy, PRESTAGE_DIR is under /var/tmp """
+    host_paths = {}
+    for host, entry in host_entries.items():
+        host_paths.setdefault(entry['path'], []).append(host)
+    for path, hosts in host_paths.items():
+        stdout, stderr, return_code = ansible_api.run_ansible_adhoc(get_inventory_path(), ':'.join(hosts), 'file',
+                                                                    f"path={path} state=absent")
+        if return_code != 0:
+            logging.warning(f"Unable to remove staged {path} from some of {hosts}: {stderr or stdout}")
+    prestage_registry.forget(component_name, tag, list(host_entries))
+    logging.info(f"Removed staged {component_name} {tag} from {len(host_entries)} hosts")
+
+def remove_deployed_prestage(component_name: str, tag: str, facilities: list):
+    """ Delete the staged copies of a tag from the hosts of the facilities it was just deployed to """
+    if not facilities or not prestage_registry.staged(component_name, tag, include_expired=True):
+        return
+    try:
+        facility_hosts = ansible_api.get_inventory_group_hosts(get_inventory_path(), facilities)
+        deployed_hosts = set(host for hosts in facility_hosts.values() for host in hosts)
+        staged = prestage_registry.staged(component_name, tag, include_expired=True)
+        remove_prestaged_copies(component_name, tag, {host: entry for host, entry in staged.items() if host in deployed_hosts})
+    except Exception as e: # The janitor removes the copies once they expire
+        logging.warning(f"Unable to remove staged copies of {component_name} {tag}: {e}")
+
+def sweep_expired_prestage():
+    """ Delete staged copies past PRESTAGE_TTL from the hosts (janitor) """
+    for component_name, tag, host_entries in prestage_registry.expired():
+        try:
+            remove_prestaged_copies(component_name, tag, host_entries)
+        except Exception as e:
+            logging.warning(f"Unable to remove expired staged copies of {component_name} {tag}: {e}")
+            prestage_registry.forget(component_name, tag, list(host_entries))
+
+def cached_release_members(component_name: str, tag: str) -> dict:
+    """ Member index of the merged multi-OS release (see release_delta.merge_members), None unless cached """
+    member_lists = []
+    for current_os in USED_OS_LIST:
+        cached_release = release_cache.lookup(component_name, tag, current_os)
+        if cached_release:
+            member_lists.append(release_cache.members(cached_release))
+    return merge_members(member_lists) if member_lists else None
+
+def pin_deployed_release(component_name: str, facility: str, tag: str, selective: bool = False):
+    """ Keep the release just deployed to a facility in the release cache, for fast reverts.
+        selective records that only some IOCs of the release were shipped """
+    digests = [cached_release.digest for cached_release in
+               (release_cache.lookup(component_name, tag, current_os) for current_os in USED_OS_LIST) if cached_release]
+    # Pinned even without cached objects, so older tags fall out of the last REVERT_KEEP_RELEASES
+    release_cache.pin(component_name, facility, tag, digests, REVERT_KEEP_RELEASES, {"selective": selective})
+
+def full_release_deployed(component_name: str, facility: str, tag: str) -> bool:
+    """ True if the last deployment of tag to facility shipped the whole release (not a selective release).
+        False if unknown (deployed before it was recorded, or pushed out of the pins) """
+    for pin in release_cache.pins(component_name, facility):
+        if pin["tag"] == tag:
+            return (pin.get("details") or {}).get("selective") is False
+    return False
+
+def revert_release_kept(component_name: str, facility: str, tag: str) -> bool:
+    """ True if tag is one of the releases pinned for facility (so the playbook kept it on the hosts) as a
+        full release, and its pinned release cache objects are still the cached ones, a revert to it can then
+        switch_only. A selective release lacks the other IOCs, so it is never switched to """
+    for pin in release_cache.pins(component_name, facility):
+        if pin["tag"] == tag:
+            if (pin.get("details") or {}).get("selective") is not False:
+                return False
+            cached_releases = [release_cache.lookup(component_name, tag, current_os) for current_os in USED_OS_LIST]
+            digests = [cached_release.digest for cached_release in cached_releases if cached_release]
+            return bool(digests) and digests == pin["digests"]
+    return False
+
+def deployed_tag(component_name: str, facility: str, task: DeploymentTask) -> str:
+    """ Tag currently deployed on a facility, from its most recent deployment log """
+    recent_deployment = find_recent_deployment_for_component_facility(facility, component_name, 0)
+    if recent_deployment and recent_deployment.get('tag'):
+        return recent_deployment['tag']
+    component = task.component_lookup.get(facility) # Fewer than 2 deployment logs
+    return component.get('tag') if component else None
+
+def build_release_deltas(deploy_request: DeployDict, facilities: list, release_dir: str, temp_dir: str,
+                         merged_format: str, task: DeploymentTask) -> dict:
+    """ Return {facility: delta playbook vars} for the facilities where a delta against their deployed tag
+        is worth shipping instead of the full release. release_dir is the merged <tag> directory """
+    component_name, tag = deploy_request.component_name, deploy_request.tag
+    new_members = cached_release_members(component_name, tag)
+    if new_members is None:
+        return {}
+    # What this deployment ships, a selective release leaves some members out
+    shipped_paths = set(path for path in new_members if os.path.lexists(os.path.join(release_dir, path)))
+    release_bytes = sum(new_members[path]['size'] for path in shipped_paths)
+    deltas = {} # base tag -> playbook vars, or None when the full release is shipped instead
+    facility_vars = {}
+    for facility in facilities:
+        try:
+            base_tag = deployed_tag(component_name, facility, task)
+        except Exception as e:
+            logging.warning(f"Unable to find the deployed tag of {component_name} in {facility}: {e}")
+            continue
+        if not base_tag or base_tag == tag:
+            continue
+        if not full_release_deployed(component_name, facility, base_tag):
+            # <base_tag>/ on the hosts may be missing the IOCs a selective release left out
+            logging.info(f"{component_name} {base_tag} on {facility} may not be a full release, no delta")
+            continue
+        if base_tag not in deltas:
+            deltas[base_tag] = None
+            base_members = cached_release_members(component_name, base_tag)
+            if base_members is None:
+                logging.info(f"{component_name} {base_tag} is not in the release cache, no delta for {facility}")
+                continue
+            # Removed against the full release, so a selective release doesn't delete the IOCs it leaves out.
+            # Changed members the release leaves out aren't shipped
+            changed, removed = compute_delta(base_members, new_members)
+            changed = [path for path in changed if path in shipped_paths]
+            changed_bytes = sum(new_members[path]['size'] for path in changed)
+            if changed_bytes > DELTA_MAX_RATIO * release_bytes:
+                logging.info(f"Delta {base_tag} -> {tag} changes {changed_bytes} of {release_bytes} bytes, shipping the full release")
+                continue
+            delta_name = f"{tag}.delta-{base_tag}"
+            delta_path = os.path.join(temp_dir, f"{delta_name}.{merged_format}")
+            manifest_path = os.path.join(temp_dir, f"{delta_name}.json")
+            write_delta(release_dir, tag, base_tag, changed, removed, len(shipped_paths) - len(changed), release_bytes,
+                        delta_path, manifest_path, compress=(merged_format == 'tar.gz'))
+            deltas[base_tag] = {'delta_base_tag': base_tag, 'delta_tarball': delta_path, 'delta_manifest': manifest_path}
+        if deltas[base_tag]:
+            facility_vars[facility] = deltas[base_tag]
+    return facility_vars
+
+def prestage_release(prestage_request: DeployDict, temp_dir: str, task: DeploymentTask) -> dict:
+    """ Copy the merged release to every host of the requested facilities (ad-hoc ansible file/copy/stat),
+        verify its sha256 and record the hosts it is staged on """
+    component_name, tag = prestage_request.component_name, prestage_request.tag
+    merged_format = prestage_request.merged_artifact_format or MERGED_ARTIFACT_FORMAT
+    if merged_format not in PRESTAGE_FORMATS:
+        raise ValueError(f"Invalid merged_artifact_format for prestaging: {merged_format}, must be one of {PRESTAGE_FORMATS}")
+    if not prestage_request.facilities:
+        raise ValueError("Prestaging needs the facilities to stage the release on")
+
+    task.update_progress("Downloading release artifacts", 10)
+    if not download_release(component_name, tag, temp_dir, all_os=True, extract_tarball=True, merged_format=merged_format):
+        raise ValueError(f"Deployment tag may not exist for app: {component_name}, tag: {tag}")
+    artifact = os.path.join(temp_dir, f"{tag}.{merged_format}")
+    sha256 = file_digest(artifact)
+    remote_path = prestage_path(component_name, tag, merged_format)
+    inventory_file_path = get_inventory_path()
+    facility_hosts = ansible_api.get_inventory_group_hosts(inventory_file_path, prestage_request.facilities)
+    host_status = {host: None for hosts in facility_hosts.values() for host in hosts}
+
+    def run_step(module: str, module_args: str, step: str) -> dict:
+        """ Run a module on the hosts that haven't failed yet, recording failures in host_status """
+        pending = [host for host, status in host_status.items() if status is None]
+        if not pending:
+            return {}
+        stdout, stderr, return_code = ansible_api.run_ansible_adhoc(inventory_file_path, ':'.join(pending), module, module_args)
+        try:
+            results = ansible_api.parse_adhoc_json_output(stdout)
+        except ValueError:
+            raise RuntimeError(f"Prestage {step} failed: {stderr or stdout}")
+        for host in pending:
+            result = results.get(host)
+            if result is None:
+                host_status[host] = f"{step} failed: host not in ansible results"
+            elif result.get('failed') or result.get('unreachable'):
+                host_status[host] = f"{step} failed: {result.get('msg', '')}"
+        return results
+
+    task.update_progress("Copying release to hosts", 30, f"{len(host_status)} hosts in {prestage_request.facilities}")
+    run_step('file', f"path={os.path.dirname(remote_path)} state=directory", "mkdir")
+    run_step('copy', f"src={artifact} dest={remote_path}", "copy")
+    task.update_progress("Verifying staged release", 80)
+    results = run_step('stat', f"path={remote_path} get_checksum=yes checksum_algorithm=sha256", "verify")
+    for host, result in results.items():
+        if host_status.get(host) is None:
+            stat = result.get('stat', {})
+            host_status[host] = "staged" if stat.get('exists') and stat.get('checksum') == sha256 \
+                                else "verify failed: checksum mismatch"
+
+    staged_hosts = [host for host, status in host_status.items() if status == "staged"]
+    prestage_registry.forget(component_name, tag, [host for host in host_status if host not in staged_hosts])
+    prestage_registry.record(component_name, tag, staged_hosts, remote_path, sha256,
+                             release_content_id(component_name, tag), merged_format)
+    logging.info(f"Prestaged {component_name} {tag} on {len(staged_hosts)}/{len(host_status)} hosts")
+    return {"path": remote_path, "sha256": sha256, "release_format": merged_format,
+            "facilities": {facility: {host: host_status[host] for host in hosts} for facility, hosts in facility_hosts.items()},
+            "success": bool(host_status) and len(staged_hosts) == len(host_status)}
 
-    
 def update_db_after_deployment(deployment_success: bool, new_component: bool, facility: str, app_type: str, component_name: str,
                                tag: str, user: str, current_output: str, ioc_list: list = None):
     # 6) Write new configuration to deployment db for each facility
@@ -499,21 +1167,181 @@ def get_inventory_path() -> str:
     suffix = 'test_inventory.ini' if TEST_INVENTORY else 'global_inventory.ini'
     return ANSIBLE_PLAYBOOKS_PATH + suffix
 
+def playbook_progress_reporter(task: DeploymentTask, facility: str):
+    """Return an ansible_api on_line callback that pushes the running playbook task into the task record"""
+    last_update = [0.0]
+    def on_line(stream_name: str, line: str):
+        event = ansible_api.parse_progress_line(line)
+        if not event:
+            return
+        if event['type'] == 'host' and event['status'] in ('failed', 'fatal', 'unreachable'):
+            details = f"{facility}: {event['status']} on {event['host']}"
+        elif event['type'] == 'task':
+            details = f"{facility}: TASK [{event['task']}]"
+        else:
+            return
+        now = time.monotonic()
+        if now - last_update[0] < PROGRESS_UPDATE_INTERVAL:
+            return
+        last_update[0] = now
+        task.update_progress(f"Deploying to {facility}", task.progress.get("percent", 0), details)
+    return on_line
+
+def run_streamed_playbook(task: DeploymentTask, facility: str, temp_dir: str, full_log_files: dict, *args, **kwargs):
+    """ansible_api.run_ansible_playbook() with progress pushed to the task record and the full output
+    spilled to a per-facility log file. Logs of truncated runs are recorded in full_log_files[facility]"""
+    log_file = os.path.join(temp_dir, f'ansible-{facility}.log')
+    stdout, stderr, return_code = ansible_api.run_ansible_playbook(
+        *args, on_line=playbook_progress_reporter(task, facility), log_file=log_file,
+        max_output_lines=ANSIBLE_OUTPUT_TAIL_LINES, **kwargs)
+    if stdout.startswith(ansible_api.TRUNCATED_OUTPUT_PREFIX) or stderr.startswith(ansible_api.TRUNCATED_OUTPUT_PREFIX):
+        full_log_files[facility] = log_file
+    return stdout, stderr, return_code
+
+def facility_args_digest(playbook_args: dict, workspace_dir: str) -> str:
+    """ Digest of the playbook args of one facility, see locks.args_digest() """
+    return args_digest(playbook_args, workspace_dir, COALESCE_IGNORED_ARGS)
+
+def new_deployment_lock(deploy_request: DeployDict, facility: str, task: DeploymentTask,
+                        playbook_args_digest: str = None) -> DeploymentLock:
+    return DeploymentLock(lambda: redis_client, deploy_request.component_name, facility, task.task_id,
+                          deploy_request.tag, DEPLOYMENT_LOCK_TTL, playbook_args_digest)
+
+def report_lock_wait(task: DeploymentTask, facility: str):
+    def on_wait(holder: dict):
+        holder_task = holder.get('task_id') if holder else 'unknown'
+        task.update_progress(f"Waiting for {facility}", task.progress.get("percent", 0),
+                             f"Deployment {holder_task} is running on {facility}")
+    return on_wait
+
+def run_locked_facility(deploy_request: DeployDict, task: DeploymentTask, facility: str, deploy_facility,
+                        playbook_args_digest: str = None):
+    """Run deploy_facility(facility) -> (output, success) holding the (component, facility) lock.
+    With deploy_request.coalesce, a deployment running on the facility with the same playbook args
+    (playbook_args_digest, see facility_args_digest()) is waited for and its outcome reused instead of
+    deploying again. Dry runs don't change anything and skip the lock."""
+    if deploy_request.dry_run:
+        return deploy_facility(facility)
+    lock = new_deployment_lock(deploy_request, facility, task, playbook_args_digest)
+    if not lock.try_acquire():
+        holder = lock.holder()
+        if deploy_request.coalesce and lock.can_coalesce(holder):
+            logging.info(f"Coalescing {facility} deployment into running deployment {holder['task_id']}")
+            task.update_progress(f"Waiting for {facility}", task.progress.get("percent", 0),
+                                 f"Coalesced into identical deployment {holder['task_id']}")
+            outcome = lock.wait_for_result(holder['task_id'], DEPLOYMENT_LOCK_WAIT_TIMEOUT)
+            if outcome is not None:
+                result = "succeeded" if outcome['success'] else "failed"
+                return (f"== Deployment for {facility} coalesced into deployment {holder['task_id']} "
+                        f"of tag {deploy_request.tag} with the same arguments ({result}) ==\n\n", outcome['success'])
+            logging.warning(f"No outcome recorded by deployment {holder['task_id']}, deploying {facility} again")
+        if not lock.acquire(DEPLOYMENT_LOCK_WAIT_TIMEOUT, on_wait=report_lock_wait(task, facility)):
+            return (f"== Deployment for {facility} not run, timed out waiting for another deployment of "
+                    f"{deploy_request.component_name} to {facility} ==\n\n", False)
+    success = None
+    try:
+        with lock.lease():
+            output, success = deploy_facility(facility)
+        return output, success
+    finally:
+        lock.release(success)
+
+def run_facility_rollout(deploy_request: DeployDict, facilities: list, deploy_facility, task: DeploymentTask,
+                         start_percent: int, end_percent: int, facility_digest=None) -> dict:
+    """Run deploy_facility(facility) -> (output, success) over facilities using the request's rollout
+    settings. Facilities skipped after an abort get a placeholder failed result.
+    facility_digest(facility): digest of the facility's playbook args, for coalescing"""
+    max_parallel = deploy_request.max_parallel_facilities or ROLLOUT_MAX_PARALLEL
+    def on_facility_done(facility: str, done_count: int):
+        percent = start_percent + (end_percent - start_percent) * done_count // max(len(facilities), 1)
+        task.update_progress(f"Deployed to {facility}", percent, f"{done_count}/{len(facilities)} facilities done")
+    def locked_deploy_facility(facility: str):
+        return run_locked_facility(deploy_request, task, facility, deploy_facility,
+                                   facility_digest(facility) if facility_digest else None)
+    results = rollout.run_rollout(facilities, locked_deploy_facility, max_parallel, deploy_request.canary_facilities,
+                                  deploy_request.abort_on_failure, on_facility_done)
+    for facility in facilities:
+        if results[facility] is rollout.SKIPPED:
+            results[facility] = (f"== Deployment skipped for {facility} (aborted after an earlier facility failed) ==\n\n", False)
+    return results
+
+def run_batched_ioc_playbook(facilities: list, facility_ioc_lists: dict, playbook_args_dict: dict,
+                             inventory_file_path: str, playbook: str, temp_dir: str, dry_run: bool,
+                             facility_vars: dict = None) -> dict:
+    """Run one ioc_deploy.yml covering every facility. The per-facility 'facility' and 'ioc_list'
+    (plus facility_vars[facility], ex: prestaged release vars) are passed as group vars of each facility
+    group (generated inventory file) instead of extra vars, and per-facility results are recovered
+    from the json stdout callback.
+    Returns {facility: (output, success)}"""
+    group_vars_inventory = os.path.join(temp_dir, 'batched_group_vars.yml')
+    facility_vars = facility_vars or {}
+    inventory_groups = {facility: {'vars': dict(facility_vars.get(facility, {}), facility=facility,
+                                                ioc_list=facility_ioc_lists[facility])}
+                        for facility in facilities}
+    update_yaml(group_vars_inventory, {'all': {'children': inventory_groups}})
+    batch_args_dict = {key: value for key, value in playbook_args_dict.items() if key not in ('facility', 'ioc_list')}
+    env = dict(os.environ, ANSIBLE_STDOUT_CALLBACK='json', ANSIBLE_NOCOLOR='True')
+    logging.info(f"Running batched playbook for facilities: {facilities}")
+    stdout, stderr, return_code = ansible_api.run_ansible_playbook(
+        inventory_file_path, playbook, ':'.join(facilities), json.dumps(batch_args_dict), custom_env=env,
+        return_output=True, no_color=True, check_mode=dry_run, extra_inventories=[group_vars_inventory])
+
+    try:
+        parsed_output = ansible_api.parse_json_callback_output(stdout)
+        facility_hosts = ansible_api.get_inventory_group_hosts(inventory_file_path, facilities)
+    except (ValueError, RuntimeError) as e:
+        # No per-host results to go on, so every facility gets the whole output and the return code
+        logging.error(f"Unable to parse batched playbook results: {e}")
+        output = f"== Batched deployment output for {facilities} ==\n\n{stdout}"
+        if (stderr):
+            output += f"\n== Errors ==\n\n{stderr}"
+        return {facility: (output, return_code == 0) for facility in facilities}
+
+    results = {}
+    for facility in facilities:
+        current_output = f"== Deployment output for {facility} ==\n\n"
+        facility_success = True
+        hosts_run = 0
+        for host in facility_hosts.get(facility, []):
+            host_stats = parsed_output['stats'].get(host)
+            if (host_stats is None): # Host was not part of the run (ex: limited out)
+                continue
+            hosts_run += 1
+            for task_name, task_status, msg in parsed_output['host_tasks'].get(host, []):
+                current_output += f"TASK [{task_name}] {task_status}: [{host}]"
+                current_output += f" => {msg}\n" if msg and task_status in ('failed', 'unreachable') else "\n"
+            current_output += (f"PLAY RECAP {host}: ok={host_stats.get('ok', 0)} changed={host_stats.get('changed', 0)} "
+                               f"unreachable={host_stats.get('unreachable', 0)} failed={host_stats.get('failures', 0)} "
+                               f"skipped={host_stats.get('skipped', 0)}\n\n")
+            if (host_stats.get('failures', 0) or host_stats.get('unreachable', 0)):
+                facility_success = False
+        if (hosts_run == 0): # Nothing was deployed, don't record the facility as deployed
+            current_output += f"No host of {facility} ran the playbook\n\n"
+            facility_success = False
+        if (not facility_success and stderr):
+            current_output += f"\n== Errors ==\n\n{stderr}"
+        results[facility] = (current_output, facility_success)
+    facility_host_names = set(host for hosts in facility_hosts.values() for host in hosts)
+    unmatched_hosts = [host for host in parsed_output['stats'] if host not in facility_host_names]
+    if (unmatched_hosts):
+        logging.warning(f"Batched playbook results for hosts in none of {facilities}: {unmatched_hosts}")
+    return results
+
 def finalize_deployment(component_name: str, tag: str, user: str, facilities: list,
                         deployment_output: str, status: int, deployment_success: bool,
                         deployment_report_file: str, dry_run: bool,
-                        facilities_ioc_dict: dict = None) -> dict:
-    """Generate deployment report, write to ELOG, and return the standard result dict."""
+                        facilities_ioc_dict: dict = None, full_log_files: list = None) -> dict:
+    """Generate deployment report and return the standard result dict."""
     summary = generate_report(component_name, tag, user, deployment_output, status,
-                              deployment_report_file, facilities_ioc_dict, dry_run)
-    elog_url = ""
-    if not dry_run:
-        elog_url = send_deployment_to_elog(component_name, tag, facilities, summary) or ""
-    return {"summary": summary, "report_file": deployment_report_file,
-            "status": status, "success": deployment_success, "elog_url": elog_url}
-
-def generate_report(component_name: str, tag: str, user: str, deployment_output: str, status: int, deployment_report_file: str, facilities_ioc_dict: dict=None, dry_run: bool=False):
-    """ Generate a deployment report """
+                              deployment_report_file, facilities_ioc_dict, dry_run, full_log_files)
+    # The ELOG entry is submitted by run_deployment() -> submit_deployment_elog()
+    return {"summary": summary, "report_file": deployment_report_file, "facilities": facilities,
+            "status": status, "success": deployment_success, "elog_url": "", "elog_status": "skipped"}
+
+def generate_report(component_name: str, tag: str, user: str, deployment_output: str, status: int, deployment_report_file: str, facilities_ioc_dict: dict=None, dry_run: bool=False,
+                    full_log_files: list=None):
+    """ Generate a deployment report. The summary is returned, the report file additionally gets
+        the full output of playbooks whose output was truncated (full_log_files) """
     summary = \
 f"""#### Deployment report for {component_name} - {tag} ####
 #### User: {user}"""
@@ -529,6 +1357,10 @@ f"""#### Deployment report for {component_name} - {tag} ####
         summary += "\n#### Overall status: Failure - PLEASE REVIEW\n\n" + deployment_output
     logging.debug(deployment_report_file)
     write_file(deployment_report_file, summary)
+    for log_file in (full_log_files or []):
+        with open(deployment_report_file, 'a') as report, open(log_file, 'r') as log:
+            report.write(f"\n\n#### Full playbook output: {os.path.basename(log_file)} ####\n\n")
+            shutil.copyfileobj(log, report)
     logging.debug(summary)
     return summary
 
@@ -559,7 +1391,7 @@ def send_deployment_to_elog(component_name: str, tag: str, facilities: list, sum
     # Send the request
     try:
         logging.debug(f"Sending request to: {ELOG_ENDPOINT}")
-        response = requests.post(ELOG_ENDPOINT, headers=ELOG_HEADERS, json=payload, timeout=REQUEST_TIMEOUT)
+        response = http_client.post(ELOG_ENDPOINT, 'POST elog entries', headers=ELOG_HEADERS, json=payload)
         
         logging.debug(f"Response status code: {response.status_code}")
         logging.debug(f"Response headers: {response.headers}")
@@ -611,7 +1443,62 @@ def send_deployment_to_elog(component_name: str, tag: str, facilities: list, sum
         logging.error(f"Failed payload: {payload}")
         return False
 
+def send_elog_entry(entry: dict) -> str:
+    return send_deployment_to_elog(entry["component"], entry["tag"], entry["facilities"], entry["summary"])
+
+def record_elog_result(entry: dict, elog_url: str):
+    """Fill in the elog status of a task once its outbox entry is sent (or given up on)"""
+    task = get_task(entry["task_id"])
+    if not task or not isinstance(task.result, dict): # Task record expired, nothing left to update
+        return
+    task.result["elog_url"] = elog_url or ""
+    task.result["elog_status"] = "sent" if elog_url else "failed"
+    save_task(task, ["result"])
+
+elog_outbox = ElogOutbox(lambda: redis_client, send_elog_entry, record_elog_result, ELOG_MAX_ATTEMPTS)
+
+def submit_deployment_elog(task: DeploymentTask, deploy_request: DeployDict, result: dict):
+    """Queue the deployment's ELOG entry, or send it inline for sync/return_elog requests (queued if that fails)"""
+    if deploy_request.dry_run or not isinstance(result, dict) or "summary" not in result or result.get("nothing_to_deploy"):
+        return
+    facilities = result.get("facilities") or deploy_request.facilities
+    if deploy_request.sync or deploy_request.return_elog:
+        elog_url = send_deployment_to_elog(deploy_request.component_name, deploy_request.tag, facilities, result["summary"])
+        if elog_url:
+            result["elog_url"], result["elog_status"] = elog_url, "sent"
+            return
+    elog_outbox.enqueue(task.task_id, deploy_request.component_name, deploy_request.tag, facilities, result["summary"])
+    result["elog_status"] = "pending"
+
 # Begin API functions =================================================================================
+@app.on_event("startup")
+async def start_workspace_janitor():
+    """Delete released task workspaces (and reports past retention) in the background,
+    every uvicorn worker runs one (deletes are idempotent)"""
+    async def janitor():
+        while True:
+            await asyncio.sleep(WORKSPACE_JANITOR_INTERVAL)
+            try:
+                await run_blocking(workspaces.sweep)
+                await run_blocking(sweep_expired_prestage)
+                if REPORT_RETENTION_DAYS:
+                    await run_blocking(report_store.prune, time.time() - REPORT_RETENTION_DAYS * 86400)
+            except Exception as e:
+                logging.error(f"Workspace janitor failed: {str(e)}")
+    app.state.workspace_janitor = asyncio.create_task(janitor())
+
+@app.on_event("startup")
+async def start_elog_sender():
+    """Drain the ELOG outbox in the background, every uvicorn worker runs one (entries are claimed)"""
+    async def sender():
+        while True:
+            await asyncio.sleep(ELOG_SEND_INTERVAL)
+            try:
+                await run_blocking(elog_outbox.drain, ELOG_BATCH_SIZE, ELOG_RATE_LIMIT)
+            except Exception as e:
+                logging.error(f"ELOG sender failed: {str(e)}")
+    app.state.elog_sender = asyncio.create_task(sender())
+
 @app.get("/")
 def read_root():
     return {"status": "Empty endpoint - somethings wrong with your api call."}
@@ -620,6 +1507,20 @@ def read_root():
 async def health():
     return {"status": "ok"}
 
+def workspace_stats() -> dict:
+    usage = workspaces.usage()
+    return {"count": len(usage), "total_bytes": sum(usage.values()), "tasks": usage}
+
+@app.get("/metrics")
+async def metrics():
+    """Metrics for this worker process"""
+    return {"http": http_client.metrics(),
+            "deployments": deployment_slots.stats(),
+            "job_queue": job_queue.stats() if JOB_QUEUE_ENABLED else None,
+            "elog_outbox": await run_blocking(elog_outbox.stats),
+            "workspaces": await run_blocking(workspace_stats),
+            "db_cache": {"component": component_cache.stats(), "deployment_logs": deployment_logs_cache.stats()}}
+
 @app.get("/deployment/info")
 async def get_deployment_component_info(component: Component):
     """
@@ -631,9 +1532,11 @@ async def get_deployment_component_info(component: Component):
     component_info_list = []
     try:
         found_ioc = False
+        logging.info(f"get_deployment_component_info: component_name: {component.component_name}, facilities: {facilities}")
+        lookup = ComponentLookup(component.component_name)
+        components = await run_blocking(lookup.all)
         for facility in facilities:
-            logging.info(f"get_deployment_component_info: component_name: {component.component_name}, facility: {facility}")
-            component_info = find_component_in_facility(facility, component.component_name)
+            component_info = components[facility]
             if (component_info):
                 info = {f"{facility}": component_info}
                 component_info_list.append(info)
@@ -668,16 +1571,115 @@ async def get_deployment_status(task_id: str):
     if task.status == "completed":
         response["result"] = {
             "summary": task.result.get("summary"),
-            "elog_url": task.result.get("elog_url", "")
+            "elog_url": task.result.get("elog_url", ""),
+            "elog_status": task.result.get("elog_status")
         }
     elif task.status == "failed":
         response["error"] = task.error
     
     return response
 
+@app.get("/deployment/{task_id}/events")
+async def stream_deployment_events(task_id: str, last_event_id: str = None,
+                                   last_event_id_header: str = Header(None, alias="Last-Event-ID")):
+    """Stream deployment task updates as NDJSON, one json object per line as they happen.
+    Each update has an event_id and the task fields that changed (status, progress, result, error...).
+    The stream replays the task's history first (or resumes after last_event_id, or the Last-Event-ID header
+    of a reconnecting client) and ends once the task is completed or failed, and its ELOG entry is no longer
+    pending (result.elog_status)."""
+    if not await run_blocking(redis_client.exists, task_key(task_id)):
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def event_lines():
+        last_id = last_event_id or last_event_id_header or "0"
+        last_sent = time.monotonic()
+        status, elog_pending = None, False
+        while True:
+            # XREAD without BLOCK, run off the event loop. A blocking XREAD would hold an executor
+            # thread per connected client for the whole wait
+            entries = await run_blocking(lambda: redis_client.xread({task_events_key(task_id): last_id}, count=100))
+            for _, messages in entries:
+                for event_id, values in messages:
+                    last_id = event_id
+                    event = format_task_event(event_id, values)
+                    yield json.dumps(event) + "\n"
+                    last_sent = time.monotonic()
+                    status = event.get("status", status)
+                    if "result" in event:
+                        elog_pending = (event["result"] or {}).get("elog_status") == "pending"
+                    if status in TASK_TERMINAL_STATUSES and not elog_pending:
+                        return
+            if entries:
+                continue
+            if not await run_blocking(redis_client.exists, task_key(task_id)): # Expired without finishing
+                return
+            if time.monotonic() - last_sent >= TASK_EVENTS_KEEPALIVE: # Keeps proxies from closing an idle stream
+                yield json.dumps({"heartbeat": True}) + "\n"
+                last_sent = time.monotonic()
+            await asyncio.sleep(TASK_EVENTS_POLL_INTERVAL)
+
+    return StreamingResponse(event_lines(), media_type="application/x-ndjson")
+
+def parse_byte_range(range_header: str, size: int) -> tuple:
+    """Parse a single 'bytes=start-end' range into inclusive (start, end), None if it can't be satisfied"""
+    try:
+        unit, byte_range = range_header.split("=", 1)
+        start, end = byte_range.strip().split("-", 1)
+        if unit.strip() != "bytes" or "," in byte_range:
+            return None
+        if start == "": # Suffix range, ex: bytes=-500 is the last 500 bytes
+            start, end = max(0, size - int(end)), size - 1
+        else:
+            start, end = int(start), min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return None
+    return start, end
+
+def stored_report_response(task_id: str, metadata: dict, request: Request) -> Response:
+    """Serve a report from the report store. Sent gzip encoded as stored when the client accepts it,
+    otherwise decompressed, with support for a single byte range of the uncompressed report"""
+    filename = f"deployment-report-{metadata['component']}-{metadata['tag']}.log"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"', "Accept-Ranges": "bytes",
+               "Vary": "Accept-Encoding"}
+    range_header = request.headers.get("range")
+    if not range_header and "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=report_store.read_compressed(task_id), media_type="text/plain", headers=headers)
+    content = report_store.read(task_id)
+    if not range_header:
+        return Response(content=content, media_type="text/plain", headers=headers)
+    byte_range = parse_byte_range(range_header, len(content))
+    if byte_range is None:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{len(content)}"})
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(content)}"
+    return Response(content=content[start:end + 1], status_code=206, media_type="text/plain", headers=headers)
+
+@app.get("/deployment/reports")
+async def search_deployment_reports(component: str = None, tag: str = None, facility: str = None, user: str = None,
+                                    since: str = None, until: str = None, limit: int = 50):
+    """Search stored deployment reports, newest first. since/until are ISO dates (ex: 2025-01-31T08:00).
+    Download a report with GET /deployment/{task_id}/report"""
+    try:
+        since_ts = parser.parse(since).timestamp() if since else None
+        until_ts = parser.parse(until).timestamp() if until else None
+    except (ValueError, OverflowError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {e}")
+    reports = await run_blocking(lambda: report_store.search(component, tag, facility, user, since_ts, until_ts,
+                                                             max(1, min(limit, 500))))
+    for report in reports:
+        report["created_at"] = datetime.fromtimestamp(report["created_at"]).isoformat()
+    return {"payload": reports}
+
 @app.get("/deployment/{task_id}/report")
-async def download_deployment_report(task_id: str):
-    """Download the deployment report file"""
+async def download_deployment_report(task_id: str, request: Request):
+    """Download the deployment report, from the report store when it has it"""
+
+    metadata = await run_blocking(report_store.get, task_id)
+    if metadata:
+        return await run_blocking(stored_report_response, task_id, metadata, request)
 
     task = get_task(task_id)
 
@@ -688,22 +1690,84 @@ async def download_deployment_report(task_id: str):
         raise HTTPException(status_code=409, detail="Deployment not completed yet")
     
     report_file = task.result.get("report_file")
-    if not report_file or not os.path.exists(report_file):
+    # Hold the workspace while the file is sent, the janitor won't delete it mid-download
+    if not report_file or not workspaces.acquire(task_id):
+        raise HTTPException(status_code=404, detail="Report file not found")
+    if not os.path.exists(report_file):
+        workspaces.release(task_id)
         raise HTTPException(status_code=404, detail="Report file not found")
     
     return FileResponse(
         path=report_file,
         filename=os.path.basename(report_file),
-        media_type='text/plain'
+        media_type='text/plain',
+        background=BackgroundTask(workspaces.release, task_id)
     )
 
+def cached_release_for(component_name: str, tag: str, os_name: str):
+    """Return the cached release of a tag, 404 if it isn't in the release cache. A miss never downloads,
+    a GET for a member shouldn't cost a full release download (deploy or prestage the tag to cache it)"""
+    if os_name and os_name not in USED_OS_LIST:
+        raise HTTPException(status_code=400, detail=f"Invalid os: {os_name}, must be one of {USED_OS_LIST}")
+    cached_release = release_cache.lookup(component_name, tag, os_name)
+    if not cached_release:
+        raise HTTPException(status_code=404, detail=f"Release not cached: {component_name} {tag} "
+                                                    f"{os_name or ''}".rstrip())
+    return cached_release
+
+@app.get("/release/{component_name}/{tag}/members")
+async def list_release_members(component_name: str, tag: str, os_name: str = Query(None, alias="os"),
+                               prefix: str = None):
+    """List the members of a release (path, type, size, mode, sha256) from the release cache's member index.
+    prefix limits the list to one directory, ex: prefix=R1.0/iocBoot"""
+    def members():
+        cached_release = cached_release_for(component_name, tag, os_name)
+        return release_cache.members(cached_release)
+    members = await run_blocking(members)
+    if prefix:
+        prefix = prefix.rstrip('/')
+        members = [member for member in members
+                   if member['path'] == prefix or member['path'].startswith(prefix + '/')]
+    return {"payload": members}
+
+def member_file_response(filepath: str, request: Request) -> Response:
+    """Serve a release member file, with support for a single byte range"""
+    headers = {"Content-Disposition": f'attachment; filename="{os.path.basename(filepath)}"', "Accept-Ranges": "bytes"}
+    range_header = request.headers.get("range")
+    if not range_header:
+        return FileResponse(path=filepath, media_type='application/octet-stream', headers=headers)
+    size = os.path.getsize(filepath)
+    byte_range = parse_byte_range(range_header, size)
+    if byte_range is None:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    start, end = byte_range
+    with open(filepath, 'rb') as file:
+        file.seek(start)
+        content = file.read(end - start + 1)
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return Response(content=content, status_code=206, media_type='application/octet-stream', headers=headers)
+
+@app.get("/release/{component_name}/{tag}/member")
+async def download_release_member(component_name: str, tag: str, path: str, request: Request,
+                                  os_name: str = Query(None, alias="os")):
+    """Download a single file of a release (path as listed by /members) from the release cache's
+    extracted tree, without going through the tarball"""
+    def member_response():
+        cached_release = cached_release_for(component_name, tag, os_name)
+        filepath = release_cache.member_path(cached_release, path)
+        if not filepath or not os.path.isfile(filepath):
+            raise HTTPException(status_code=404, detail=f"Release member not found: {path}")
+        return member_file_response(filepath, request)
+    return await run_blocking(member_response)
+
 @app.put("/ioc/deployment/revert")
 async def revert_ioc_deployment(ioc_to_deploy: RevertDict, background_tasks: BackgroundTasks):
     """
     Revert a deployment for an IOC application to the previous iteration.
     """
-    current_deployment = find_recent_deployment_for_component_facility(ioc_to_deploy.facility, ioc_to_deploy.component_name, 0)
-    previous_deployment = find_recent_deployment_for_component_facility(ioc_to_deploy.facility, ioc_to_deploy.component_name, 1)
+    current_deployment, previous_deployment = await asyncio.gather(
+        run_blocking(find_recent_deployment_for_component_facility, ioc_to_deploy.facility, ioc_to_deploy.component_name, 0),
+        run_blocking(find_recent_deployment_for_component_facility, ioc_to_deploy.facility, ioc_to_deploy.component_name, 1))
 
     # 1) Check which IOCs tags have changed from the current deployment to the previous deployment
     # Get changed IOCs and revert tag
@@ -727,12 +1791,24 @@ async def revert_ioc_deployment(ioc_to_deploy: RevertDict, background_tasks: Bac
     # 2) Deploy the reverted deployment for this facility
     if not revert_tag:
         return JSONResponse(status_code=400, content={"payload": "No previous deployment found to revert to"})
+    # Fast path - the revert tag is one of the last REVERT_KEEP_RELEASES deployed to the facility, so it is
+    # still on the hosts and pinned in the release cache, only the IOCs are switched back
+    switch_only = False
+    if ioc_to_deploy.switch_only is not False and REVERT_KEEP_RELEASES >= 2:
+        switch_only = await run_blocking(revert_release_kept, ioc_to_deploy.component_name,
+                                         ioc_to_deploy.facility, revert_tag)
+        if not switch_only:
+            logging.info(f"{ioc_to_deploy.component_name} {revert_tag} is not kept for {ioc_to_deploy.facility}, "
+                         f"transferring the release")
     revert_deployment = DeployDict(component_name=ioc_to_deploy.component_name,
                             facilities=[ioc_to_deploy.facility],
                             tag=revert_tag,
                             ioc_list=iocs_that_changed,
                             user=ioc_to_deploy.user,
-                            playbook='ioc_module/ioc_deploy.yml')
+                            playbook='ioc_module/ioc_deploy.yml',
+                            switch_only=switch_only,
+                            use_prestaged=not switch_only,
+                            priority=REVERT_PRIORITY)
 
     return await deploy(revert_deployment, background_tasks)
 
@@ -741,7 +1817,8 @@ async def deploy(deploy_request: DeployDict, background_tasks: BackgroundTasks):
     """Unified deployment endpoint. Routes to IOC, PyDM, container, or generic handler
     based on the playbook field (e.g. 'ioc_module/...', 'pydm_module/...', 'container_module/...').
     When deploy_request.sync=True, blocks until deployment completes and returns the full result (success, elog_url).
-    When deploy_request.sync=False (default), returns immediately with a task_id for status polling."""
+    When deploy_request.sync=False (default), returns immediately with a task_id for status polling.
+    With JOB_QUEUE_ENABLED, async deployments are queued for deployment_worker.py instead of running here."""
     task_id = str(uuid.uuid4())
     task = DeploymentTask(task_id, save_callback=save_task)
     save_task(task)
@@ -753,28 +1830,153 @@ async def deploy(deploy_request: DeployDict, background_tasks: BackgroundTasks):
         else:
             error = final_task.error if final_task else "Unknown error"
             return JSONResponse(status_code=500, content={"success": False, "elog_url": "", "error": error})
+    if JOB_QUEUE_ENABLED:
+        task.progress = {"current_step": "Queued", "percent": 0, "details": "Waiting for a deployment worker"}
+        save_task(task, ["progress"])
+        await run_blocking(job_queue.enqueue, task_id, deploy_request.component_name,
+                           deploy_request.model_dump(), deploy_request.priority or 0)
+        return JSONResponse(status_code=202, content={"task_id": task_id, "status": "pending"})
     background_tasks.add_task(deploy_async, task_id, deploy_request)
     return JSONResponse(status_code=202, content={"task_id": task_id, "status": "pending"})
 
-async def deploy_async(task_id: str, deploy_request: DeployDict):
-    """Dispatch to the right deployment handler based on playbook path."""
-    await asyncio.sleep(0.1)
-    task = get_task(task_id)
-    temp_dir = f"{APP_PATH}/tmp/{task_id}"
-    os.makedirs(temp_dir, exist_ok=True)
-    task.temp_dir = temp_dir
+@app.put("/deployment/prestage")
+async def prestage(prestage_request: DeployDict, background_tasks: BackgroundTasks):
+    """Copy an IOC release to every host of the requested facilities and verify it ahead of the deployment,
+    so a later PUT /deployment of the same tag skips the transfer (see prestage.py).
+    Same request as PUT /deployment (component_name, tag, facilities, merged_artifact_format), nothing is deployed.
+    Returns a task_id for status polling, or the per-host result with sync=True."""
+    task_id = str(uuid.uuid4())
+    task = DeploymentTask(task_id, save_callback=save_task)
+    save_task(task)
+    if prestage_request.sync:
+        await prestage_async(task_id, prestage_request)
+        final_task = get_task(task_id)
+        if final_task and final_task.status == "completed":
+            return JSONResponse(status_code=200, content=final_task.result)
+        error = final_task.error if final_task else "Unknown error"
+        return JSONResponse(status_code=500, content={"success": False, "error": error})
+    background_tasks.add_task(prestage_async, task_id, prestage_request)
+    return JSONResponse(status_code=202, content={"task_id": task_id, "status": "pending"})
+
+@app.post("/deployment/plan")
+async def plan_deployment(deploy_request: DeployDict):
+    """Preview a deployment without downloading or running anything: per facility, the IOCs changing tag,
+    the new IOCs and the unchanged IOCs (skipped by a deployment with skip_unchanged), from the deployment db
+    and the release cache. IOCs the release doesn't have are listed when its IOC manifest is cached."""
+    def plan() -> dict:
+        lookup = ComponentLookup(deploy_request.component_name)
+        is_ioc = 'ioc_module' in deploy_request.playbook
+        try:
+            facilities_ioc_dict = resolve_ioc_facilities(deploy_request, lookup) if is_ioc else \
+                                  {facility: [] for facility in deploy_request.facilities or []}
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        release_iocs = None
+        if is_ioc:
+            iocs = read_ioc_manifest(release_cache.load_metadata(deploy_request.component_name, deploy_request.tag,
+                                                                 IOC_MANIFEST_NAME))
+            release_iocs = set(ioc['folder_name'] for ioc in iocs) if iocs is not None else None
+        facilities = {}
+        for facility, ioc_names in facilities_ioc_dict.items():
+            facilities[facility] = plan_facility(lookup.get(facility), deploy_request.tag, ioc_names)
+            if release_iocs is not None:
+                facilities[facility]["not_in_release"] = [name for name in ioc_names if name not in release_iocs]
+        return {"component_name": deploy_request.component_name, "tag": deploy_request.tag,
+                "release_metadata_cached": release_iocs is not None, "facilities": facilities,
+                "nothing_to_deploy": all(facility_plan["skip"] for facility_plan in facilities.values())}
+    return {"payload": await run_blocking(plan)}
+
+def prepare_deployment_task(task_id: str, deploy_request: DeployDict) -> DeploymentTask:
+    """Load the task record and create its workspace (temp dir)"""
+    # A queued job can outlive the task record's expiry, start a fresh record in that case
+    task = get_task(task_id) or DeploymentTask(task_id, save_callback=save_task)
+    task.temp_dir = workspaces.create(task_id) # Holds the workspace until run_deployment() finishes
+    task.component_lookup = ComponentLookup(deploy_request.component_name)
+    return task
+
+def run_deployment(task: DeploymentTask, deploy_request: DeployDict):
+    """Run the deployment handler for the playbook and record the result on the task (blocking)"""
+    if 'ioc_module' in deploy_request.playbook:
+        handler = deploy_ioc_sync
+    elif 'container_module' in deploy_request.playbook:
+        handler = deploy_container_sync
+    else:
+        handler = run_generic_deployment
+    report_file = None
     try:
-        if 'ioc_module' in deploy_request.playbook:
-            result = await asyncio.get_running_loop().run_in_executor(None, deploy_ioc_sync, deploy_request, temp_dir, task)
-        elif 'container_module' in deploy_request.playbook:
-            result = await asyncio.get_running_loop().run_in_executor(None, deploy_container_sync, deploy_request, temp_dir, task)
-        else:
-            result = await asyncio.get_running_loop().run_in_executor(None, run_generic_deployment, deploy_request, temp_dir, task)
+        with workspaces.holding(task.task_id):
+            result = handler(deploy_request, task.temp_dir, task)
+        report_file = result.get("report_file") if isinstance(result, dict) else None
+        if report_file and store_report(task, deploy_request, result):
+            report_file = None # Stored, the workspace copy isn't needed anymore
+        submit_deployment_elog(task, deploy_request, result)
         task.complete(result)
     except Exception as e:
+        logging.exception(f"Deployment {task.task_id} failed")
+        task.fail(str(e))
+    finally:
+        release_deployment_workspace(task, report_file)
+
+def store_report(task: DeploymentTask, deploy_request: DeployDict, result: dict) -> bool:
+    """Save the deployment report to the report store, returns False if it couldn't be stored"""
+    try:
+        report_store.save(task.task_id, deploy_request.component_name, deploy_request.tag, deploy_request.user,
+                          result.get("facilities") or deploy_request.facilities, result.get("success"),
+                          deploy_request.dry_run, result["report_file"])
+        return True
+    except Exception as e: # Keep the report in the workspace, the report endpoint falls back to it
+        logging.error(f"Unable to store report for {task.task_id}: {str(e)}")
+        return False
+
+def release_deployment_workspace(task: DeploymentTask, report_file: str = None):
+    """Drop the deployment's workspace reference. Downloaded releases are deleted right away,
+    only the report is kept until the janitor deletes the workspace"""
+    try:
+        workspaces.prune(task.task_id, keep=[report_file] if report_file else None)
+        workspaces.release(task.task_id)
+    except Exception as e:
+        logging.error(f"Error releasing workspace {task.task_id}: {str(e)}")
+
+async def deploy_async(task_id: str, deploy_request: DeployDict):
+    """Run a deployment in this process, waiting for a free deployment slot."""
+    await asyncio.sleep(0.1)
+    task = prepare_deployment_task(task_id, deploy_request)
+    if deployment_slots.is_full():
+        # Keep status 'pending' while queued, the handler's first update_progress() marks it running
+        task.progress = {"current_step": "Queued", "percent": 0,
+                         "details": f"{deployment_slots.queued} deployment(s) queued ahead, "
+                                    f"{deployment_slots.running} running"}
+        save_task(task, ["progress"])
+    try:
+        async with deployment_slots.acquire():
+            await asyncio.get_running_loop().run_in_executor(deployment_executor, run_deployment,
+                                                             task, deploy_request)
+    except Exception as e: # Only reached if the executor itself fails, run_deployment records its own errors
         logging.exception(f"Deployment {task_id} failed")
         task.fail(str(e))
-        cleanup_temp_deployment_dir(temp_dir)
+        release_deployment_workspace(task)
+
+def run_prestage(task: DeploymentTask, prestage_request: DeployDict):
+    """Prestage a release and record the result on the task (blocking)"""
+    try:
+        task.complete(prestage_release(prestage_request, task.temp_dir, task))
+    except Exception as e:
+        logging.exception(f"Prestage {task.task_id} failed")
+        task.fail(str(e))
+    finally:
+        release_deployment_workspace(task)
+
+async def prestage_async(task_id: str, prestage_request: DeployDict):
+    """Run a prestage in this process, sharing the deployment slots"""
+    task = prepare_deployment_task(task_id, prestage_request)
+    try:
+        async with deployment_slots.acquire():
+            await asyncio.get_running_loop().run_in_executor(deployment_executor, run_prestage,
+                                                             task, prestage_request)
+    except Exception as e:
+        logging.exception(f"Prestage {task_id} failed")
+        task.fail(str(e))
+        release_deployment_workspace(task)
 
 def deploy_ioc_sync(ioc_to_deploy: DeployDict, temp_download_dir: str, task: DeploymentTask):
     """
@@ -812,7 +2014,7 @@ def deploy_component(ioc_to_deploy: DeployDict, temp_download_dir: str, task: De
     
     # Determine if component is new or not
     for facility in ioc_to_deploy.facilities:
-        component = find_component_in_facility(facility, ioc_to_deploy.component_name)
+        component = task.component_lookup.get(facility)
         if component is None:
             # New component for this facility
             new_component = True
@@ -844,7 +2046,7 @@ def deploy_existing_iocs(ioc_to_deploy: DeployDict, temp_download_dir: str, task
     # Process each IOC to find its facility(s)
     # the cli should do a check if the iocs the user wants to deploy actually exist
     for ioc in ioc_to_deploy.ioc_list:
-        facilities = find_facility_an_ioc_is_in(ioc, ioc_to_deploy.component_name)
+        facilities = find_facility_an_ioc_is_in(ioc, ioc_to_deploy.component_name, task.component_lookup)
         logging.info(f"ioc: {ioc}, facilities: {facilities}")
         if len(facilities) == 0: # Empty list
             return JSONResponse(content={"payload": {"Error": f"IOC not found in deployment database: {ioc}. (If new IOC then please deploy with a facility)"}}, status_code=400)
@@ -872,7 +2074,7 @@ def deploy_iocs_with_facility(ioc_to_deploy: DeployDict, temp_download_dir: str,
 
     # Check component existence in specified facilities
     for facility in ioc_to_deploy.facilities:
-        component = find_component_in_facility(facility, ioc_to_deploy.component_name)
+        component = task.component_lookup.get(facility)
         if component is None:
             # New component for this facility
             new_component = True
@@ -906,90 +2108,89 @@ def execute_ioc_deployment(ioc_to_deploy: DeployDict, temp_download_dir: str,
     status = 200
     deployment_report_file = temp_download_dir + '/deployment-report-' + ioc_to_deploy.component_name + '-' + ioc_to_deploy.tag + '.log'
     deployment_output = ""
-    extracted_ioc_info = False
-
-    # Download release
+    merged_format = ioc_to_deploy.merged_artifact_format or MERGED_ARTIFACT_FORMAT
+    if merged_format not in MERGED_ARTIFACT_FORMATS:
+        raise ValueError(f"Invalid merged_artifact_format: {merged_format}, must be one of {MERGED_ARTIFACT_FORMATS}")
+
+    if ioc_to_deploy.skip_unchanged:
+        requested_facilities = list(facilities_ioc_dict.keys())
+        facilities_ioc_dict = skip_unchanged_iocs(facilities_ioc_dict, ioc_to_deploy.tag, task.component_lookup)
+        if not facilities_ioc_dict: # Nothing is downloaded or deployed
+            result = finalize_deployment(
+                ioc_to_deploy.component_name, ioc_to_deploy.tag, ioc_to_deploy.user, requested_facilities,
+                f"== Nothing to deploy, {requested_facilities} already at {ioc_to_deploy.tag} ==\n\n", status, True,
+                deployment_report_file, ioc_to_deploy.dry_run)
+            result["nothing_to_deploy"] = True
+            return result
+
+    # Download release, only the IOCs being deployed for a selective release. Component-only deployments
+    # (an empty IOC list for any facility) always get the whole release
+    selective_release = ioc_to_deploy.selective_release
+    if selective_release is None:
+        selective_release = SELECTIVE_RELEASE
+    ioc_names = None
+    if selective_release and facilities_ioc_dict and all(facilities_ioc_dict.values()):
+        ioc_names = sorted(set(ioc for iocs in facilities_ioc_dict.values() for ioc in iocs))
+    playbook_args_dict['selective_release'] = bool(ioc_names)
     task.update_progress("Downloading release artifacts", 25)
-    if not download_release(ioc_to_deploy.component_name, ioc_to_deploy.tag, temp_download_dir, all_os=True, extract_tarball=True):
+    # A switch_only revert takes the pinned release from the release cache, a miss transfers it like a deployment
+    downloaded = False
+    if ioc_to_deploy.switch_only:
+        downloaded = download_release(ioc_to_deploy.component_name, ioc_to_deploy.tag, temp_download_dir, all_os=True,
+                                      extract_tarball=True, merged_format=merged_format, ioc_names=ioc_names,
+                                      cached_only=True)
+        if not downloaded:
+            logging.warning(f"{ioc_to_deploy.component_name} {ioc_to_deploy.tag} no longer cached, transferring the release")
+            playbook_args_dict['switch_only'] = False
+    if not downloaded and not download_release(ioc_to_deploy.component_name, ioc_to_deploy.tag, temp_download_dir,
+                                               all_os=True, extract_tarball=True, merged_format=merged_format,
+                                               ioc_names=ioc_names):
         return JSONResponse(content={"payload": {"Error": f"Deployment tag may not exist for app: {ioc_to_deploy.component_name}, tag: {ioc_to_deploy.tag} \
                                     . Or software factory backend is broken"}}, status_code=400)
-    facility_num = 1
-    for facility in facilities_ioc_dict.keys():
-        logging.info(f"Deploying to facility: {facility}")
-        logging.info(f"IOCs to deploy: {facilities_ioc_dict[facility]}")
-        percent = 40 + (facility_num * 10 // len(facilities_ioc_dict))
-        task.update_progress(f"Deploying to {facility}", percent, f"Running playbook for {facility}")
-        
-        ioc_playbooks_path = ANSIBLE_PLAYBOOKS_PATH + 'ioc_module'
-        playbook_args_dict['playbook_path'] = ioc_playbooks_path
-        local_ioc_playbooks_path = ANSIBLE_PLAYBOOKS_PATH + 'ioc_module'
-        inventory_file_path = get_inventory_path()
 
-        # Skip facilities with empty IOC lists for component-only deployments
-        is_component_only = len(facilities_ioc_dict[facility]) == 0
-        
-        # Extract IOC info (needed even for component-only to record component in DB)
-        if not extracted_ioc_info:
-            extracted_tarball_filepath = os.path.join(temp_download_dir, ioc_to_deploy.tag)
-            ioc_info = extract_ioc_cpu_shebang_info(extracted_tarball_filepath)
-            # Figure out which startup.cmd to use for each ioc
-            ioc_info_list_dict = []
-            for ioc in ioc_info:
-                if ('linuxrt' in ioc['architecture'].lower()):
-                    if ('ioc' in ioc['folder_name']):
-                        startup_cmd_template = 'startup.cmd.linuxRT'
-                    else:
-                        startup_cmd_template = 'startup.cmd.cpu'
-                elif ('rtems' in ioc['architecture'].lower()):
-                    startup_cmd_template = 'startup.cmd.rtems'
-                else: # We can assume if not linuxrt or rtems, then it is a softioc/cpu
-                    if ('ioc' in ioc['folder_name'].lower()):
-                        startup_cmd_template = 'startup.cmd.soft'
-                    else:
-                        startup_cmd_template = 'startup.cmd.soft.cpu'
-                ioc_dict = {
-                    'name': ioc['folder_name'],
-                    'architecture': ioc['architecture'],
-                    'binary': ioc['binary'],
-                    'startup_cmd_template': startup_cmd_template
-                }
-                ioc_info_list_dict.append(ioc_dict)
-            extracted_ioc_info = True
-
-        # Add the tarball path
-        extracted_tarball_filepath = os.path.join(temp_download_dir, ioc_to_deploy.tag)
-        tarball_filepath = extracted_tarball_filepath + '.tar.gz'
+    ioc_playbooks_path = ANSIBLE_PLAYBOOKS_PATH + 'ioc_module'
+    playbook_args_dict['playbook_path'] = ioc_playbooks_path
+    local_ioc_playbooks_path = ANSIBLE_PLAYBOOKS_PATH + 'ioc_module'
+    inventory_file_path = get_inventory_path()
+
+    # Extract IOC info (needed even for component-only to record component in DB)
+    extracted_tarball_filepath = os.path.join(temp_download_dir, ioc_to_deploy.tag)
+    ioc_index = build_ioc_index(extract_ioc_cpu_shebang_info(extracted_tarball_filepath, ioc_to_deploy.component_name,
+                                                             ioc_to_deploy.tag))
+
+    # Releases the playbook keeps on the hosts for switch_only reverts
+    playbook_args_dict['keep_releases'] = REVERT_KEEP_RELEASES
+    # Add the release path, the playbook picks 'tarball' or 'release_dir' based on 'release_format'
+    playbook_args_dict['release_format'] = merged_format
+    playbook_args_dict['release_dir'] = extracted_tarball_filepath
+    if (merged_format != 'directory'):
+        tarball_filepath = f"{extracted_tarball_filepath}.{merged_format}"
         logging.info(f"tarball_filepath: {tarball_filepath}")
         playbook_args_dict['tarball'] = tarball_filepath
 
-        # For IOC deployments, prepare facility_ioc_dict
-        facility_ioc_dict = []
-        if not is_component_only:
-            # Iterate over ioc_list_dict and add matching items to facility_ioc_dict
-            for ioc in ioc_info_list_dict:
-                if ioc['name'] in facilities_ioc_dict[facility]:
-                    if ('cpu' in ioc['startup_cmd_template']): # Add the facility to startup.cmd template if cpu
-                        ioc['startup_cmd_template'] += f'.{facility.lower()}'
-                    facility_ioc_dict.append(ioc)
-
-        logging.info(f"facility_ioc_dict: {facility_ioc_dict}")
-        playbook_args_dict['ioc_list'] = facility_ioc_dict # Update ioc list for each facility    
-        playbook_args_dict['facility'] = facility
-        
-        playbook_args = json.dumps(playbook_args_dict) # Convert dictionary to JSON string
-        stdout, stderr, return_code = ansible_api.run_ansible_playbook(inventory_file_path, local_ioc_playbooks_path + '/ioc_deploy.yml',
-                                    facility, playbook_args, return_output=True, no_color=True, check_mode=ioc_to_deploy.dry_run)
-        # Combine output
-        current_output = ""
-        current_output += "== Deployment output for " + facility + ' ==\n\n' + stdout
-        deployment_success = True
-        if (return_code != 0):
-            status = 400 # Deployment failed
-            if (stderr != ''):
-                current_output += "\n== Errors ==\n\n" + stderr
-                deployment_success = False
-        deployment_output += current_output
-    
+    # Build the playbook arguments for every facility up front, the playbooks may then run concurrently.
+    # Component-only facilities (empty IOC list) get an empty ioc_list
+    facility_ioc_lists = {}
+    for facility in facilities_ioc_dict.keys():
+        facility_ioc_lists[facility] = facility_ioc_list(ioc_index, facility, facilities_ioc_dict[facility])
+        logging.info(f"facility_ioc_dict: {facility_ioc_lists[facility]}")
+
+    # Facilities with the release already staged on every host (PUT /deployment/prestage) skip the transfer,
+    # with delta_transfer the others only get the files changed since their deployed tag
+    facility_release_vars = {}
+    if ioc_to_deploy.use_prestaged and not ioc_names and not ioc_to_deploy.dry_run:
+        staged_facilities = prestaged_facilities(ioc_to_deploy.component_name, ioc_to_deploy.tag, merged_format,
+                                                 list(facilities_ioc_dict.keys()))
+        if staged_facilities:
+            logging.info(f"Using prestaged release for facilities: {list(staged_facilities.keys())}")
+        facility_release_vars.update({facility: prestage_playbook_vars(record) for facility, record in staged_facilities.items()})
+    if ioc_to_deploy.delta_transfer and merged_format != 'directory' and not playbook_args_dict['switch_only']:
+        task.update_progress("Computing release deltas", 30)
+        facility_release_vars.update(build_release_deltas(
+            ioc_to_deploy, [facility for facility in facilities_ioc_dict if facility not in facility_release_vars],
+            extracted_tarball_filepath, temp_download_dir, merged_format, task))
+
+    def record_facility(facility: str, current_output: str, deployment_success: bool):
         if (not ioc_to_deploy.dry_run):
             # Write new configuration to deployment db for each facility
             # Determine new component if current facility is in new_component_facilities
@@ -1004,6 +2205,74 @@ def execute_ioc_deployment(ioc_to_deploy: DeployDict, temp_download_dir: str,
                 current_output, 
                 facilities_ioc_dict[facility]
             )
+            if (deployment_success):
+                try:
+                    pin_deployed_release(ioc_to_deploy.component_name, facility, ioc_to_deploy.tag, bool(ioc_names))
+                except OSError as e: # Reverts to this tag just won't be as fast
+                    logging.warning(f"Unable to pin {ioc_to_deploy.component_name} {ioc_to_deploy.tag} for {facility}: {e}")
+
+    def facility_playbook_args(facility: str) -> dict:
+        # Update ioc list for each facility
+        return dict(playbook_args_dict, ioc_list=facility_ioc_lists[facility], facility=facility,
+                    **facility_release_vars.get(facility, {}))
+
+    def facility_digest(facility: str) -> str:
+        return facility_args_digest(facility_playbook_args(facility), temp_download_dir)
+
+    def deploy_facility(facility: str):
+        logging.info(f"Deploying to facility: {facility}")
+        logging.info(f"IOCs to deploy: {facilities_ioc_dict[facility]}")
+        playbook_args = json.dumps(facility_playbook_args(facility))
+        stdout, stderr, return_code = run_streamed_playbook(task, facility, temp_download_dir, full_log_files,
+                                    inventory_file_path, local_ioc_playbooks_path + '/ioc_deploy.yml',
+                                    facility, playbook_args, return_output=True, no_color=True, check_mode=ioc_to_deploy.dry_run)
+        # Combine output
+        current_output = ""
+        current_output += "== Deployment output for " + facility + ' ==\n\n' + stdout
+        deployment_success = (return_code == 0)
+        if (not deployment_success and stderr != ''):
+            current_output += "\n== Errors ==\n\n" + stderr
+        record_facility(facility, current_output, deployment_success)
+        return current_output, deployment_success
+
+    full_log_files = {}
+    facilities = list(facilities_ioc_dict.keys())
+    task.update_progress("Deploying to facilities", 40, f"Running playbooks for {facilities}")
+    if (ioc_to_deploy.batch_facilities):
+        # One run covers every facility, so hold all the facility locks (sorted, so two batches can't deadlock)
+        locks = [] if ioc_to_deploy.dry_run else [new_deployment_lock(ioc_to_deploy, facility, task, facility_digest(facility))
+                                                  for facility in sorted(facilities)]
+        held_locks = []
+        results = None
+        try:
+            for lock in locks:
+                if not lock.acquire(DEPLOYMENT_LOCK_WAIT_TIMEOUT, on_wait=report_lock_wait(task, lock.facility)):
+                    raise TimeoutError(f"Timed out waiting for another deployment of {ioc_to_deploy.component_name} to {lock.facility}")
+                held_locks.append(lock)
+            with ExitStack() as leases:
+                for lock in held_locks:
+                    leases.enter_context(lock.lease())
+                results = run_batched_ioc_playbook(facilities, facility_ioc_lists, playbook_args_dict, inventory_file_path,
+                                                   local_ioc_playbooks_path + '/ioc_deploy.yml', temp_download_dir,
+                                                   ioc_to_deploy.dry_run, facility_release_vars)
+                for facility in facilities:
+                    record_facility(facility, *results[facility])
+        finally:
+            for lock in held_locks:
+                lock.release(results[lock.facility][1] if results else None)
+    else:
+        results = run_facility_rollout(ioc_to_deploy, facilities, deploy_facility, task, 40, 90, facility_digest)
+    deployment_success = True
+    for facility in facilities: # Assemble the report in facility order, regardless of completion order
+        current_output, facility_success = results[facility]
+        if (not facility_success):
+            status = 400 # Deployment failed
+            deployment_success = False
+        deployment_output += current_output
+    if (not ioc_to_deploy.dry_run):
+        # The tag is on these hosts now, staged copies of it only take disk space
+        remove_deployed_prestage(ioc_to_deploy.component_name, ioc_to_deploy.tag,
+                                 [facility for facility in facilities if results[facility][1]])
         
     if deployment_output == "":
         raise ValueError("No deployments performed. This may be due to empty IOC lists or invalid component/facility combinations.")
@@ -1014,7 +2283,8 @@ def execute_ioc_deployment(ioc_to_deploy: DeployDict, temp_download_dir: str,
     return finalize_deployment(
         ioc_to_deploy.component_name, ioc_to_deploy.tag, ioc_to_deploy.user,
         list(facilities_ioc_dict.keys()), deployment_output, status, deployment_success,
-        deployment_report_file, ioc_to_deploy.dry_run, facilities_ioc_dict
+        deployment_report_file, ioc_to_deploy.dry_run, facilities_ioc_dict,
+        [full_log_files[facility] for facility in facilities if facility in full_log_files]
     )
 
 def deploy_container_sync(container_to_deploy: DeployDict, temp_dir: str, task: DeploymentTask):
@@ -1061,7 +2331,7 @@ def deploy_container_sync(container_to_deploy: DeployDict, temp_dir: str, task:
     deployment_report_file = os.path.join(temp_dir, f'deployment-report-{container_to_deploy.component_name}-{container_to_deploy.tag}.log')
     full_playbook_path = os.path.join(ANSIBLE_PLAYBOOKS_PATH, container_to_deploy.playbook)
 
-    for facility in facilities:
+    def deploy_facility(facility: str):
         logging.info(f"Deploying container to facility: {facility}")
         playbook_args = json.dumps(playbook_args_dict)
         stdout, stderr, return_code = ansible_api.run_ansible_playbook(
@@ -1074,17 +2344,24 @@ def deploy_container_sync(container_to_deploy: DeployDict, temp_dir: str, task:
         )
 
         current_output = "== Container deployment output for " + facility + ' ==\n\n' + stdout
-        if (return_code != 0):
+        facility_success = (return_code == 0)
+        if (not facility_success and stderr != ''):
+            current_output += "\n== Errors ==\n\n" + stderr
+        # deployment_success carries over from earlier facilities, as before
+        update_db_after_deployment(deployment_success and facility_success, True, facility, 'container',
+                                  container_to_deploy.component_name, container_to_deploy.tag,
+                                  container_to_deploy.user, current_output)
+        return current_output, facility_success
+
+    for facility in facilities:
+        current_output, facility_success = run_locked_facility(
+            container_to_deploy, task, facility, deploy_facility,
+            facility_args_digest(dict(playbook_args_dict, facility=facility), temp_dir))
+        if (not facility_success):
             status = 400
-            if (stderr != ''):
-                current_output += "\n== Errors ==\n\n" + stderr
             deployment_success = False
         deployment_output += current_output
 
-        update_db_after_deployment(deployment_success, True, facility, 'container',
-                                  container_to_deploy.component_name, container_to_deploy.tag,
-                                  container_to_deploy.user, current_output)
-
     if deployment_output == "":
         raise ValueError("No deployments performed")
 
@@ -1127,7 +2404,7 @@ def run_generic_deployment(deploy_request: DeployDict, temp_dir: str, task: Depl
             headers["Authorization"] = f"token {github_token}"
 
         try:
-            response = requests.get(deploy_request.artifact_url, headers=headers, stream=True, allow_redirects=True)
+            response = http_client.get(deploy_request.artifact_url, 'GET artifact_url', headers=headers, stream=True, allow_redirects=True)
             if response.status_code != 200:
                 raise ValueError(f"Failed to download artifact from {deploy_request.artifact_url}: HTTP {response.status_code}")
             with open(artifact_filepath, 'wb') as f:
@@ -1163,30 +2440,38 @@ def run_generic_deployment(deploy_request: DeployDict, temp_dir: str, task: Depl
     if deploy_request.extra_vars:
         playbook_args_dict.update(deploy_request.extra_vars)
 
-    status = 200
-    deployment_output = ""
-    deployment_success = True
-    elog_url = ""
-    for i, facility in enumerate(facilities):
-        task.update_progress(f"Deploying to {facility}", 30 + int(60 * i / max(len(facilities), 1)))
-        playbook_args_dict['facility'] = facility
-        playbook_args = json.dumps(playbook_args_dict)
-        stdout, stderr, return_code = ansible_api.run_ansible_playbook(
+    def facility_digest(facility: str) -> str:
+        return facility_args_digest(dict(playbook_args_dict, facility=facility), temp_dir)
+
+    def deploy_facility(facility: str):
+        facility_args_dict = dict(playbook_args_dict, facility=facility)
+        playbook_args = json.dumps(facility_args_dict)
+        stdout, stderr, return_code = run_streamed_playbook(
+            task, facility, temp_dir, full_log_files,
             inventory_file_path, full_playbook_path, facility, playbook_args,
             return_output=True, no_color=True, check_mode=deploy_request.dry_run)
         current_output = f"== Deployment output for {facility} ==\n\n{stdout}"
-        deployment_success = True
-        if return_code != 0:
-            status = 400
-            if stderr:
-                current_output += f"\n== Errors ==\n\n{stderr}"
-            deployment_success = False
-        deployment_output += current_output
+        deployment_success = (return_code == 0)
+        if not deployment_success and stderr:
+            current_output += f"\n== Errors ==\n\n{stderr}"
         if not deploy_request.dry_run:
-            is_new_component = find_component_in_facility(facility, deploy_request.component_name) is None
+            is_new_component = task.component_lookup.get(facility) is None
             update_db_after_deployment(deployment_success, is_new_component, facility, app_type,
                                        deploy_request.component_name, deploy_request.tag,
                                        deploy_request.user, current_output)
+        return current_output, deployment_success
+
+    status = 200
+    deployment_output = ""
+    deployment_success = True
+    full_log_files = {}
+    results = run_facility_rollout(deploy_request, facilities, deploy_facility, task, 30, 90, facility_digest)
+    for facility in facilities: # Assemble the report in facility order, regardless of completion order
+        current_output, facility_success = results[facility]
+        if not facility_success:
+            status = 400
+            deployment_success = False
+        deployment_output += current_output
 
     if deployment_output == "":
         raise ValueError("No deployments performed — check facilities list and component name")
@@ -1197,7 +2482,8 @@ def run_generic_deployment(deploy_request: DeployDict, temp_dir: str, task: Depl
     return finalize_deployment(
         deploy_request.component_name, deploy_request.tag, deploy_request.user,
         facilities, deployment_output, status, deployment_success,
-        deployment_report_file, deploy_request.dry_run
+        deployment_report_file, deploy_request.dry_run,
+        full_log_files=[full_log_files[facility] for facility in facilities if facility in full_log_files]
     )
 
 
@@ -1208,7 +2494,7 @@ async def initial_deployment(initial_deployment: InitialDeploymentDict):
     This endpoint is intended to be used by software factory admins only
     """
     # Check if component already exists in deployment database
-    component = find_component_in_facility(initial_deployment.facility, initial_deployment.component_name)
+    component = await run_blocking(find_component_in_facility, initial_deployment.facility, initial_deployment.component_name)
     if (component): return JSONResponse(content={"payload": {"Error": "Deployment already exists in deployment configuration/database"}}, status_code=400)
 
     # add an entry to deployment database
@@ -1221,9 +2507,10 @@ async def initial_deployment(initial_deployment: InitialDeploymentDict):
     new_component['dependsOn'] = initial_deployment.ioc_list
     logging.debug(f"new_component: {new_component}")
     endpoint = BACKEND_URL + 'deployments'
-    response = requests.post(endpoint, json=new_component, timeout=REQUEST_TIMEOUT)
-    add_log_to_component(initial_deployment.facility, timestamp, initial_deployment.user,
-                          initial_deployment.component_name, "Initial deployment entry added by software factory admins")
+    response = await run_blocking(lambda: http_client.post(endpoint, 'POST deployments', json=new_component))
+    component_cache.invalidate((initial_deployment.facility, initial_deployment.component_name))
+    await run_blocking(add_log_to_component, initial_deployment.facility, timestamp, initial_deployment.user,
+                       initial_deployment.component_name, "Initial deployment entry added by software factory admins")
     return JSONResponse(content={"payload": {"Success": "Deployment added to database"}}, status_code=200)
 
 if __name__ == "__main__":
@@ -0,0 +1,88 @@
+"""
+Desc: Deployment worker, runs deployments queued by the deployment controller (JOB_QUEUE_ENABLED=true)
+
+Usage: python3 deployment_worker.py
+note - run as many workers as needed (ex: more replicas of the worker pod), they share the redis queue.
+       Same image and environment variables as the deployment controller.
+"""
+import os
+import time
+import signal
+import socket
+import logging
+import job_queue as jq
+import deployment_controller as dc
+
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2")) # seconds between claims when the queue is empty
+
+stopping = False
+last_sweep = 0.0
+
+def request_stop(signum, frame):
+    """ Finish the current deployment, then exit (ex: pod termination sends SIGTERM) """
+    global stopping
+    logging.info(f"Received signal {signum}, stopping after the current job")
+    stopping = True
+
+def fail_dead_jobs(dead_jobs: list):
+    for job_id in dead_jobs:
+        task = dc.get_task(job_id)
+        if task:
+            task.fail(f"Deployment worker stopped responding {dc.JOB_MAX_ATTEMPTS} times, giving up")
+
+def sweep_workspaces():
+    """ Workers have no uvicorn janitor, delete released workspaces and expired staged copies while idle """
+    global last_sweep
+    if time.monotonic() - last_sweep < dc.WORKSPACE_JANITOR_INTERVAL:
+        return
+    last_sweep = time.monotonic()
+    try:
+        dc.workspaces.sweep()
+        dc.sweep_expired_prestage()
+    except Exception as e:
+        logging.error(f"Workspace sweep failed: {e}")
+
+def send_elog_entries():
+    """ Help drain the ELOG outbox while idle """
+    try:
+        dc.elog_outbox.drain(dc.ELOG_BATCH_SIZE, dc.ELOG_RATE_LIMIT)
+    except Exception as e:
+        logging.error(f"ELOG outbox drain failed: {e}")
+
+def run_job(job: jq.Job):
+    deploy_request = dc.DeployDict(**job.payload)
+    task = dc.prepare_deployment_task(job.job_id, deploy_request)
+    with jq.keep_alive(dc.job_queue, job):
+        dc.run_deployment(task, deploy_request)
+
+def main():
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    logging.info(f"Deployment worker {worker_id} started")
+    while not stopping:
+        try:
+            fail_dead_jobs(dc.job_queue.reap())
+            job = dc.job_queue.claim(worker_id)
+        except Exception as e: # Redis unavailable, try again later
+            logging.error(f"Job queue unavailable: {e}")
+            time.sleep(JOB_POLL_INTERVAL)
+            continue
+        if not job:
+            sweep_workspaces()
+            send_elog_entries()
+            time.sleep(JOB_POLL_INTERVAL)
+            continue
+        try:
+            run_job(job)
+        except Exception:
+            logging.exception(f"Job {job.job_id} raised an error")
+            task = dc.get_task(job.job_id)
+            if task and task.status not in ("completed", "failed"):
+                task.fail("Deployment worker error, see worker logs")
+        finally:
+            dc.job_queue.ack(job)
+    logging.info(f"Deployment worker {worker_id} stopped")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Desc: Durable ELOG outbox for the deployment controller. Deployments enqueue their ELOG entry and complete
+right away, a background sender (every uvicorn worker and deployment_worker.py) drains the outbox with
+retries, a per-drain batch size and a rate limit.
+
+Keys:
+    elog:outbox        - ZSET entry_id -> time the entry is next due. Claiming an entry pushes it lease
+                         seconds into the future, so an entry claimed by a sender that died is retried
+    elog:entry:<id>    - JSON entry {entry_id, task_id, component, tag, facilities, summary, attempts}
+    elog:dead          - LIST of entries that ran out of attempts (latest first, capped)
+"""
+import json
+import time
+import logging
+import redis
+
+DEAD_ENTRIES_KEPT = 100
+
+class ElogOutbox(object):
+    def __init__(self, redis_getter, send_func, on_done=None, max_attempts: int = 8, base_backoff: float = 30,
+                 max_backoff: float = 3600, lease: float = 120):
+        """ redis_getter: callable returning the redis client, resolved on every call
+            send_func(entry) -> elog_url, or a falsy value if the submission failed
+            on_done(entry, elog_url) is called once an entry is sent, or with None once it is given up on """
+        self.redis_getter = redis_getter
+        self.send_func = send_func
+        self.on_done = on_done
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.outbox_key = "elog:outbox"
+        self.dead_key = "elog:dead"
+        self.last_send = 0.0
+
+    def _entry_key(self, entry_id: str) -> str:
+        return f"elog:entry:{entry_id}"
+
+    def enqueue(self, task_id: str, component: str, tag: str, facilities: list, summary: str) -> str:
+        """ Add an ELOG entry for a deployment, returns the entry id (the task id) """
+        entry = {"entry_id": task_id, "task_id": task_id, "component": component, "tag": tag,
+                 "facilities": facilities, "summary": summary, "attempts": 0, "created_at": time.time()}
+        pipe = self.redis_getter().pipeline()
+        pipe.set(self._entry_key(task_id), json.dumps(entry))
+        pipe.zadd(self.outbox_key, {task_id: time.time()})
+        pipe.execute()
+        return task_id
+
+    def _claim(self, entry_id: str) -> bool:
+        """ Push a due entry lease seconds ahead, False if another sender got it first """
+        with self.redis_getter().pipeline() as pipe:
+            try:
+                pipe.watch(self.outbox_key)
+                score = pipe.zscore(self.outbox_key, entry_id)
+                if score is None or score > time.time():
+                    return False
+                pipe.multi()
+                pipe.zadd(self.outbox_key, {entry_id: time.time() + self.lease})
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def _wait_for_rate_limit(self, min_interval: float):
+        wait = self.last_send + min_interval - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self.last_send = time.monotonic()
+
+    def drain(self, batch_size: int = 10, rate_limit: float = 2.0) -> int:
+        """ Send up to batch_size due entries, at most rate_limit submissions per second from this process.
+            Returns the number of entries sent """
+        client = self.redis_getter()
+        sent = 0
+        for entry_id in client.zrangebyscore(self.outbox_key, '-inf', time.time(), start=0, num=batch_size):
+            if not self._claim(entry_id):
+                continue
+            data = client.get(self._entry_key(entry_id))
+            if data is None: # Entry record is gone, drop the orphan id
+                client.zrem(self.outbox_key, entry_id)
+                continue
+            entry = json.loads(data)
+            entry["attempts"] += 1
+            self._wait_for_rate_limit(1.0 / rate_limit if rate_limit else 0)
+            try:
+                elog_url = self.send_func(entry)
+            except Exception as e:
+                logging.error(f"ELOG submission for {entry['task_id']} raised an error: {e}")
+                elog_url = None
+            if elog_url:
+                pipe = client.pipeline()
+                pipe.zrem(self.outbox_key, entry_id)
+                pipe.delete(self._entry_key(entry_id))
+                pipe.execute()
+                sent += 1
+                logging.info(f"ELOG entry for {entry['task_id']} sent after {entry['attempts']} attempt(s)")
+                self._done(entry, elog_url)
+            elif entry["attempts"] >= self.max_attempts:
+                logging.error(f"ELOG entry for {entry['task_id']} failed {entry['attempts']} times, giving up")
+                pipe = client.pipeline()
+                pipe.zrem(self.outbox_key, entry_id)
+                pipe.delete(self._entry_key(entry_id))
+                pipe.lpush(self.dead_key, json.dumps(entry))
+                pipe.ltrim(self.dead_key, 0, DEAD_ENTRIES_KEPT - 1)
+                pipe.execute()
+                self._done(entry, None)
+            else:
+                backoff = min(self.max_backoff, self.base_backoff * 2 ** (entry["attempts"] - 1))
+                logging.warning(f"ELOG entry for {entry['task_id']} failed (attempt {entry['attempts']}), retrying in {backoff}s")
+                pipe = client.pipeline()
+                pipe.set(self._entry_key(entry_id), json.dumps(entry))
+                pipe.zadd(self.outbox_key, {entry_id: time.time() + backoff})
+                pipe.execute()
+        return sent
+
+    def _done(self, entry: dict, elog_url: str):
+        if self.on_done:
+            try:
+                self.on_done(entry, elog_url)
+            except Exception as e:
+                logging.error(f"ELOG on_done callback failed for {entry['task_id']}: {e}")
+
+    def stats(self) -> dict:
+        client = self.redis_getter()
+        return {"pending": client.zcard(self.outbox_key), "dead": client.llen(self.dead_key)}
@@ -0,0 +1,75 @@
+"""
+Desc: Shared HTTP client for the deployment controller's backend and ELOG calls.
+One pooled requests.Session is reused by every helper so connections (TCP + TLS) are kept alive
+between calls instead of being opened per request. Idempotent verbs are retried with backoff,
+and per-endpoint latency is recorded for the /metrics endpoint.
+"""
+import time
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Verbs that are safe to retry, POST is never retried (ex: would add a duplicate deployment log)
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'])
+RETRY_STATUS_CODES = [502, 503, 504]
+
+class HttpClient(object):
+    def __init__(self, timeout: int, pool_maxsize: int = 16, retries: int = 3, backoff_factor: float = 0.5):
+        self.timeout = timeout
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                      backoff_factor=backoff_factor, status_forcelist=RETRY_STATUS_CODES,
+                      allowed_methods=IDEMPOTENT_METHODS, raise_on_status=False)
+        # pool_connections is the number of hosts kept (backend, ELOG, github), pool_maxsize the connections per host
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=retry,
+                              pool_block=False)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._metrics = {}
+        self._metrics_lock = threading.Lock()
+
+    def request(self, method: str, url: str, endpoint_name: str = None, **kwargs) -> requests.Response:
+        """ Send a request on the pooled session. endpoint_name groups latency metrics,
+            ex: 'GET deployments/{component}/{facility}' (defaults to the method and url) """
+        kwargs.setdefault('timeout', self.timeout)
+        endpoint_name = endpoint_name or f"{method} {url}"
+        start = time.monotonic()
+        failed = False
+        try:
+            response = self.session.request(method, url, **kwargs)
+            failed = response.status_code >= 500
+            return response
+        except requests.exceptions.RequestException:
+            failed = True
+            raise
+        finally:
+            self._record(endpoint_name, time.monotonic() - start, failed)
+
+    def get(self, url: str, endpoint_name: str = None, **kwargs) -> requests.Response:
+        return self.request('GET', url, endpoint_name, **kwargs)
+
+    def post(self, url: str, endpoint_name: str = None, **kwargs) -> requests.Response:
+        return self.request('POST', url, endpoint_name, **kwargs)
+
+    def put(self, url: str, endpoint_name: str = None, **kwargs) -> requests.Response:
+        return self.request('PUT', url, endpoint_name, **kwargs)
+
+    def _record(self, endpoint_name: str, elapsed: float, failed: bool):
+        with self._metrics_lock:
+            metric = self._metrics.setdefault(endpoint_name, {'count': 0, 'errors': 0, 'total_s': 0.0, 'max_s': 0.0})
+            metric['count'] += 1
+            metric['errors'] += int(failed)
+            metric['total_s'] += elapsed
+            metric['max_s'] = max(metric['max_s'], elapsed)
+        logging.debug(f"{endpoint_name} took {elapsed * 1000:.1f} ms")
+
+    def metrics(self) -> dict:
+        """ Return {endpoint_name: {count, errors, avg_ms, max_ms}} for this process """
+        with self._metrics_lock:
+            return {endpoint_name: {'count': metric['count'],
+                                    'errors': metric['errors'],
+                                    'avg_ms': round(metric['total_s'] * 1000 / metric['count'], 1),
+                                    'max_ms': round(metric['max_s'] * 1000, 1)}
+                    for endpoint_name, metric in self._metrics.items()}
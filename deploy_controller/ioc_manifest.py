@@ -0,0 +1,68 @@
+"""
+Desc: IOC manifest - the IOC/CPU metadata (folder, architecture, binary, boot dir) parsed from the st.cmd files
+of an IOC release. Build.write_ioc_manifest (build_scripts/start_build.py) packages it with the release, the
+deployment controller reads it instead of scanning the release, and scans with the same parser when it's missing.
+
+build_scripts/ioc_manifest.py and deploy_controller/ioc_manifest.py are the same file, each image only ships
+its own directory. deploy_controller/test_ioc_manifest.py checks that the two copies stay identical.
+"""
+import os
+import logging
+
+IOC_MANIFEST_NAME = "ioc_manifest.json"
+IOC_MANIFEST_VERSION = 1
+IOC_BOOT_DIRS = ["iocBoot", "cpuBoot"]
+
+def parse_shebang(shebang_line: str):
+    """ Function to extract architecture and binary name from the shebang line,
+        ex: '#!../../bin/rhel7-x86_64/myApp' -> ('rhel7-x86_64', 'myApp'). (None, None) if it has no bin/<arch>/<binary> """
+    if 'bin/' not in shebang_line:
+        logging.warning(f"No bin/ path in shebang line: {shebang_line}")
+        return None, None
+    # Split the path after 'bin/' by '/', the first part is the architecture and the second the binary
+    parts = shebang_line.split('bin/', 1)[1].split('/')
+    if len(parts) >= 2 and parts[0] and parts[1]:
+        return parts[0], parts[1]
+    logging.warning(f"Invalid path structure in shebang line: {shebang_line}")
+    return None, None
+
+def scan_ioc_boot_dirs(app_dir_name: str) -> list:
+    """ Scan the st.cmd files under iocBoot and cpuBoot, return [{folder_name, architecture, binary, boot_dir}] """
+    results = []
+    found_boot_dir = False
+    for boot_dir in IOC_BOOT_DIRS:
+        boot_path = os.path.join(app_dir_name, boot_dir)
+        if not os.path.isdir(boot_path):
+            continue
+        found_boot_dir = True
+        # Iterate over the directories in iocBoot/cpuBoot
+        for root, dirs, files in os.walk(boot_path):
+            if 'st.cmd' not in files:
+                continue
+            st_cmd_path = os.path.join(root, 'st.cmd')
+            with open(st_cmd_path, 'r') as f:
+                first_line = f.readline().strip() # Read the first line (shebang)
+            if not first_line.startswith("#!"):
+                logging.warning(f"No shebang line in {st_cmd_path}")
+                continue
+            architecture, binary_name = parse_shebang(first_line)
+            if architecture and binary_name:
+                results.append({
+                    'folder_name': os.path.basename(root), # ex: ioc-b34-bs01
+                    'architecture': architecture,
+                    'binary': binary_name,
+                    'boot_dir': boot_dir
+                })
+    if not found_boot_dir:
+        logging.error(f"Directories {IOC_BOOT_DIRS} do not exist in {app_dir_name}.")
+    return results
+
+def new_ioc_manifest(iocs: list) -> dict:
+    """ Manifest for the scan_ioc_boot_dirs() results of a release """
+    return {'version': IOC_MANIFEST_VERSION, 'iocs': iocs}
+
+def read_ioc_manifest(manifest: dict) -> list:
+    """ Return the IOC list of a manifest, or None if it is missing or a format we don't know """
+    if not isinstance(manifest, dict) or manifest.get('version') != IOC_MANIFEST_VERSION:
+        return None
+    return manifest.get('iocs')
@@ -0,0 +1,181 @@
+"""
+Desc: Redis backed deployment job queue, shared by the deployment controller (producer) and
+deployment_worker.py processes (consumers).
+
+Keys under jobs:<name>:
+    pending          - ZSET job_id -> score, higher priority first, then oldest first
+    processing       - ZSET job_id -> visibility deadline (unix time), extended by heartbeats
+    job:<job_id>     - JSON job record (component, priority, payload, attempts, worker)
+    lock:<component> - job_id holding the component, only one job per component runs at a time
+
+A job whose deadline passes (worker crashed or hung) is put back in pending by reap(), up to
+max_attempts claims, after which it is dropped and reported as dead.
+"""
+import json
+import time
+import logging
+import threading
+import redis
+from collections import namedtuple
+from contextlib import contextmanager
+
+PRIORITY_SCALE = 1e10 # Larger than any unix timestamp, so priority always sorts before enqueue time
+CLAIM_SCAN_SIZE = 50  # Pending jobs looked at per claim, jobs of busy components are skipped
+
+Job = namedtuple("Job", ["job_id", "component", "priority", "payload", "attempts"])
+
+class JobQueue(object):
+    def __init__(self, redis_getter, name: str = "deployments", visibility_timeout: int = 900,
+                 max_attempts: int = 3):
+        """ redis_getter: callable returning the redis client, resolved on every call so the
+            client can be swapped (ex: fakeredis in tests) """
+        self.redis_getter = redis_getter
+        self.name = name
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.pending_key = f"jobs:{name}:pending"
+        self.processing_key = f"jobs:{name}:processing"
+
+    def _job_key(self, job_id: str) -> str:
+        return f"jobs:{self.name}:job:{job_id}"
+
+    def _lock_key(self, component: str) -> str:
+        return f"jobs:{self.name}:lock:{component}"
+
+    def _load(self, job_id: str) -> dict:
+        data = self.redis_getter().get(self._job_key(job_id))
+        return json.loads(data) if data else None
+
+    def enqueue(self, job_id: str, component: str, payload: dict, priority: int = 0):
+        """ Add a job, payload must be json serializable """
+        score = -priority * PRIORITY_SCALE + time.time()
+        record = {"job_id": job_id, "component": component, "priority": priority, "payload": payload,
+                  "attempts": 0, "score": score, "worker": None}
+        pipe = self.redis_getter().pipeline()
+        pipe.set(self._job_key(job_id), json.dumps(record))
+        pipe.zadd(self.pending_key, {job_id: score})
+        pipe.execute()
+        logging.info(f"Queued job {job_id} for {component} (priority {priority})")
+
+    def position(self, job_id: str) -> int:
+        """ Return how many pending jobs are ahead of job_id, or None if it isn't pending """
+        return self.redis_getter().zrank(self.pending_key, job_id)
+
+    def claim(self, worker_id: str) -> Job:
+        """ Take the first pending job whose component isn't already being deployed, or None """
+        client = self.redis_getter()
+        for job_id in client.zrange(self.pending_key, 0, CLAIM_SCAN_SIZE - 1):
+            record = self._load(job_id)
+            if record is None: # Record expired or deleted, drop the orphan id
+                client.zrem(self.pending_key, job_id)
+                continue
+            lock_key = self._lock_key(record["component"])
+            if not client.set(lock_key, job_id, nx=True, ex=self.visibility_timeout):
+                continue # Component busy, keep it queued so its jobs run in order
+            record["attempts"] += 1
+            record["worker"] = worker_id
+            with client.pipeline() as pipe:
+                try:
+                    pipe.watch(self.pending_key)
+                    if pipe.zscore(self.pending_key, job_id) is None:
+                        raise redis.WatchError # Another worker claimed it between zrange and here
+                    pipe.multi()
+                    pipe.zrem(self.pending_key, job_id)
+                    pipe.zadd(self.processing_key, {job_id: time.time() + self.visibility_timeout})
+                    pipe.set(self._job_key(job_id), json.dumps(record))
+                    pipe.execute()
+                except redis.WatchError:
+                    self._release_lock(record["component"], job_id)
+                    continue
+            logging.info(f"Worker {worker_id} claimed job {job_id} for {record['component']} "
+                         f"(attempt {record['attempts']})")
+            return Job(job_id, record["component"], record["priority"], record["payload"], record["attempts"])
+        return None
+
+    def heartbeat(self, job: Job) -> bool:
+        """ Extend the job's visibility deadline and component lock.
+            Returns False if the job was reaped (the lease is lost, another worker may run it) """
+        client = self.redis_getter()
+        if client.zscore(self.processing_key, job.job_id) is None:
+            return False
+        client.zadd(self.processing_key, {job.job_id: time.time() + self.visibility_timeout}, xx=True)
+        lock_key = self._lock_key(job.component)
+        with client.pipeline() as pipe:
+            try:
+                pipe.watch(lock_key)
+                if pipe.get(lock_key) != job.job_id:
+                    return False
+                pipe.multi()
+                pipe.expire(lock_key, self.visibility_timeout)
+                pipe.execute()
+            except redis.WatchError:
+                return False
+        return True
+
+    def ack(self, job: Job):
+        """ Job finished (successfully or not), remove it from the queue """
+        pipe = self.redis_getter().pipeline()
+        pipe.zrem(self.processing_key, job.job_id)
+        pipe.delete(self._job_key(job.job_id))
+        pipe.execute()
+        self._release_lock(job.component, job.job_id)
+
+    def _release_lock(self, component: str, job_id: str):
+        """ Delete the component lock only if job_id still holds it """
+        lock_key = self._lock_key(component)
+        with self.redis_getter().pipeline() as pipe:
+            try:
+                pipe.watch(lock_key)
+                if pipe.get(lock_key) != job_id:
+                    return
+                pipe.multi()
+                pipe.delete(lock_key)
+                pipe.execute()
+            except redis.WatchError:
+                pass # Lock changed hands, leave it alone
+
+    def reap(self) -> list:
+        """ Requeue jobs whose visibility deadline passed. Jobs out of attempts are dropped.
+            Returns the job ids that were dropped, so the caller can mark them failed """
+        client = self.redis_getter()
+        dead_jobs = []
+        for job_id in client.zrangebyscore(self.processing_key, '-inf', time.time()):
+            record = self._load(job_id)
+            if client.zrem(self.processing_key, job_id) == 0:
+                continue # Another reaper (or a late ack) got it first
+            if record is None:
+                continue
+            self._release_lock(record["component"], job_id)
+            if record["attempts"] >= self.max_attempts:
+                logging.error(f"Job {job_id} for {record['component']} timed out {record['attempts']} times, dropping it")
+                client.delete(self._job_key(job_id))
+                dead_jobs.append(job_id)
+                continue
+            logging.warning(f"Job {job_id} for {record['component']} timed out on worker {record['worker']}, requeuing")
+            client.zadd(self.pending_key, {job_id: record["score"]})
+        return dead_jobs
+
+    def stats(self) -> dict:
+        client = self.redis_getter()
+        return {"pending": client.zcard(self.pending_key), "processing": client.zcard(self.processing_key)}
+
+@contextmanager
+def keep_alive(job_queue: JobQueue, job: Job, interval: float = None):
+    """ Heartbeat the job from a background thread while the block runs """
+    interval = interval or max(1.0, job_queue.visibility_timeout / 3)
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(interval):
+            try:
+                if not job_queue.heartbeat(job):
+                    logging.warning(f"Lost the lease on job {job.job_id}, it may run again on another worker")
+            except Exception as e: # Redis hiccup, the next beat may still land before the deadline
+                logging.warning(f"Heartbeat for job {job.job_id} failed: {e}")
+    thread = threading.Thread(target=beat, name=f"heartbeat-{job.job_id}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
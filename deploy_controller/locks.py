@@ -0,0 +1,150 @@
+"""
+Desc: Redis leases for the deployment controller, shared by every uvicorn worker and deployment_worker.py.
+
+A DeploymentLock is held on (component, facility) while a facility is deployed (playbook + deployment db update),
+so two deployments of the same component to the same facility never overlap, while unrelated deployments
+run in parallel. The lease expires after ttl seconds unless renewed, so a crashed holder can't block forever.
+
+Keys:
+    lock:deployment:<component>:<facility>                - {token, task_id, tag, args_digest} of the holder
+    lock:deployment-result:<component>:<facility>:<task>  - outcome left by the holder on release, read by
+                                                            coalesced duplicates (short lived)
+"""
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+import redis
+from contextlib import contextmanager
+
+RESULT_TTL = 300 # seconds a released lock's outcome stays readable for coalesced duplicates
+
+def args_digest(playbook_args: dict, workspace_dir: str = None, ignored: tuple = ()) -> str:
+    """ Digest of the playbook args of a facility deployment, two deployments coalesce only if theirs match.
+        Paths under workspace_dir (each task downloads to its own) are compared relative to it, and the
+        ignored keys (request bookkeeping, ex: user) are left out """
+    def normalize(value):
+        if isinstance(value, dict):
+            return {key: normalize(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [normalize(item) for item in value]
+        if workspace_dir and isinstance(value, str) and value.startswith(workspace_dir):
+            return "<workspace>" + value[len(workspace_dir):]
+        return value
+    args = normalize({key: value for key, value in playbook_args.items() if key not in ignored})
+    return hashlib.sha256(json.dumps(args, sort_keys=True, default=str).encode()).hexdigest()
+
+class DeploymentLock(object):
+    def __init__(self, redis_getter, component: str, facility: str, task_id: str, tag: str, ttl: int = 60,
+                 args_digest: str = None):
+        """ redis_getter: callable returning the redis client, resolved on every call
+            args_digest: args_digest() of the deployment, None if it can't be coalesced into """
+        self.redis_getter = redis_getter
+        self.component = component
+        self.facility = facility
+        self.task_id = task_id
+        self.tag = tag
+        self.ttl = ttl
+        self.args_digest = args_digest
+        self.key = f"lock:deployment:{component}:{facility}"
+        self.token = uuid.uuid4().hex
+        self.lost = False # Set when a renewal finds the lease gone (expired and maybe taken)
+
+    def _value(self) -> str:
+        return json.dumps({"token": self.token, "task_id": self.task_id, "tag": self.tag,
+                           "args_digest": self.args_digest})
+
+    def _result_key(self, task_id: str) -> str:
+        return f"lock:deployment-result:{self.component}:{self.facility}:{task_id}"
+
+    def holder(self) -> dict:
+        """ Return {token, task_id, tag, args_digest} of the current holder, or None if free """
+        data = self.redis_getter().get(self.key)
+        return json.loads(data) if data else None
+
+    def can_coalesce(self, holder: dict) -> bool:
+        """ True if the holder runs the exact same deployment (same playbook args) as this one """
+        return bool(holder and self.args_digest and holder.get("args_digest") == self.args_digest)
+
+    def try_acquire(self) -> bool:
+        return bool(self.redis_getter().set(self.key, self._value(), nx=True, ex=self.ttl))
+
+    def acquire(self, timeout: float, poll_interval: float = 1.0, on_wait=None) -> bool:
+        """ Wait up to timeout seconds for the lock. on_wait(holder) is called once if it is busy """
+        deadline = time.monotonic() + timeout
+        waited = False
+        while not self.try_acquire():
+            if time.monotonic() >= deadline:
+                return False
+            if not waited and on_wait:
+                on_wait(self.holder())
+            waited = True
+            time.sleep(poll_interval)
+        return True
+
+    def _if_held(self, action) -> bool:
+        """ Run action(pipe) in a transaction only if our token still holds the lock """
+        with self.redis_getter().pipeline() as pipe:
+            try:
+                pipe.watch(self.key)
+                data = pipe.get(self.key)
+                if not data or json.loads(data).get("token") != self.token:
+                    return False
+                pipe.multi()
+                action(pipe)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def renew(self) -> bool:
+        renewed = self._if_held(lambda pipe: pipe.expire(self.key, self.ttl))
+        if not renewed:
+            self.lost = True
+        return renewed
+
+    def release(self, success: bool = None):
+        """ Release the lock, recording the outcome for duplicates waiting to coalesce """
+        def release_action(pipe):
+            if success is not None:
+                pipe.set(self._result_key(self.task_id), json.dumps({"success": success}), ex=RESULT_TTL)
+            pipe.delete(self.key)
+        if not self._if_held(release_action):
+            logging.warning(f"Lock {self.key} was lost before release (lease expired)")
+
+    def wait_for_result(self, holder_task_id: str, timeout: float, poll_interval: float = 1.0) -> dict:
+        """ Wait for the holder to release the lock, return its recorded outcome {success} or None
+            (holder crashed, timed out, or released without an outcome) """
+        deadline = time.monotonic() + timeout
+        while True:
+            holder = self.holder()
+            if not holder or holder.get("task_id") != holder_task_id:
+                break
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(poll_interval)
+        data = self.redis_getter().get(self._result_key(holder_task_id))
+        return json.loads(data) if data else None
+
+    @contextmanager
+    def lease(self):
+        """ Renew the lock from a background thread while the block runs, the lock must already be held """
+        stop = threading.Event()
+
+        def renew_loop():
+            while not stop.wait(max(1.0, self.ttl / 3)):
+                try:
+                    if not self.renew():
+                        logging.error(f"Lost lock {self.key}, another deployment may now run on {self.facility}")
+                        return
+                except Exception as e: # Redis hiccup, retry on the next interval before the lease expires
+                    logging.warning(f"Renewing lock {self.key} failed: {e}")
+        thread = threading.Thread(target=renew_loop, name=f"lease-{self.key}", daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            stop.set()
+            thread.join()
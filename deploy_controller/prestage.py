@@ -0,0 +1,98 @@
+"""
+Desc: Records of releases prestaged on target hosts (PUT /deployment/prestage), shared by every uvicorn
+worker and deployment_worker.py. A deployment of a release whose artifact is already staged and verified
+on every host of a facility tells the playbook to use the staged copy instead of transferring it again.
+
+A staged copy is trusted for ttl seconds. Its record is kept cleanup_grace seconds longer so the janitor can
+still find the copy on the hosts and delete it (see expired()), deployments delete the copies they replace.
+
+Keys:
+    prestage:<component>:<tag>  - HASH host -> {path, sha256, content_id, release_format, staged_at}
+    prestage:expiry             - ZSET [component, tag] (json) -> time the first copy of the tag expires
+"""
+import json
+import time
+
+class PrestageRegistry(object):
+    def __init__(self, redis_getter, ttl: int = 7 * 24 * 3600, cleanup_grace: int = 24 * 3600):
+        """ redis_getter: callable returning the redis client, resolved on every call """
+        self.redis_getter = redis_getter
+        self.ttl = ttl
+        self.cleanup_grace = cleanup_grace
+        self.expiry_key = "prestage:expiry"
+
+    def _key(self, component: str, tag: str) -> str:
+        return f"prestage:{component}:{tag}"
+
+    def _expiry_member(self, component: str, tag: str) -> str:
+        return json.dumps([component, tag])
+
+    def record(self, component: str, tag: str, hosts: list, path: str, sha256: str, content_id: str,
+               release_format: str):
+        """ Record the release as staged (and verified) at path on hosts """
+        if not hosts:
+            return
+        staged_at = time.time()
+        entry = json.dumps({"path": path, "sha256": sha256, "content_id": content_id,
+                            "release_format": release_format, "staged_at": staged_at})
+        pipe = self.redis_getter().pipeline()
+        pipe.hset(self._key(component, tag), mapping={host: entry for host in hosts})
+        pipe.expire(self._key(component, tag), self.ttl + self.cleanup_grace)
+        pipe.zadd(self.expiry_key, {self._expiry_member(component, tag): staged_at + self.ttl}, nx=True)
+        pipe.execute()
+
+    def staged(self, component: str, tag: str, include_expired: bool = False) -> dict:
+        """ Return {host: {path, sha256, content_id, release_format, staged_at}} of the copies still trusted
+            (or of every copy still on the hosts with include_expired) """
+        entries = {host: json.loads(entry) for host, entry in self.redis_getter().hgetall(self._key(component, tag)).items()}
+        if include_expired:
+            return entries
+        now = time.time()
+        return {host: entry for host, entry in entries.items() if entry["staged_at"] + self.ttl > now}
+
+    def forget(self, component: str, tag: str, hosts: list = None):
+        """ Drop the records of hosts (every host if None), ex: the staged copy failed verification """
+        client = self.redis_getter()
+        if hosts is None:
+            pipe = client.pipeline()
+            pipe.delete(self._key(component, tag))
+            pipe.zrem(self.expiry_key, self._expiry_member(component, tag))
+            pipe.execute()
+        elif hosts:
+            client.hdel(self._key(component, tag), *hosts)
+            if not client.exists(self._key(component, tag)):
+                client.zrem(self.expiry_key, self._expiry_member(component, tag))
+
+    def expired(self, limit: int = 20) -> list:
+        """ Claim tags with copies past their ttl, returns [(component, tag, {host: entry})] of the expired copies
+            for the caller to delete and forget(). Each tag is returned to one caller only (across workers) """
+        client = self.redis_getter()
+        now = time.time()
+        claimed = []
+        for member in client.zrangebyscore(self.expiry_key, '-inf', now, start=0, num=limit):
+            if not client.zrem(self.expiry_key, member): # Another worker claimed it
+                continue
+            component, tag = json.loads(member)
+            entries = self.staged(component, tag, include_expired=True)
+            expired = {host: entry for host, entry in entries.items() if entry["staged_at"] + self.ttl <= now}
+            remaining = [entry["staged_at"] + self.ttl for host, entry in entries.items() if host not in expired]
+            if remaining: # Copies staged later, come back when the next one expires
+                client.zadd(self.expiry_key, {member: min(remaining)})
+            if expired:
+                claimed.append((component, tag, expired))
+        return claimed
+
+    def staged_copy(self, component: str, tag: str, hosts: list, content_id: str, release_format: str) -> dict:
+        """ Return the record shared by every host if the same artifact (content_id, release_format) is staged
+            at the same path on all of them, otherwise None """
+        if not hosts:
+            return None
+        staged = self.staged(component, tag)
+        entries = [staged.get(host) for host in hosts]
+        first = entries[0]
+        if not first or first["content_id"] != content_id or first["release_format"] != release_format:
+            return None
+        if any(not entry or entry["path"] != first["path"] or entry["sha256"] != first["sha256"]
+               or entry["content_id"] != content_id for entry in entries):
+            return None
+        return first
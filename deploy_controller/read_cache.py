@@ -0,0 +1,79 @@
+"""
+Desc: Short-TTL read cache for deployment database lookups in the deployment controller.
+Entries are kept in process memory, or in redis (shared by every uvicorn worker) when a redis
+getter is given. Writers call invalidate() after changing the backing document.
+"""
+import copy
+import json
+import time
+import logging
+import threading
+
+class TtlCache(object):
+    def __init__(self, name: str, ttl: float, redis_getter=None):
+        """ redis_getter: optional callable returning the redis client to store entries in,
+            resolved on every call so the client can be swapped (ex: fakeredis in tests) """
+        self.name = name
+        self.ttl = ttl
+        self.redis_getter = redis_getter
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _redis_key(self, key: tuple) -> str:
+        return f"cache:{self.name}:" + "/".join(str(part) for part in key)
+
+    def _count(self, hit: bool):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: tuple):
+        """ Return (found, value). Values are copies, callers may mutate them """
+        found, value = False, None
+        if self.redis_getter:
+            try:
+                data = self.redis_getter().get(self._redis_key(key))
+                if data is not None:
+                    found, value = True, json.loads(data)
+            except Exception as e: # The cache is an optimization, fall through to the backend
+                logging.warning(f"{self.name} cache read failed: {e}")
+        else:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry and entry[0] > time.monotonic():
+                    found, value = True, copy.deepcopy(entry[1])
+                elif entry:
+                    del self.entries[key]
+        self._count(found)
+        return found, value
+
+    def set(self, key: tuple, value):
+        if self.redis_getter:
+            try:
+                self.redis_getter().set(self._redis_key(key), json.dumps(value), ex=max(1, int(self.ttl)))
+            except Exception as e:
+                logging.warning(f"{self.name} cache write failed: {e}")
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(value))
+
+    def invalidate(self, key: tuple):
+        if self.redis_getter:
+            try:
+                self.redis_getter().delete(self._redis_key(key))
+            except Exception as e:
+                logging.warning(f"{self.name} cache invalidate failed: {e}")
+            return
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'hit_ratio': round(self.hits / total, 3) if total else 0.0,
+                    'backend': 'redis' if self.redis_getter else 'memory'}
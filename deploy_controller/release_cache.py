@@ -0,0 +1,386 @@
+"""
+Desc: Persistent on-disk cache of tagged release artifacts for the deployment controller.
+Repeat deployments of the same tag (ex: LCLS, then FACET, then a revert) reuse the cached
+tarball and extracted tree instead of downloading and extracting them again.
+
+Layout under the cache root:
+    objects/<digest>/release.tar.gz  - tarball as downloaded from the backend
+    objects/<digest>/tree/           - extracted contents of the tarball
+    objects/<digest>/index.json      - member index of the tree (path, type, size, mode, sha256), see tree_index()
+    objects/<digest>/meta.json       - size accounting for LRU eviction
+    refs/<component>/<tag>/<os>.json - (component, tag, os) -> content digest
+    refs/<component>/<tag>/<name>    - small per-release metadata (ex: ioc_manifest.json)
+    pins/<component>/<owner>.json    - [{tag, digests}] releases never evicted (ex: last N deployed per facility)
+    tmp/                             - in-progress fills, renamed into objects/ once complete
+    locks/                           - flock files, dedups concurrent fills across uvicorn workers
+
+Objects are content-addressed (sha256 of the tarball), so identical releases share storage.
+Trees are hard linked into deployment workspaces, so their files are made read-only: writing to a
+linked file would change the cached object. Link from objects inside reading(), evict() can't remove
+an object while a reader holds it.
+The extracted tree is the random access copy of a release, listing members or reading a single file
+goes through the index and the tree, never through the compressed tarball.
+"""
+import os
+import json
+import time
+import uuid
+import fcntl
+import shutil
+import hashlib
+import logging
+from collections import namedtuple
+from contextlib import contextmanager
+
+RELEASE_TARBALL_NAME = "release.tar.gz"
+RELEASE_TREE_NAME = "tree"
+RELEASE_INDEX_NAME = "index.json"
+RELEASE_INDEX_VERSION = 1
+DEFAULT_OS_KEY = "default" # Used for apps that only have a single (non OS specific) release
+
+CachedRelease = namedtuple("CachedRelease", ["digest", "tarball", "tree", "index"])
+
+def file_digest(filepath: str) -> str:
+    """ Return the sha256 hex digest of a file """
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024*1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def directory_size(directory: str) -> int:
+    """ Return the total size in bytes of regular files under directory """
+    total = 0
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            filepath = os.path.join(root, name)
+            if not os.path.islink(filepath):
+                total += os.path.getsize(filepath)
+    return total
+
+def tree_index(tree_dir: str) -> list:
+    """ Return [{path, type, size, mode, sha256 | target}] for every member under tree_dir, sorted by path.
+        type is 'file', 'dir' or 'symlink', paths are relative to tree_dir as in the tarball """
+    members = []
+    for root, dirs, files in os.walk(tree_dir):
+        for name in dirs + files:
+            filepath = os.path.join(root, name)
+            stat = os.lstat(filepath)
+            member = {"path": os.path.relpath(filepath, tree_dir), "mode": stat.st_mode & 0o7777}
+            if os.path.islink(filepath):
+                member.update(type="symlink", size=0, target=os.readlink(filepath))
+            elif os.path.isdir(filepath):
+                member.update(type="dir", size=0)
+            else:
+                member.update(type="file", size=stat.st_size, sha256=file_digest(filepath))
+            members.append(member)
+    members.sort(key=lambda member: member["path"])
+    return members
+
+def make_read_only(tree_dir: str):
+    """ Drop the write bits of every file under tree_dir (directories stay writable so eviction can delete them) """
+    for root, dirs, files in os.walk(tree_dir):
+        for name in files:
+            filepath = os.path.join(root, name)
+            if not os.path.islink(filepath):
+                os.chmod(filepath, os.stat(filepath).st_mode & ~0o222)
+
+def owner_writable(tarinfo):
+    """ tarfile add() filter giving linked (read-only) cached files back their owner write bit """
+    if not tarinfo.issym():
+        tarinfo.mode |= 0o200
+    return tarinfo
+
+def link_file(src: str, dst: str):
+    """ Hard link src to dst (replacing dst if it exists), fall back to a copy across filesystems """
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    if os.path.islink(src):
+        os.symlink(os.readlink(src), dst)
+        return
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def link_tree(src_dir: str, dst_dir: str, exclude: set = None):
+    """ Overlay the contents of src_dir onto dst_dir using hard links.
+        Files that already exist in dst_dir are replaced, so calling this for multiple trees
+        in order gives the same "last one wins" result as extracting tarballs in order.
+        exclude: paths relative to src_dir (ex: 'R1.0/iocBoot/sioc-b34-xx') that are skipped entirely """
+    exclude = set(os.path.normpath(path) for path in (exclude or []))
+    for root, dirs, files in os.walk(src_dir):
+        rel_root = os.path.relpath(root, src_dir)
+        dst_root = os.path.normpath(os.path.join(dst_dir, rel_root))
+        os.makedirs(dst_root, exist_ok=True)
+        for name in list(dirs):
+            src_path = os.path.join(root, name)
+            if os.path.normpath(os.path.join(rel_root, name)) in exclude:
+                dirs.remove(name) # Don't descend
+            elif os.path.islink(src_path): # os.walk does not descend into symlinked dirs
+                link_file(src_path, os.path.join(dst_root, name))
+        for name in files:
+            if os.path.normpath(os.path.join(rel_root, name)) in exclude:
+                continue
+            link_file(os.path.join(root, name), os.path.join(dst_root, name))
+
+class ReleaseCache(object):
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(root, "objects")
+        self.refs_dir = os.path.join(root, "refs")
+        self.tmp_dir = os.path.join(root, "tmp")
+        self.locks_dir = os.path.join(root, "locks")
+        self.pins_dir = os.path.join(root, "pins")
+
+    def _ensure_dirs(self):
+        for directory in (self.objects_dir, self.refs_dir, self.tmp_dir, self.locks_dir, self.pins_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    def _ref_path(self, component: str, tag: str, os_name: str) -> str:
+        return os.path.join(self.refs_dir, component, tag, f"{os_name or DEFAULT_OS_KEY}.json")
+
+    def _object_dir(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest)
+
+    def _cached_release(self, digest: str) -> CachedRelease:
+        object_dir = self._object_dir(digest)
+        return CachedRelease(digest, os.path.join(object_dir, RELEASE_TARBALL_NAME),
+                             os.path.join(object_dir, RELEASE_TREE_NAME), os.path.join(object_dir, RELEASE_INDEX_NAME))
+
+    @contextmanager
+    def _lock(self, name: str, shared: bool = False):
+        """ Exclusive (or shared) flock, held across threads and processes (each open() gets its own lock) """
+        with open(os.path.join(self.locks_dir, f"{name}.lock"), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _touch(self, digest: str):
+        """ Mark an object as recently used for LRU eviction """
+        try:
+            os.utime(os.path.join(self._object_dir(digest), "meta.json"))
+        except OSError:
+            pass
+
+    @contextmanager
+    def reading(self):
+        """ Keep evict() from removing any object while the block links from cached releases.
+            Don't fetch() inside the block, a fill evicts and would wait for this lock """
+        self._ensure_dirs()
+        with self._lock("objects", shared=True):
+            yield
+
+    def is_present(self, cached: CachedRelease) -> bool:
+        """ False once the object of a cached release has been evicted (check inside reading()) """
+        return os.path.exists(os.path.join(self._object_dir(cached.digest), "meta.json"))
+
+    def lookup(self, component: str, tag: str, os_name: str = None) -> CachedRelease:
+        """ Return the cached release for (component, tag, os) or None if not cached """
+        ref_path = self._ref_path(component, tag, os_name)
+        try:
+            with open(ref_path, 'r') as file:
+                digest = json.load(file)['digest']
+        except (OSError, ValueError, KeyError):
+            return None
+        object_dir = self._object_dir(digest)
+        if not os.path.exists(os.path.join(object_dir, "meta.json")):
+            # Object was evicted, drop the dangling ref
+            logging.debug(f"Release cache ref {ref_path} points to evicted object {digest}")
+            try:
+                os.remove(ref_path)
+            except OSError:
+                pass
+            return None
+        self._touch(digest)
+        return self._cached_release(digest)
+
+    def fetch(self, component: str, tag: str, os_name, fill_func) -> CachedRelease:
+        """ Return the cached release, filling it with fill_func on a miss.
+            fill_func(tarball_path, tree_dir) -> bool downloads the tarball and extracts it,
+            returning False if the release doesn't exist.
+            Concurrent fetches of the same key (threads or uvicorn workers) wait for the
+            first fill instead of downloading again. """
+        self._ensure_dirs()
+        cached = self.lookup(component, tag, os_name)
+        if cached:
+            logging.info(f"Release cache hit: {component} {tag} {os_name or DEFAULT_OS_KEY}")
+            return cached
+        key = hashlib.sha256(f"{component}/{tag}/{os_name or DEFAULT_OS_KEY}".encode()).hexdigest()
+        with self._lock(f"fill-{key}"):
+            cached = self.lookup(component, tag, os_name) # Another worker may have filled it while we waited
+            if cached:
+                logging.info(f"Release cache hit after wait: {component} {tag} {os_name or DEFAULT_OS_KEY}")
+                return cached
+            logging.info(f"Release cache miss: {component} {tag} {os_name or DEFAULT_OS_KEY}")
+            return self._fill(component, tag, os_name, fill_func)
+
+    def _fill(self, component: str, tag: str, os_name, fill_func) -> CachedRelease:
+        fill_dir = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        os.makedirs(fill_dir)
+        try:
+            tarball_path = os.path.join(fill_dir, RELEASE_TARBALL_NAME)
+            tree_dir = os.path.join(fill_dir, RELEASE_TREE_NAME)
+            os.makedirs(tree_dir)
+            if not fill_func(tarball_path, tree_dir):
+                return None
+            digest = file_digest(tarball_path)
+            self._write_index(os.path.join(fill_dir, RELEASE_INDEX_NAME), tree_dir) # Modes as released
+            make_read_only(tree_dir)
+            os.chmod(tarball_path, 0o444)
+            size = os.path.getsize(tarball_path) + directory_size(tree_dir)
+            with open(os.path.join(fill_dir, "meta.json"), 'w') as file:
+                json.dump({"digest": digest, "size": size, "component": component,
+                           "tag": tag, "os": os_name or DEFAULT_OS_KEY, "created_at": time.time()}, file)
+            object_dir = self._object_dir(digest)
+            try:
+                os.rename(fill_dir, object_dir) # Atomic publish of the object
+            except OSError:
+                # Same content already cached under another (component, tag, os)
+                logging.debug(f"Release cache object {digest} already exists")
+            self._write_ref(component, tag, os_name, digest)
+            self._touch(digest)
+            self.evict(keep=digest)
+            return self._cached_release(digest)
+        finally:
+            if os.path.exists(fill_dir):
+                shutil.rmtree(fill_dir, ignore_errors=True)
+
+    def _write_index(self, index_path: str, tree_dir: str) -> list:
+        members = tree_index(tree_dir)
+        tmp_index_path = f"{index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_index_path, 'w') as file:
+            json.dump({"version": RELEASE_INDEX_VERSION, "members": members}, file)
+        os.replace(tmp_index_path, index_path)
+        return members
+
+    def members(self, cached: CachedRelease) -> list:
+        """ Return the member index of a cached release (see tree_index()).
+            Objects cached before the index existed get theirs written on first use """
+        try:
+            with open(cached.index, 'r') as file:
+                index = json.load(file)
+            if index.get("version") == RELEASE_INDEX_VERSION:
+                return index["members"]
+        except (OSError, ValueError, KeyError):
+            pass
+        return self._write_index(cached.index, cached.tree)
+
+    def member_path(self, cached: CachedRelease, path: str) -> str:
+        """ Return the file in the tree for a member path, or None if it is not a member (or escapes the tree) """
+        tree = os.path.realpath(cached.tree)
+        filepath = os.path.realpath(os.path.join(tree, path))
+        if not filepath.startswith(tree + os.sep) or not os.path.exists(filepath):
+            return None
+        return filepath
+
+    def _write_ref(self, component: str, tag: str, os_name, digest: str):
+        ref_path = self._ref_path(component, tag, os_name)
+        os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+        tmp_ref_path = f"{ref_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_ref_path, 'w') as file:
+            json.dump({"digest": digest}, file)
+        os.replace(tmp_ref_path, ref_path)
+
+    def load_metadata(self, component: str, tag: str, name: str) -> dict:
+        """ Return metadata saved for (component, tag) under name, or None """
+        try:
+            with open(os.path.join(self.refs_dir, component, tag, name), 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def save_metadata(self, component: str, tag: str, name: str, data: dict):
+        """ Save metadata for (component, tag) under name, readers never see a partial file """
+        self._ensure_dirs()
+        metadata_path = os.path.join(self.refs_dir, component, tag, name)
+        os.makedirs(os.path.dirname(metadata_path), exist_ok=True)
+        tmp_metadata_path = f"{metadata_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_metadata_path, 'w') as file:
+            json.dump(data, file)
+        os.replace(tmp_metadata_path, metadata_path)
+
+    def pin(self, component: str, owner: str, tag: str, digests: list, keep: int, details: dict = None):
+        """ Keep the objects of a tag out of eviction for owner (ex: a facility it was deployed to).
+            Only the keep most recently pinned tags stay pinned per (component, owner).
+            details is kept with the pin, ex: how the tag was deployed """
+        self._ensure_dirs()
+        pin_path = os.path.join(self.pins_dir, component, f"{owner}.json")
+        os.makedirs(os.path.dirname(pin_path), exist_ok=True)
+        with self._lock("pins"):
+            pins = self.pins(component, owner)
+            pins = [{"tag": tag, "digests": digests, "details": details or {}}] + [pin for pin in pins if pin["tag"] != tag]
+            tmp_pin_path = f"{pin_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_pin_path, 'w') as file:
+                json.dump(pins[:max(keep, 0)], file)
+            os.replace(tmp_pin_path, pin_path)
+
+    def pins(self, component: str, owner: str) -> list:
+        """ Return [{tag, digests, details}] pinned for (component, owner), most recent first """
+        try:
+            with open(os.path.join(self.pins_dir, component, f"{owner}.json"), 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return []
+
+    def pinned_digests(self) -> set:
+        digests = set()
+        for root, dirs, files in os.walk(self.pins_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(root, name), 'r') as file:
+                        for pin in json.load(file):
+                            digests.update(pin["digests"])
+                except (OSError, ValueError, KeyError, TypeError):
+                    continue
+        return digests
+
+    def usage(self) -> list:
+        """ Return [(last_used, size, digest)] for every cached object, oldest first """
+        entries = []
+        if not os.path.exists(self.objects_dir):
+            return entries
+        for digest in os.listdir(self.objects_dir):
+            meta_path = os.path.join(self._object_dir(digest), "meta.json")
+            try:
+                last_used = os.path.getmtime(meta_path)
+                with open(meta_path, 'r') as file:
+                    size = json.load(file)['size']
+            except (OSError, ValueError, KeyError):
+                continue
+            entries.append((last_used, size, digest))
+        entries.sort()
+        return entries
+
+    def evict(self, keep: str = None):
+        """ Remove least recently used objects until the cache fits in max_bytes, pinned objects are kept.
+            Files already hard linked into a deployment dir stay valid after eviction. """
+        with self._lock("evict"):
+            entries = self.usage()
+            total = sum(size for _, size, _ in entries)
+            pinned = self.pinned_digests()
+            trash_dirs = []
+            with self._lock("objects"): # Waits for readers linking from objects, see reading()
+                for last_used, size, digest in entries:
+                    if total <= self.max_bytes:
+                        break
+                    if digest == keep or digest in pinned:
+                        continue
+                    logging.info(f"Release cache evicting {digest} ({size} bytes)")
+                    # Rename first so readers never see a half deleted object
+                    trash_dir = os.path.join(self.tmp_dir, f"evict-{uuid.uuid4().hex}")
+                    try:
+                        os.rename(self._object_dir(digest), trash_dir)
+                    except OSError:
+                        continue
+                    trash_dirs.append(trash_dir)
+                    total -= size
+            for trash_dir in trash_dirs:
+                shutil.rmtree(trash_dir, ignore_errors=True)
+            if total > self.max_bytes:
+                logging.warning(f"Release cache is over budget ({total} > {self.max_bytes} bytes), the rest is in use or pinned")
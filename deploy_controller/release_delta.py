@@ -0,0 +1,64 @@
+"""
+Desc: File level deltas between two releases of a component, built from the release cache's member
+indexes (see release_cache.tree_index()). Used by IOC deployments with delta_transfer, so only the files
+that changed since the tag deployed on a facility are shipped to its hosts.
+
+A delta is a tarball of the added/changed members (under <tag>/, like the full release) plus a manifest:
+    {"version": 1, "base_tag", "tag", "changed": [paths], "removed": [paths], "unchanged": count,
+     "delta_bytes", "release_bytes"}
+Paths are relative to the release directory. The playbook rebuilds <tag>/ from <base_tag>/ on the host,
+extracts the delta tarball over it and deletes the removed paths.
+"""
+import os
+import json
+import tarfile
+import logging
+from release_cache import owner_writable
+
+DELTA_MANIFEST_VERSION = 1
+
+def merge_members(member_lists: list) -> dict:
+    """ Overlay the member indexes of a release's per-OS trees (in overlay order, last wins) into
+        {path relative to the release directory: member}. The release directory (the tag) is stripped """
+    merged = {}
+    for members in member_lists:
+        for member in members:
+            parts = member["path"].split("/", 1)
+            if len(parts) == 2:
+                merged[parts[1]] = member
+    return merged
+
+def same_member(base: dict, new: dict) -> bool:
+    if base["type"] != new["type"] or base["mode"] != new["mode"]:
+        return False
+    if new["type"] == "file":
+        return base.get("sha256") == new.get("sha256")
+    if new["type"] == "symlink":
+        return base.get("target") == new.get("target")
+    return True
+
+def compute_delta(base_members: dict, new_members: dict) -> tuple:
+    """ Return (changed, removed) sorted path lists going from base_members to new_members """
+    changed = sorted(path for path, member in new_members.items()
+                     if path not in base_members or not same_member(base_members[path], member))
+    removed = sorted(path for path in base_members if path not in new_members)
+    return changed, removed
+
+def write_delta(release_dir: str, tag: str, base_tag: str, changed: list, removed: list, unchanged: int,
+                release_bytes: int, delta_path: str, manifest_path: str, compress: bool = True) -> dict:
+    """ Write the delta tarball of the changed paths (from release_dir, the merged <tag> directory) and its
+        manifest, return the manifest """
+    delta_bytes = 0
+    with tarfile.open(delta_path, 'w:gz' if compress else 'w') as tar:
+        for path in changed:
+            source = os.path.join(release_dir, path)
+            tar.add(source, arcname=os.path.join(tag, path), recursive=False, filter=owner_writable)
+            if os.path.isfile(source) and not os.path.islink(source):
+                delta_bytes += os.path.getsize(source)
+    manifest = {"version": DELTA_MANIFEST_VERSION, "base_tag": base_tag, "tag": tag, "changed": changed,
+                "removed": removed, "unchanged": unchanged, "delta_bytes": delta_bytes, "release_bytes": release_bytes}
+    with open(manifest_path, 'w') as file:
+        json.dump(manifest, file)
+    logging.info(f"Delta {base_tag} -> {tag}: {len(changed)} changed, {len(removed)} removed, "
+                 f"{unchanged} unchanged ({delta_bytes} of {release_bytes} bytes)")
+    return manifest
@@ -0,0 +1,151 @@
+"""
+Desc: Deployment report store for the deployment controller. Reports are kept gzip compressed in a
+SQLite database, indexed by component, tag, facility, user and time, so they outlive the task record
+(10 mins) and the task workspace.
+
+Put the database on a volume shared by every uvicorn worker and deployment_worker.py (ex: REPORT_STORE_PATH
+on /sdf/group/ad), SQLite handles the locking between processes. Shared volumes are NFS, so keep the default
+rollback journal (journal_mode DELETE): WAL needs shared memory between the processes and corrupts the
+database when they run on different hosts. WAL is only for a database on local disk.
+"""
+import io
+import os
+import gzip
+import json
+import time
+import sqlite3
+import logging
+import shutil
+from contextlib import closing
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    task_id TEXT UNIQUE NOT NULL,
+    component TEXT NOT NULL,
+    tag TEXT NOT NULL,
+    user TEXT,
+    facilities TEXT,              -- json list, searchable through report_facilities
+    success INTEGER,
+    dry_run INTEGER,
+    created_at REAL NOT NULL,
+    size INTEGER NOT NULL,        -- uncompressed bytes
+    compressed_size INTEGER NOT NULL,
+    content BLOB NOT NULL         -- gzip of the report file
+);
+CREATE TABLE IF NOT EXISTS report_facilities (
+    report_id INTEGER NOT NULL REFERENCES reports(id) ON DELETE CASCADE,
+    facility TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_component_time ON reports(component, created_at);
+CREATE INDEX IF NOT EXISTS reports_tag ON reports(component, tag);
+CREATE INDEX IF NOT EXISTS reports_user_time ON reports(user, created_at);
+CREATE INDEX IF NOT EXISTS reports_time ON reports(created_at);
+CREATE INDEX IF NOT EXISTS report_facilities_facility ON report_facilities(facility, report_id);
+CREATE INDEX IF NOT EXISTS report_facilities_report ON report_facilities(report_id);
+"""
+JOURNAL_MODES = ["DELETE", "TRUNCATE", "PERSIST", "WAL"]
+METADATA_COLUMNS = ["task_id", "component", "tag", "user", "facilities", "success", "dry_run",
+                    "created_at", "size", "compressed_size"]
+
+class ReportStore(object):
+    def __init__(self, path: str, compress_level: int = 6, journal_mode: str = "DELETE"):
+        if journal_mode.upper() not in JOURNAL_MODES:
+            raise ValueError(f"Invalid journal_mode: {journal_mode}, must be one of {JOURNAL_MODES}")
+        self.path = path
+        self.compress_level = compress_level
+        self.journal_mode = journal_mode.upper()
+        self.initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """ New connection per call, sqlite connections can't be shared between threads """
+        if not self.initialized:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA foreign_keys = ON")
+        if not self.initialized:
+            connection.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+            connection.executescript(SCHEMA)
+            self.initialized = True
+        return connection
+
+    def _row_to_metadata(self, row: sqlite3.Row) -> dict:
+        metadata = {column: row[column] for column in METADATA_COLUMNS}
+        metadata["facilities"] = json.loads(metadata["facilities"] or "[]")
+        metadata["success"] = bool(metadata["success"])
+        metadata["dry_run"] = bool(metadata["dry_run"])
+        return metadata
+
+    def save(self, task_id: str, component: str, tag: str, user: str, facilities: list, success: bool,
+             dry_run: bool, report_file: str):
+        """ Compress and store the report file for a task (replacing any earlier report of the task) """
+        buffer = io.BytesIO()
+        with open(report_file, 'rb') as report, \
+             gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=self.compress_level, mtime=0) as compressed:
+            shutil.copyfileobj(report, compressed, 1024*1024)
+        content = buffer.getvalue()
+        size = os.path.getsize(report_file)
+        facilities = list(facilities or [])
+        with closing(self._connect()) as connection, connection:
+            connection.execute("DELETE FROM reports WHERE task_id = ?", (task_id,))
+            cursor = connection.execute(
+                "INSERT INTO reports (task_id, component, tag, user, facilities, success, dry_run, created_at, "
+                "size, compressed_size, content) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (task_id, component, tag, user, json.dumps(facilities), int(bool(success)), int(bool(dry_run)),
+                 time.time(), size, len(content), sqlite3.Binary(content)))
+            connection.executemany("INSERT INTO report_facilities (report_id, facility) VALUES (?, ?)",
+                                   [(cursor.lastrowid, facility) for facility in facilities])
+        logging.info(f"Stored report for {task_id}: {size} bytes ({len(content)} compressed)")
+
+    def get(self, task_id: str) -> dict:
+        """ Return the report metadata for a task, or None """
+        with closing(self._connect()) as connection:
+            row = connection.execute(f"SELECT {', '.join(METADATA_COLUMNS)} FROM reports WHERE task_id = ?",
+                                     (task_id,)).fetchone()
+        return self._row_to_metadata(row) if row else None
+
+    def read_compressed(self, task_id: str) -> bytes:
+        """ Return the gzip compressed report, or None """
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT content FROM reports WHERE task_id = ?", (task_id,)).fetchone()
+        return bytes(row["content"]) if row else None
+
+    def read(self, task_id: str) -> bytes:
+        """ Return the uncompressed report, or None """
+        content = self.read_compressed(task_id)
+        return gzip.decompress(content) if content is not None else None
+
+    def search(self, component: str = None, tag: str = None, facility: str = None, user: str = None,
+               since: float = None, until: float = None, limit: int = 50) -> list:
+        """ Return report metadata matching every given filter, newest first """
+        query = f"SELECT {', '.join('reports.' + column for column in METADATA_COLUMNS)} FROM reports"
+        conditions, params = [], []
+        if facility:
+            query += " JOIN report_facilities ON report_facilities.report_id = reports.id"
+            conditions.append("report_facilities.facility = ?")
+            params.append(facility)
+        for column, value in (("component", component), ("tag", tag), ("user", user)):
+            if value:
+                conditions.append(f"reports.{column} = ?")
+                params.append(value)
+        if since is not None:
+            conditions.append("reports.created_at >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("reports.created_at < ?")
+            params.append(until)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY reports.created_at DESC LIMIT ?"
+        params.append(limit)
+        with closing(self._connect()) as connection:
+            return [self._row_to_metadata(row) for row in connection.execute(query, params)]
+
+    def prune(self, older_than: float) -> int:
+        """ Delete reports created before older_than (unix time), return how many were deleted """
+        with closing(self._connect()) as connection, connection:
+            deleted = connection.execute("DELETE FROM reports WHERE created_at < ?", (older_than,)).rowcount
+        if deleted:
+            logging.info(f"Pruned {deleted} deployment reports")
+        return deleted
@@ -0,0 +1,70 @@
+"""
+Desc: Facility rollout scheduler for the deployment controller. Runs the per-facility
+deployment step (playbook + deployment db update) for several facilities concurrently.
+
+Facilities are split into stages: the canary facilities first (ex: DEV), then the rest.
+Each stage runs up to max_parallel facilities at once and must finish before the next
+stage starts. With abort_on_failure, facilities that haven't started yet are skipped
+once any facility fails.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+SKIPPED = None # Result recorded for facilities skipped after an abort
+
+def plan_stages(facilities: list, canary_facilities: list = None) -> list:
+    """ Split facilities into [canary_stage, rest_stage], dropping empty stages """
+    canary_facilities = canary_facilities or []
+    canary_stage = [facility for facility in facilities if facility in canary_facilities]
+    rest_stage = [facility for facility in facilities if facility not in canary_facilities]
+    return [stage for stage in (canary_stage, rest_stage) if stage]
+
+def run_rollout(facilities: list, deploy_facility, max_parallel: int = 1, canary_facilities: list = None,
+                abort_on_failure: bool = False, on_facility_done=None) -> dict:
+    """ Run deploy_facility(facility) -> (output: str, success: bool) for every facility.
+        on_facility_done(facility, done_count) is called as each facility finishes.
+        Returns {facility: (output, success) or SKIPPED}, use the facilities list for a deterministic order """
+    results = {}
+    aborted = threading.Event()
+    done_count = 0
+    max_parallel = max(1, max_parallel or 1)
+
+    def run_facility(facility: str):
+        if aborted.is_set():
+            return SKIPPED
+        try:
+            result = deploy_facility(facility)
+        except Exception as e:
+            logging.exception(f"Deployment to {facility} raised an error")
+            result = (f"== Deployment error for {facility} ==\n\n{str(e)}\n", False)
+        if abort_on_failure and not result[1] and not aborted.is_set():
+            # Set from the worker so a queued facility can't start before the scheduler sees the failure
+            logging.warning(f"Deployment to {facility} failed, aborting remaining facilities")
+            aborted.set()
+        return result
+
+    for stage in plan_stages(facilities, canary_facilities):
+        if aborted.is_set():
+            for facility in stage:
+                results[facility] = SKIPPED
+            continue
+        logging.info(f"Rollout stage: {stage} (max_parallel: {max_parallel})")
+        with ThreadPoolExecutor(max_workers=min(max_parallel, len(stage))) as executor:
+            futures = {executor.submit(run_facility, facility): facility for facility in stage}
+            for future in as_completed(futures):
+                facility = futures[future]
+                if future.cancelled():
+                    continue
+                results[facility] = future.result()
+                if results[facility] is SKIPPED:
+                    continue
+                done_count += 1
+                if on_facility_done:
+                    on_facility_done(facility, done_count)
+                if aborted.is_set():
+                    for pending in futures:
+                        pending.cancel() # Only cancels facilities that haven't started
+        for facility in stage:
+            results.setdefault(facility, SKIPPED)
+    return results
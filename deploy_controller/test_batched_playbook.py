@@ -0,0 +1,114 @@
+"""
+Desc: TEST batched IOC playbook runs (run_batched_ioc_playbook in deployment_controller.py and
+parse_json_callback_output, get_inventory_group_hosts in ansible_api.py) on canned ansible output
+
+Usage: pytest test_batched_playbook.py
+"""
+import json
+import pytest
+from ruamel.yaml import YAML
+import ansible_api
+import deployment_controller as dc
+
+INVENTORY_LIST = {
+    'LCLS': {'hosts': ['lcls-host-1'], 'children': ['lcls_servers']},
+    'lcls_servers': {'hosts': ['lcls-host-2']},
+    'FACET': {'hosts': ['facet-host-1']},
+    'DEV': {'hosts': ['dev-host-1']},
+}
+
+def host_result(**flags) -> dict:
+    return dict({'changed': False, 'msg': ''}, **flags)
+
+CALLBACK_OUTPUT = {
+    'plays': [{'tasks': [
+        {'task': {'name': 'Copy release'}, 'hosts': {
+            'lcls-host-1': host_result(changed=True), 'lcls-host-2': host_result(),
+            'facet-host-1': host_result(failed=True, msg='No space left on device'),
+            'other-host': host_result()}},
+        {'task': {'name': 'Restart IOCs'}, 'hosts': {
+            'lcls-host-1': host_result(skipped=True), 'lcls-host-2': host_result(unreachable=True, msg='timed out')}},
+    ]}],
+    'stats': {
+        'lcls-host-1': {'ok': 2, 'changed': 1, 'failures': 0, 'unreachable': 0, 'skipped': 1},
+        'lcls-host-2': {'ok': 1, 'changed': 0, 'failures': 0, 'unreachable': 1, 'skipped': 0},
+        'facet-host-1': {'ok': 0, 'changed': 0, 'failures': 1, 'unreachable': 0, 'skipped': 0},
+        'other-host': {'ok': 1, 'changed': 0, 'failures': 0, 'unreachable': 0, 'skipped': 0},
+    },
+}
+
+@pytest.fixture
+def fake_ansible(monkeypatch):
+    """ Canned ansible-inventory and playbook runs, returns the playbook calls """
+    calls = []
+    def run_process(command, custom_env=None, return_output=False):
+        assert command[0] == 'ansible-inventory'
+        return json.dumps(INVENTORY_LIST), '', 0
+    def run_ansible_playbook(inventory, playbook, host, extra_vars, **kwargs):
+        calls.append({'host': host, 'extra_vars': json.loads(extra_vars), **kwargs})
+        return '[WARNING]: no inventory\n' + json.dumps(CALLBACK_OUTPUT), 'stderr text', 2
+    monkeypatch.setattr(ansible_api, 'run_process', run_process)
+    monkeypatch.setattr(ansible_api, 'run_ansible_playbook', run_ansible_playbook)
+    return calls
+
+def run_batch(tmp_path, facilities: list) -> dict:
+    ioc_lists = {facility: [{'name': f'sioc-{facility.lower()}'}] for facility in facilities}
+    return dc.run_batched_ioc_playbook(facilities, ioc_lists, {'tag': 'R1', 'facility': None, 'ioc_list': None},
+                                       'inventory.ini', 'ioc_deploy.yml', str(tmp_path), False,
+                                       {'LCLS': {'prestaged_path': '/var/tmp/R1.tar.gz'}})
+
+def test_parse_json_callback_output():
+    parsed = ansible_api.parse_json_callback_output('[WARNING]: no inventory\n' + json.dumps(CALLBACK_OUTPUT))
+    assert parsed['stats'] == CALLBACK_OUTPUT['stats']
+    assert parsed['host_tasks']['lcls-host-1'] == [('Copy release', 'changed', ''), ('Restart IOCs', 'skipping', '')]
+    assert parsed['host_tasks']['lcls-host-2'][1] == ('Restart IOCs', 'unreachable', 'timed out')
+    assert parsed['host_tasks']['facet-host-1'] == [('Copy release', 'failed', 'No space left on device')]
+    with pytest.raises(ValueError):
+        ansible_api.parse_json_callback_output('no json here')
+
+def test_inventory_group_hosts(fake_ansible):
+    assert ansible_api.get_inventory_group_hosts('inventory.ini', ['LCLS', 'FACET', 'MISSING']) == {
+        'LCLS': ['lcls-host-1', 'lcls-host-2'], 'FACET': ['facet-host-1'], 'MISSING': []}
+
+def test_per_facility_results(tmp_path, fake_ansible):
+    results = run_batch(tmp_path, ['LCLS', 'FACET'])
+    assert fake_ansible[0]['host'] == 'LCLS:FACET'
+    assert 'facility' not in fake_ansible[0]['extra_vars'] and 'ioc_list' not in fake_ansible[0]['extra_vars']
+    lcls_output, lcls_success = results['LCLS']
+    facet_output, facet_success = results['FACET']
+    assert not lcls_success # lcls-host-2 is in LCLS through a child group, and was unreachable
+    assert 'TASK [Restart IOCs] unreachable: [lcls-host-2] => timed out' in lcls_output
+    assert 'PLAY RECAP lcls-host-1: ok=2 changed=1' in lcls_output and 'facet-host-1' not in lcls_output
+    assert not facet_success and 'No space left on device' in facet_output
+    assert 'stderr text' in facet_output
+    assert 'other-host' not in lcls_output + facet_output # Host in no facility
+
+def test_facility_success(tmp_path, fake_ansible, monkeypatch):
+    stats = dict(CALLBACK_OUTPUT['stats'], **{'lcls-host-2': CALLBACK_OUTPUT['stats']['lcls-host-1']})
+    output = dict(CALLBACK_OUTPUT, plays=[], stats=stats)
+    monkeypatch.setattr(ansible_api, 'run_ansible_playbook', lambda *args, **kwargs: (json.dumps(output), '', 2))
+    results = run_batch(tmp_path, ['LCLS', 'FACET'])
+    assert results['LCLS'][1] and 'stderr' not in results['LCLS'][0]
+    assert not results['FACET'][1]
+
+def test_facility_without_hosts_in_the_run(tmp_path, fake_ansible):
+    results = run_batch(tmp_path, ['DEV', 'MISSING'])
+    for facility in ('DEV', 'MISSING'):
+        output, success = results[facility]
+        assert not success and f'No host of {facility} ran the playbook' in output
+
+def test_group_vars_inventory(tmp_path, fake_ansible):
+    run_batch(tmp_path, ['LCLS', 'FACET'])
+    assert fake_ansible[0]['extra_inventories'] == [str(tmp_path / 'batched_group_vars.yml')]
+    with open(tmp_path / 'batched_group_vars.yml') as file:
+        groups = YAML().load(file)['all']['children']
+    assert groups['LCLS']['vars'] == {'prestaged_path': '/var/tmp/R1.tar.gz', 'facility': 'LCLS',
+                                      'ioc_list': [{'name': 'sioc-lcls'}]}
+    assert groups['FACET']['vars'] == {'facility': 'FACET', 'ioc_list': [{'name': 'sioc-facet'}]}
+
+def test_unparsable_output(tmp_path, fake_ansible, monkeypatch):
+    monkeypatch.setattr(ansible_api, 'run_ansible_playbook', lambda *args, **kwargs: ('ERROR! no playbook', 'bad', 4))
+    results = run_batch(tmp_path, ['LCLS', 'FACET'])
+    for facility in ('LCLS', 'FACET'):
+        output, success = results[facility]
+        assert not success and 'ERROR! no playbook' in output and 'bad' in output
@@ -0,0 +1,79 @@
+"""
+Desc: TEST per task component lookups (ComponentLookup, find_component_in_facility in
+deployment_controller.py) with a fake backend
+
+Usage: pytest test_component_lookup.py
+"""
+import threading
+import pytest
+import requests
+import deployment_controller as dc
+from read_cache import TtlCache
+
+class FakeResponse(object):
+    def __init__(self, status_code: int, payload: dict = None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.payload = payload
+
+    def json(self) -> dict:
+        return {'payload': self.payload}
+
+class FakeBackend(object):
+    """ http_client stand-in answering GET deployments/{component}/{facility} """
+    def __init__(self):
+        self.statuses = {'LCLS': 200} # Facilities not listed aren't deployed (404)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get(self, url: str, endpoint_name: str = None, **kwargs) -> FakeResponse:
+        facility = url.rsplit('/', 1)[-1]
+        with self.lock:
+            self.calls.append(facility)
+        status = self.statuses.get(facility, 404)
+        if status == 'timeout':
+            raise requests.exceptions.ConnectTimeout("backend timed out")
+        return FakeResponse(status, {'name': 'comp', 'facility': facility, 'dependsOn': [{'name': 'sioc-1'}]})
+
+@pytest.fixture
+def backend(monkeypatch):
+    fake_backend = FakeBackend()
+    monkeypatch.setattr(dc, 'http_client', fake_backend)
+    # No read cache, so every backend call avoided is down to the lookup memo
+    monkeypatch.setattr(dc, 'component_cache', TtlCache('component', 0))
+    return fake_backend
+
+def test_repeated_lookups_hit_backend_once(backend):
+    lookup = dc.ComponentLookup('comp')
+    assert lookup.get('LCLS')['facility'] == 'LCLS'
+    assert lookup.get('FACET') is None
+    assert lookup.all()['LCLS']['facility'] == 'LCLS'
+    assert dc.find_facility_an_ioc_is_in('sioc-1', 'comp', lookup) == ['LCLS']
+    assert sorted(backend.calls) == sorted(dc.FACILITIES_LIST) # One parallel round, once per facility
+
+def test_facility_outside_the_list(backend):
+    lookup = dc.ComponentLookup('comp')
+    lookup.get('LCLS')
+    lookup.get('OTHER')
+    lookup.get('OTHER')
+    assert backend.calls.count('OTHER') == 1 and backend.calls.count('LCLS') == 1
+
+@pytest.mark.parametrize('error', [500, 'timeout'])
+def test_failed_lookup_is_not_memoized(backend, error):
+    backend.statuses['LCLS'] = error
+    lookup = dc.ComponentLookup('comp')
+    assert lookup.get('LCLS') is None
+    assert lookup.get('FACET') is None
+    assert backend.calls.count('LCLS') == 2 # Retried by the second lookup
+    assert backend.calls.count('FACET') == 1 # Not deployed is an answer, memoized
+    backend.statuses['LCLS'] = 200
+    assert lookup.get('LCLS')['facility'] == 'LCLS'
+    lookup.get('LCLS')
+    assert backend.calls.count('LCLS') == 3
+
+def test_find_component_raise_errors(backend):
+    backend.statuses['LCLS'] = 503
+    assert dc.find_component_in_facility('LCLS', 'comp') is None
+    with pytest.raises(RuntimeError):
+        dc.find_component_in_facility('LCLS', 'comp', raise_errors=True)
+    assert dc.find_component_in_facility('FACET', 'comp', raise_errors=True) is None # 404
@@ -0,0 +1,97 @@
+"""
+Desc: TEST deployment concurrency (DeploymentSlots, deploy_async and GET /metrics in deployment_controller.py),
+deployments are replaced by a blocking stand-in, redis by fakeredis
+
+Usage: pytest test_deployment_slots.py
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import fakeredis
+import httpx
+import pytest
+import deployment_controller as dc
+from workspace import WorkspaceManager
+
+LIMIT = 2
+
+class BlockingDeployments(object):
+    """ run_deployment stand-in that blocks until released, tracking how many run at once """
+    def __init__(self):
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.done = []
+
+    def run_deployment(self, task, deploy_request):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        self.release.wait(30)
+        with self.lock:
+            self.running -= 1
+            self.done.append(task.task_id)
+
+@pytest.fixture
+def deployments(tmp_path, monkeypatch):
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(dc, 'redis_client', redis_client)
+    monkeypatch.setattr(dc, 'workspaces', WorkspaceManager(str(tmp_path), lambda: redis_client, 60, 3600))
+    monkeypatch.setattr(dc, 'deployment_slots', dc.DeploymentSlots(LIMIT))
+    executor = ThreadPoolExecutor(max_workers=LIMIT)
+    monkeypatch.setattr(dc, 'deployment_executor', executor)
+    blocking = BlockingDeployments()
+    monkeypatch.setattr(dc, 'run_deployment', blocking.run_deployment)
+    monkeypatch.setattr(dc, 'prepare_deployment_task',
+                        lambda task_id, deploy_request: dc.DeploymentTask(task_id, save_callback=dc.save_task))
+    yield blocking
+    blocking.release.set()
+    executor.shutdown(wait=True)
+
+async def wait_for(condition, timeout: float = 10):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Timed out")
+
+async def get_metrics() -> dict:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=dc.app), base_url='http://test') as client:
+        response = await client.get('/metrics')
+    assert response.status_code == 200
+    return response.json()['deployments']
+
+@pytest.mark.asyncio
+async def test_slots_bound_running_deployments(deployments):
+    request = dc.DeployDict(component_name='comp', tag='R1', user='alice', playbook='ioc_module/ioc_deploy.yml')
+    runs = [asyncio.create_task(dc.deploy_async(f't{i}', request)) for i in range(5)]
+    await wait_for(lambda: dc.deployment_slots.running == LIMIT and dc.deployment_slots.queued == 3)
+
+    stats = await get_metrics()
+    stats.pop('avg_wait_ms')
+    assert stats == {'limit': LIMIT, 'queued': 3, 'running': LIMIT, 'finished': 0, 'max_queued': 3}
+    assert deployments.running == LIMIT
+    # Deployments started while the slots were full show why they're waiting
+    queued_task = dc.get_task('t4')
+    assert queued_task.status == 'pending' and queued_task.progress['current_step'] == 'Queued'
+
+    deployments.release.set()
+    await asyncio.wait_for(asyncio.gather(*runs), 30)
+    assert deployments.peak == LIMIT
+    assert sorted(deployments.done) == [f't{i}' for i in range(5)]
+    stats = await get_metrics()
+    assert stats['running'] == 0 and stats['queued'] == 0 and stats['finished'] == 5
+    assert stats['max_queued'] == 3
+    assert stats['avg_wait_ms'] > 0 # Three of the five waited for a slot
+
+@pytest.mark.asyncio
+async def test_slot_is_released_on_failure(deployments):
+    slots = dc.DeploymentSlots(1)
+    with pytest.raises(RuntimeError):
+        async with slots.acquire():
+            raise RuntimeError("deployment crashed")
+    assert slots.stats()['running'] == 0 and slots.stats()['finished'] == 1
+    async with slots.acquire(): # Not leaked
+        assert slots.is_full()
+    assert not slots.is_full()
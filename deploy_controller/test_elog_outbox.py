@@ -0,0 +1,84 @@
+"""
+Desc: TEST ELOG outbox (elog_outbox.py) against fakeredis
+
+Usage: pytest test_elog_outbox.py
+"""
+import json
+import time
+import fakeredis
+import pytest
+from elog_outbox import ElogOutbox
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+def new_outbox(redis_client, responses: list, done: list, max_attempts: int = 3) -> ElogOutbox:
+    """ Outbox whose sends return the next of responses (an exception is raised) """
+    def send(entry):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+    return ElogOutbox(lambda: redis_client, send, on_done=lambda entry, url: done.append((entry['task_id'], url)),
+                      max_attempts=max_attempts, base_backoff=30, max_backoff=100)
+
+def make_due(redis_client, entry_id: str):
+    redis_client.zadd("elog:outbox", {entry_id: time.time() - 1})
+
+def test_sent_entry_is_removed(redis_client):
+    done = []
+    outbox = new_outbox(redis_client, ['https://elog/1'], done)
+    outbox.enqueue('t1', 'comp', 'R1', ['LCLS'], 'summary')
+    assert outbox.drain(rate_limit=0) == 1
+    assert done == [('t1', 'https://elog/1')]
+    assert outbox.stats() == {'pending': 0, 'dead': 0}
+    assert redis_client.get("elog:entry:t1") is None
+
+def test_failed_entry_backs_off(redis_client):
+    done = []
+    outbox = new_outbox(redis_client, [None, RuntimeError("ELOG down"), 'https://elog/1'], done)
+    outbox.enqueue('t1', 'comp', 'R1', ['LCLS'], 'summary')
+    assert outbox.drain(rate_limit=0) == 0
+    due = redis_client.zscore("elog:outbox", 't1')
+    assert 25 < due - time.time() <= 30 # base_backoff
+    assert outbox.drain(rate_limit=0) == 0 # Not due yet, nothing is sent
+    make_due(redis_client, 't1')
+    assert outbox.drain(rate_limit=0) == 0
+    assert 55 < redis_client.zscore("elog:outbox", 't1') - time.time() <= 60 # Doubled
+    assert json.loads(redis_client.get("elog:entry:t1"))['attempts'] == 2
+    make_due(redis_client, 't1')
+    assert outbox.drain(rate_limit=0) == 1
+    assert done == [('t1', 'https://elog/1')]
+
+def test_backoff_is_capped(redis_client):
+    outbox = new_outbox(redis_client, [None] * 4, [], max_attempts=10)
+    outbox.enqueue('t1', 'comp', 'R1', ['LCLS'], 'summary')
+    for _ in range(4):
+        make_due(redis_client, 't1')
+        outbox.drain(rate_limit=0)
+    assert redis_client.zscore("elog:outbox", 't1') - time.time() <= 100 # max_backoff
+
+def test_dead_letter_after_max_attempts(redis_client):
+    done = []
+    outbox = new_outbox(redis_client, [None, None, None], done, max_attempts=3)
+    outbox.enqueue('t1', 'comp', 'R1', ['LCLS'], 'summary')
+    for _ in range(3):
+        make_due(redis_client, 't1')
+        outbox.drain(rate_limit=0)
+    assert done == [('t1', None)]
+    assert outbox.stats() == {'pending': 0, 'dead': 1}
+    assert json.loads(redis_client.lindex("elog:dead", 0))['attempts'] == 3
+
+def test_claimed_entry_is_leased(redis_client):
+    outbox = new_outbox(redis_client, [], [])
+    outbox.enqueue('t1', 'comp', 'R1', ['LCLS'], 'summary')
+    assert outbox._claim('t1')
+    assert not outbox._claim('t1') # Pushed lease seconds ahead, other senders skip it
+    assert redis_client.zscore("elog:outbox", 't1') > time.time() + 100
+
+def test_orphan_id_is_dropped(redis_client):
+    outbox = new_outbox(redis_client, [], [])
+    make_due(redis_client, 'gone')
+    assert outbox.drain(rate_limit=0) == 0
+    assert outbox.stats()['pending'] == 0
@@ -0,0 +1,60 @@
+"""
+Desc: TEST shared HTTP client (http_client.py) against a local http server
+
+Usage: pytest test_http_client.py
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from http_client import HttpClient
+
+class Handler(BaseHTTPRequestHandler):
+    calls = {}
+
+    def respond(self):
+        Handler.calls[(self.command, self.path)] = Handler.calls.get((self.command, self.path), 0) + 1
+        status = 503 if self.path == '/unavailable' else 200
+        body = b'{"payload": "ok"}'
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = respond
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server_url():
+    Handler.calls = {}
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def test_requests_and_metrics(server_url):
+    client = HttpClient(5, retries=0)
+    assert client.get(server_url + '/deployments/comp/LCLS', 'GET deployments').json() == {'payload': 'ok'}
+    client.get(server_url + '/deployments/comp/FACET', 'GET deployments')
+    metrics = client.metrics()['GET deployments']
+    assert metrics['count'] == 2 and metrics['errors'] == 0
+
+def test_idempotent_verbs_are_retried(server_url):
+    client = HttpClient(5, retries=2, backoff_factor=0)
+    assert client.get(server_url + '/unavailable').status_code == 503
+    assert Handler.calls[('GET', '/unavailable')] == 3
+    assert client.metrics()[f"GET {server_url}/unavailable"]['errors'] == 1
+
+def test_post_is_not_retried(server_url):
+    client = HttpClient(5, retries=2, backoff_factor=0)
+    assert client.post(server_url + '/unavailable', json={}).status_code == 503
+    assert Handler.calls[('POST', '/unavailable')] == 1
+
+def test_connection_errors_are_recorded():
+    client = HttpClient(1, retries=0)
+    with pytest.raises(Exception):
+        client.get('http://127.0.0.1:9/unreachable', 'GET unreachable')
+    assert client.metrics()['GET unreachable']['errors'] == 1
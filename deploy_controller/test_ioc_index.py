@@ -0,0 +1,48 @@
+"""
+Desc: TEST the shared IOC index of a deployment (build_ioc_index, facility_ioc_list in
+deployment_controller.py), no backend needed
+
+Usage: pytest test_ioc_index.py
+"""
+import pytest
+import deployment_controller as dc
+
+IOC_INFO = [
+    {'folder_name': 'sioc-1', 'architecture': 'rhel7-x86_64', 'binary': 'app', 'boot_dir': 'iocBoot'},
+    {'folder_name': 'cpu-1', 'architecture': 'linuxrt-x86_64', 'binary': 'app', 'boot_dir': 'cpuBoot'},
+    {'folder_name': 'sioc-2', 'architecture': 'rhel7-x86_64', 'binary': 'app'},
+]
+
+def test_index_in_release_order():
+    index = dc.build_ioc_index(IOC_INFO)
+    assert list(index) == ['sioc-1', 'cpu-1', 'sioc-2']
+    assert index['sioc-2'].boot_dir == 'iocBoot'
+    assert index['cpu-1'].startup_cmd_template == 'startup.cmd.cpu'
+
+def test_facility_lists_do_not_leak():
+    index = dc.build_ioc_index(IOC_INFO)
+    lcls = dc.facility_ioc_list(index, 'LCLS', ['cpu-1', 'sioc-1'])
+    facet = dc.facility_ioc_list(index, 'FACET', ['cpu-1'])
+    assert [ioc['name'] for ioc in lcls] == ['sioc-1', 'cpu-1']
+    assert lcls[1]['startup_cmd_template'] == 'startup.cmd.cpu.lcls'
+    assert facet == [dict(lcls[1], startup_cmd_template='startup.cmd.cpu.facet')]
+    lcls[1]['startup_cmd_template'] = 'changed'
+    lcls.append({'name': 'extra'})
+    assert dc.facility_ioc_list(index, 'FACET', ['cpu-1']) == facet
+    assert index['cpu-1'].startup_cmd_template == 'startup.cmd.cpu'
+
+def test_unknown_iocs_are_left_out():
+    index = dc.build_ioc_index(IOC_INFO)
+    assert dc.facility_ioc_list(index, 'LCLS', ['sioc-9']) == []
+
+def test_index_is_read_only():
+    ioc_info = [dict(ioc) for ioc in IOC_INFO]
+    index = dc.build_ioc_index(ioc_info)
+    with pytest.raises(TypeError):
+        index['sioc-3'] = index['sioc-1']
+    with pytest.raises(TypeError):
+        del index['sioc-1']
+    with pytest.raises(AttributeError):
+        index['sioc-1'].architecture = 'rtems'
+    ioc_info[0]['architecture'] = 'changed' # The source list isn't referenced
+    assert index['sioc-1'].architecture == 'rhel7-x86_64'
@@ -0,0 +1,103 @@
+"""
+Desc: TEST IOC manifests (ioc_manifest.py, Build.write_ioc_manifest in build_scripts/start_build.py and
+extract_ioc_cpu_shebang_info in deployment_controller.py), no backend needed
+
+Usage: pytest test_ioc_manifest.py
+"""
+import os
+import sys
+import json
+import filecmp
+import logging
+import pytest
+import deployment_controller as dc
+from release_cache import ReleaseCache
+from ioc_manifest import parse_shebang
+
+BUILD_SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'build_scripts')
+
+ST_CMD_FILES = {
+    'iocBoot/sioc-1/st.cmd': '#!../../bin/rhel7-x86_64/myApp\n',
+    'iocBoot/ioc-2/st.cmd': '#!../../bin/linuxRT-x86_64/myApp\n',
+    'cpuBoot/cpu-3/st.cmd': '#!../../bin/rhel7-x86_64/cpuApp\n',
+    'iocBoot/sioc-4/st.cmd': '< envPaths\n',             # No shebang, left out
+    'iocBoot/sioc-5/st.cmd': '#!/bin/sh\n',              # No bin/<arch>/<binary>, left out
+    'iocBoot/sioc-6/st.cmd': '#!/usr/bin/env python\n',  # Same
+    'iocBoot/Makefile': 'TOP = ../..\n',
+}
+
+@pytest.fixture
+def app_dir(tmp_path) -> str:
+    for path, content in ST_CMD_FILES.items():
+        os.makedirs(tmp_path / 'R1' / os.path.dirname(path), exist_ok=True)
+        (tmp_path / 'R1' / path).write_text(content)
+    return str(tmp_path / 'R1')
+
+@pytest.fixture
+def release_cache(tmp_path, monkeypatch):
+    cache = ReleaseCache(str(tmp_path / 'release_cache'), 10**9)
+    monkeypatch.setattr(dc, 'release_cache', cache)
+    return cache
+
+@pytest.fixture
+def start_build(monkeypatch):
+    monkeypatch.setattr(sys, 'path', sys.path + [BUILD_SCRIPTS_DIR]) # After deploy_controller, so its modules win
+    start_build = pytest.importorskip('start_build')
+    monkeypatch.setattr(start_build, 'logger', logging.getLogger('test_ioc_manifest'))
+    return start_build
+
+def by_name(iocs: list) -> dict:
+    return {ioc['folder_name']: ioc for ioc in iocs}
+
+def test_copies_are_identical():
+    assert filecmp.cmp(os.path.join(BUILD_SCRIPTS_DIR, 'ioc_manifest.py'),
+                       os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ioc_manifest.py'), shallow=False)
+
+def test_parse_shebang():
+    assert parse_shebang('#!../../bin/rhel7-x86_64/myApp') == ('rhel7-x86_64', 'myApp')
+    assert parse_shebang('#!/bin/sh') == (None, None)
+    assert parse_shebang('#!/usr/bin/env python') == (None, None)
+    assert parse_shebang('#!../../bin/rhel7-x86_64') == (None, None)
+
+def test_build_manifest_matches_deployment_scan(app_dir, release_cache, start_build):
+    start_build.Build.write_ioc_manifest(object.__new__(start_build.Build), app_dir)
+    with open(os.path.join(app_dir, dc.IOC_MANIFEST_NAME)) as f:
+        packaged = dc.read_ioc_manifest(json.load(f))
+    os.remove(os.path.join(app_dir, dc.IOC_MANIFEST_NAME))
+    scanned = dc.extract_ioc_cpu_shebang_info(app_dir)
+    assert sorted(by_name(packaged)) == ['cpu-3', 'ioc-2', 'sioc-1']
+    assert by_name(packaged) == by_name(scanned)
+    assert by_name(scanned)['cpu-3'] == {'folder_name': 'cpu-3', 'architecture': 'rhel7-x86_64',
+                                         'binary': 'cpuApp', 'boot_dir': 'cpuBoot'}
+
+def test_read_ioc_manifest():
+    iocs = [{'folder_name': 'sioc-1', 'architecture': 'rhel7-x86_64', 'binary': 'myApp', 'boot_dir': 'iocBoot'}]
+    assert dc.read_ioc_manifest(dc.new_ioc_manifest(iocs)) == iocs
+    assert dc.read_ioc_manifest({'version': 2, 'iocs': iocs}) is None
+    assert dc.read_ioc_manifest({'iocs': iocs}) is None
+    assert dc.read_ioc_manifest(None) is None # Missing
+    assert dc.read_ioc_manifest(iocs) is None
+
+def test_packaged_manifest_is_used(app_dir, release_cache):
+    iocs = [{'folder_name': 'packaged', 'architecture': 'rhel7-x86_64', 'binary': 'myApp', 'boot_dir': 'iocBoot'}]
+    with open(os.path.join(app_dir, dc.IOC_MANIFEST_NAME), 'w') as f:
+        json.dump(dc.new_ioc_manifest(iocs), f)
+    assert dc.extract_ioc_cpu_shebang_info(app_dir, 'comp', 'R1') == iocs
+
+def test_wrong_version_falls_back_to_scan(app_dir, release_cache):
+    with open(os.path.join(app_dir, dc.IOC_MANIFEST_NAME), 'w') as f:
+        json.dump({'version': 99, 'iocs': []}, f)
+    assert sorted(by_name(dc.extract_ioc_cpu_shebang_info(app_dir, 'comp', 'R1'))) == ['cpu-3', 'ioc-2', 'sioc-1']
+
+def test_missing_manifest_scans_once(app_dir, release_cache, monkeypatch):
+    first = dc.extract_ioc_cpu_shebang_info(app_dir, 'comp', 'R1')
+    assert release_cache.load_metadata('comp', 'R1', dc.IOC_MANIFEST_NAME) == dc.new_ioc_manifest(first)
+    def no_scan(app_dir_name):
+        raise AssertionError("The cached manifest should be used")
+    monkeypatch.setattr(dc, 'scan_ioc_boot_dirs', no_scan)
+    assert dc.extract_ioc_cpu_shebang_info(app_dir, 'comp', 'R1') == first
+
+def test_invalid_manifest_file(app_dir, release_cache):
+    with open(os.path.join(app_dir, dc.IOC_MANIFEST_NAME), 'w') as f:
+        f.write('{not json')
+    assert len(dc.extract_ioc_cpu_shebang_info(app_dir)) == 3
@@ -0,0 +1,72 @@
+"""
+Desc: TEST deployment job queue (job_queue.py) against fakeredis
+
+Usage: pytest test_job_queue.py
+"""
+import time
+import fakeredis
+import pytest
+from job_queue import JobQueue, keep_alive
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+@pytest.fixture
+def queue(redis_client):
+    return JobQueue(lambda: redis_client, visibility_timeout=60, max_attempts=2)
+
+def expire_deadline(redis_client, queue: JobQueue, job_id: str):
+    redis_client.zadd(queue.processing_key, {job_id: time.time() - 1})
+
+def test_priority_then_fifo(queue):
+    queue.enqueue('j1', 'a', {})
+    queue.enqueue('j2', 'b', {})
+    queue.enqueue('j3', 'c', {}, priority=5)
+    assert queue.position('j3') == 0
+    assert [queue.claim('w').job_id for _ in range(3)] == ['j3', 'j1', 'j2']
+    assert queue.claim('w') is None
+
+def test_one_job_per_component(queue):
+    queue.enqueue('j1', 'a', {'n': 1})
+    queue.enqueue('j2', 'a', {'n': 2})
+    queue.enqueue('j3', 'b', {'n': 3})
+    first = queue.claim('w1')
+    assert first.job_id == 'j1' and first.payload == {'n': 1}
+    assert queue.claim('w2').job_id == 'j3' # j2 waits for j1
+    assert queue.claim('w2') is None
+    queue.ack(first)
+    assert queue.claim('w2').job_id == 'j2'
+
+def test_reap_requeues_invisible_job(queue, redis_client):
+    queue.enqueue('j1', 'a', {})
+    job = queue.claim('w1')
+    assert queue.reap() == [] # Deadline not passed
+    expire_deadline(redis_client, queue, 'j1')
+    assert queue.reap() == []
+    assert not queue.heartbeat(job) # The worker lost its lease
+    retried = queue.claim('w2')
+    assert retried.job_id == 'j1' and retried.attempts == 2
+
+def test_reap_drops_job_out_of_attempts(queue, redis_client):
+    queue.enqueue('j1', 'a', {})
+    for _ in range(2):
+        assert queue.claim('w').job_id == 'j1'
+        expire_deadline(redis_client, queue, 'j1')
+        dead_jobs = queue.reap()
+    assert dead_jobs == ['j1']
+    assert queue.claim('w') is None
+    assert queue.stats() == {'pending': 0, 'processing': 0}
+    assert redis_client.get(queue._lock_key('a')) is None
+
+def test_heartbeat_extends_visibility(queue, redis_client):
+    queue.enqueue('j1', 'a', {})
+    job = queue.claim('w1')
+    redis_client.zadd(queue.processing_key, {'j1': time.time() + 1})
+    assert queue.heartbeat(job)
+    assert redis_client.zscore(queue.processing_key, 'j1') > time.time() + 50
+    expire_deadline(redis_client, queue, 'j1')
+    with keep_alive(queue, job, interval=0.05):
+        time.sleep(0.2)
+    assert queue.reap() == []
+    assert queue.stats() == {'pending': 0, 'processing': 1}
@@ -0,0 +1,70 @@
+"""
+Desc: TEST deployment locks (locks.py) against fakeredis
+
+Usage: pytest test_locks.py
+"""
+import threading
+import fakeredis
+import pytest
+from locks import DeploymentLock, args_digest
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+def new_lock(redis_client, task_id: str, digest: str = None, ttl: int = 60) -> DeploymentLock:
+    return DeploymentLock(lambda: redis_client, 'comp', 'LCLS', task_id, 'R1', ttl, digest)
+
+def test_one_holder_at_a_time(redis_client):
+    first, second = new_lock(redis_client, 't1'), new_lock(redis_client, 't2')
+    assert first.try_acquire()
+    assert not second.try_acquire()
+    assert second.holder()['task_id'] == 't1'
+    first.release(True)
+    assert second.try_acquire()
+
+def test_release_only_with_own_token(redis_client):
+    first, second = new_lock(redis_client, 't1'), new_lock(redis_client, 't2')
+    assert first.try_acquire()
+    redis_client.delete(first.key) # Lease expired
+    assert second.try_acquire()
+    first.release(True) # Must not release the new holder's lock
+    assert second.holder()['token'] == second.token
+    assert not first.renew() and first.lost
+
+def test_renew_extends_lease(redis_client):
+    lock = new_lock(redis_client, 't1', ttl=5)
+    assert lock.try_acquire()
+    redis_client.expire(lock.key, 1)
+    assert lock.renew()
+    assert redis_client.ttl(lock.key) > 1
+
+def test_coalesce_needs_same_digest(redis_client):
+    holder = new_lock(redis_client, 't1', 'digest-a')
+    assert holder.try_acquire()
+    assert new_lock(redis_client, 't2', 'digest-a').can_coalesce(holder.holder())
+    assert not new_lock(redis_client, 't2', 'digest-b').can_coalesce(holder.holder())
+    assert not new_lock(redis_client, 't2', None).can_coalesce(holder.holder())
+    assert not new_lock(redis_client, 't2', 'digest-a').can_coalesce(None)
+
+def test_coalesced_waiter_gets_holder_outcome(redis_client):
+    holder = new_lock(redis_client, 't1', 'digest-a')
+    assert holder.try_acquire()
+    waiter = new_lock(redis_client, 't2', 'digest-a')
+    threading.Timer(0.2, holder.release, args=(False,)).start()
+    assert waiter.wait_for_result('t1', timeout=5, poll_interval=0.05) == {'success': False}
+
+def test_wait_for_result_without_outcome(redis_client):
+    holder = new_lock(redis_client, 't1')
+    assert holder.try_acquire()
+    redis_client.delete(holder.key) # Holder crashed, lease expired
+    assert new_lock(redis_client, 't2').wait_for_result('t1', timeout=1, poll_interval=0.05) is None
+
+def test_args_digest():
+    args = {'component_name': 'comp', 'tag': 'R1', 'facility': 'LCLS', 'ioc_list': [{'name': 'sioc-1'}],
+            'release_dir': '/app/tmp/task-1/R1', 'user': 'alice'}
+    same = dict(args, release_dir='/app/tmp/task-2/R1', user='bob')
+    assert args_digest(args, '/app/tmp/task-1', ('user',)) == args_digest(same, '/app/tmp/task-2', ('user',))
+    assert args_digest(args, '/app/tmp/task-1') != args_digest(same, '/app/tmp/task-2')
+    other_iocs = dict(same, ioc_list=[{'name': 'sioc-2'}])
+    assert args_digest(args, '/app/tmp/task-1', ('user',)) != args_digest(other_iocs, '/app/tmp/task-2', ('user',))
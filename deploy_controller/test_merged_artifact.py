@@ -0,0 +1,55 @@
+"""
+Desc: TEST merged IOC release artifacts (create_merged_artifact in deployment_controller.py), no backend needed
+
+Usage: pytest test_merged_artifact.py
+"""
+import os
+import stat
+import tarfile
+import shutil
+import pytest
+import deployment_controller as dc
+from release_cache import tree_index
+
+def make_release(download_dir) -> str:
+    """ Merged release tree, read-only like files linked from the release cache """
+    release_dir = download_dir / 'R1'
+    os.makedirs(release_dir / 'db')
+    os.makedirs(release_dir / 'bin' / 'rhel7-x86_64')
+    (release_dir / 'db' / 'app.db').write_text('record(ai, "X") {}\n')
+    (release_dir / 'bin' / 'rhel7-x86_64' / 'app').write_bytes(b'\x7fELF' * 100)
+    os.symlink('rhel7-x86_64', release_dir / 'bin' / 'host')
+    for root, dirs, files in os.walk(release_dir):
+        for name in files:
+            os.chmod(os.path.join(root, name), 0o444)
+    return str(release_dir)
+
+def members(tree: str) -> dict:
+    return {member['path']: (member['type'], member.get('sha256'), member.get('target')) for member in tree_index(tree)}
+
+@pytest.mark.parametrize('merged_format', ['tar', 'tar.gz'])
+@pytest.mark.parametrize('use_pigz', [False, True])
+def test_tarball_round_trip(tmp_path, monkeypatch, merged_format, use_pigz):
+    if use_pigz and not shutil.which('pigz'):
+        pytest.skip("pigz is not installed")
+    if not use_pigz:
+        monkeypatch.setattr(dc.shutil, 'which', lambda name: None)
+    release_dir = make_release(tmp_path / 'download')
+    artifact = dc.create_merged_artifact(str(tmp_path / 'download'), 'R1', merged_format)
+    assert artifact == str(tmp_path / 'download' / f'R1.{merged_format}')
+    with tarfile.open(artifact, 'r:gz' if merged_format == 'tar.gz' else 'r:') as tar:
+        assert all(member.name == 'R1' or member.name.startswith('R1/') for member in tar.getmembers())
+        assert tar.getmember('R1/db/app.db').mode & stat.S_IWUSR # Owner write bit restored
+        tar.extractall(tmp_path / 'extracted', filter='data')
+    assert members(str(tmp_path / 'extracted' / 'R1')) == members(release_dir)
+
+def test_directory(tmp_path):
+    release_dir = make_release(tmp_path / 'download')
+    assert dc.create_merged_artifact(str(tmp_path / 'download'), 'R1', 'directory') == release_dir
+    assert sorted(os.listdir(tmp_path / 'download')) == ['R1'] # Nothing written
+
+def test_unknown_format(tmp_path):
+    make_release(tmp_path / 'download')
+    with pytest.raises(ValueError):
+        dc.create_merged_artifact(str(tmp_path / 'download'), 'R1', 'zip')
+    assert sorted(os.listdir(tmp_path / 'download')) == ['R1']
@@ -0,0 +1,87 @@
+"""
+Desc: TEST deployment plans (plan_facility, skip_unchanged_iocs and POST /deployment/plan in
+deployment_controller.py), no backend needed
+
+Usage: pytest test_plan.py
+"""
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+import deployment_controller as dc
+from release_cache import ReleaseCache
+
+LCLS_COMPONENT = {'name': 'comp', 'tag': 'R1', 'dependsOn': [{'name': 'sioc-1', 'tag': 'R1'}, {'name': 'sioc-2', 'tag': 'R0'}]}
+
+class FakeLookup(object):
+    def __init__(self, components: dict):
+        self.components = components
+
+    def get(self, facility: str) -> dict:
+        return self.components.get(facility)
+
+def test_unchanged_ioc_is_skipped():
+    plan = dc.plan_facility(LCLS_COMPONENT, 'R1', ['sioc-1'])
+    assert plan['unchanged'] == ['sioc-1'] and plan['changing'] == [] and plan['new'] == []
+    assert plan['skip'] and not plan['component_changes'] and not plan['new_component']
+
+def test_changed_ioc_is_kept():
+    plan = dc.plan_facility(LCLS_COMPONENT, 'R1', ['sioc-1', 'sioc-2', 'sioc-3'])
+    assert plan['changing'] == [{'name': 'sioc-2', 'from': 'R0', 'to': 'R1'}]
+    assert plan['new'] == ['sioc-3'] and plan['unchanged'] == ['sioc-1']
+    assert not plan['skip']
+
+def test_component_only():
+    assert dc.plan_facility(LCLS_COMPONENT, 'R1', [])['skip']
+    plan = dc.plan_facility(LCLS_COMPONENT, 'R2', [])
+    assert not plan['skip'] and plan['component_changes'] and plan['current_tag'] == 'R1'
+
+def test_facility_without_deployment():
+    plan = dc.plan_facility(None, 'R1', ['sioc-1'])
+    assert plan['new_component'] and plan['current_tag'] is None
+    assert plan['new'] == ['sioc-1'] and not plan['skip']
+    assert not dc.plan_facility(None, 'R1', [])['skip'] # Component-only to a new facility
+
+def test_skip_unchanged_iocs():
+    lookup = FakeLookup({'LCLS': LCLS_COMPONENT})
+    remaining = dc.skip_unchanged_iocs({'LCLS': ['sioc-1', 'sioc-2'], 'FACET': ['sioc-1'], 'DEV': []}, 'R1', lookup)
+    assert remaining == {'LCLS': ['sioc-2'], 'FACET': ['sioc-1'], 'DEV': []}
+    assert dc.skip_unchanged_iocs({'LCLS': ['sioc-1']}, 'R1', lookup) == {}
+    assert dc.skip_unchanged_iocs({'LCLS': []}, 'R1', lookup) == {} # Component already at R1
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(dc, 'redis_client', redis_client)
+    monkeypatch.setattr(dc, 'release_cache', ReleaseCache(str(tmp_path / 'release_cache'), 10**9))
+    monkeypatch.setattr(dc, 'find_component_in_facility',
+                        lambda facility, component, **kwargs: LCLS_COMPONENT if facility == 'LCLS' else None)
+    def no_side_effects(*args, **kwargs):
+        raise AssertionError("A plan must not download, deploy or write")
+    for name in ('download_release', 'update_component_in_facility', 'run_streamed_playbook'):
+        monkeypatch.setattr(dc, name, no_side_effects)
+    monkeypatch.setattr(dc.ansible_api, 'run_ansible_playbook', no_side_effects)
+    return TestClient(dc.app), redis_client
+
+def test_plan_endpoint(client):
+    test_client, redis_client = client
+    dc.release_cache.save_metadata('comp', 'R1', dc.IOC_MANIFEST_NAME, dc.new_ioc_manifest([
+        {'folder_name': 'sioc-1', 'architecture': 'rhel7-x86_64', 'binary': 'app', 'boot_dir': 'iocBoot'},
+        {'folder_name': 'sioc-2', 'architecture': 'rhel7-x86_64', 'binary': 'app', 'boot_dir': 'iocBoot'}]))
+    response = test_client.post('/deployment/plan', json={
+        'component_name': 'comp', 'tag': 'R1', 'user': 'alice', 'playbook': 'ioc_module/ioc_deploy.yml',
+        'ioc_list': ['sioc-1', 'sioc-2', 'sioc-3'], 'facilities': ['LCLS', 'FACET']})
+    assert response.status_code == 200
+    payload = response.json()['payload']
+    assert payload['release_metadata_cached'] and not payload['nothing_to_deploy']
+    assert payload['facilities']['LCLS']['unchanged'] == ['sioc-1']
+    assert payload['facilities']['LCLS']['not_in_release'] == ['sioc-3']
+    assert payload['facilities']['FACET']['new_component']
+    assert redis_client.keys('*') == [] # No task, queue or lock
+
+def test_plan_nothing_to_deploy(client):
+    test_client, _ = client
+    response = test_client.post('/deployment/plan', json={
+        'component_name': 'comp', 'tag': 'R1', 'user': 'alice', 'playbook': 'ioc_module/ioc_deploy.yml',
+        'ioc_list': ['sioc-1'], 'facilities': ['LCLS']})
+    payload = response.json()['payload']
+    assert payload['nothing_to_deploy'] and not payload['release_metadata_cached']
@@ -0,0 +1,81 @@
+"""
+Desc: TEST streamed playbook output (run_process_streaming, parse_progress_line in ansible_api.py and
+playbook_progress_reporter, run_streamed_playbook in deployment_controller.py), runs small python processes
+
+Usage: pytest test_playbook_output.py
+"""
+import sys
+import ansible_api
+import deployment_controller as dc
+
+def python_command(code: str) -> list:
+    return [sys.executable, '-c', code]
+
+PRINT_LINES = "import sys\nfor i in range(100):\n    print(f'line {i}')\n    print(f'err {i}', file=sys.stderr)\n"
+
+def test_tail_is_bounded(tmp_path):
+    log_file = str(tmp_path / 'ansible.log')
+    lines = []
+    stdout, stderr, return_code = ansible_api.run_process_streaming(
+        python_command(PRINT_LINES + "sys.exit(3)"), None, on_line=lambda stream, line: lines.append((stream, line)),
+        log_file=log_file, max_output_lines=10)
+    assert return_code == 3
+    assert stdout.splitlines() == [f"... (90 earlier lines truncated, see {log_file}) ..."] + \
+                                  [f'line {i}' for i in range(90, 100)]
+    assert stderr.splitlines()[1:] == [f'err {i}' for i in range(90, 100)]
+    assert len(lines) == 200 and ('stdout', 'line 0\n') in lines
+    with open(log_file) as file:
+        logged = file.read().splitlines()
+    assert len(logged) == 200 and 'line 0' in logged and '[stderr] err 99' in logged
+
+def test_short_output_is_not_truncated():
+    stdout, stderr, return_code = ansible_api.run_process_streaming(
+        python_command("print('only line')"), None, max_output_lines=10)
+    assert (stdout, stderr, return_code) == ('only line\n', '', 0)
+
+def test_callback_errors_do_not_break_the_run():
+    def on_line(stream_name, line):
+        raise RuntimeError("broken callback")
+    stdout, _, return_code = ansible_api.run_process_streaming(python_command(PRINT_LINES), None, on_line=on_line)
+    assert return_code == 0 and len(stdout.splitlines()) == 100
+
+def test_parse_progress_line():
+    assert ansible_api.parse_progress_line('TASK [Copy tarball] *****') == {'type': 'task', 'task': 'Copy tarball'}
+    assert ansible_api.parse_progress_line('RUNNING HANDLER [restart ioc] ***') == {'type': 'task', 'task': 'restart ioc'}
+    assert ansible_api.parse_progress_line('PLAY [Deploy IOC] ****') == {'type': 'play', 'play': 'Deploy IOC'}
+    assert ansible_api.parse_progress_line('fatal: [host-1]: FAILED! => {}') == \
+        {'type': 'host', 'status': 'fatal', 'host': 'host-1'}
+    assert ansible_api.parse_progress_line('ok: [host-2]') == {'type': 'host', 'status': 'ok', 'host': 'host-2'}
+    assert ansible_api.parse_progress_line('PLAY RECAP *****') == {'type': 'recap'}
+    for line in ('', '    "msg": "TASK [not at the start]"', 'host-1 : ok=3 changed=1', '[WARNING]: ok: [x]'):
+        assert ansible_api.parse_progress_line(line) is None
+
+def test_progress_reporter(monkeypatch):
+    monkeypatch.setattr(dc, 'PROGRESS_UPDATE_INTERVAL', 0)
+    updates = []
+    task = dc.DeploymentTask('t1', save_callback=lambda task, fields: updates.append(task.progress['details']))
+    on_line = dc.playbook_progress_reporter(task, 'LCLS')
+    for line in ('PLAY [Deploy] ***', 'TASK [Copy tarball] ***', 'ok: [host-1]', 'changed: [host-1]',
+                 'some output', 'fatal: [host-2]: FAILED!', 'PLAY RECAP ***'):
+        on_line('stdout', line)
+    assert updates == ['LCLS: TASK [Copy tarball]', 'LCLS: fatal on host-2']
+
+def test_progress_reporter_is_throttled(monkeypatch):
+    monkeypatch.setattr(dc, 'PROGRESS_UPDATE_INTERVAL', 3600)
+    updates = []
+    task = dc.DeploymentTask('t1', save_callback=lambda task, fields: updates.append(task.progress['details']))
+    on_line = dc.playbook_progress_reporter(task, 'LCLS')
+    on_line('stdout', 'TASK [first] ***')
+    on_line('stdout', 'TASK [second] ***')
+    assert updates == ['LCLS: TASK [first]']
+
+def test_streamed_playbook_records_truncated_log(tmp_path, monkeypatch):
+    monkeypatch.setattr(dc, 'ANSIBLE_OUTPUT_TAIL_LINES', 10)
+    def run_ansible_playbook(*args, on_line=None, log_file=None, max_output_lines=None, **kwargs):
+        return ansible_api.run_process_streaming(python_command(PRINT_LINES), None, on_line, log_file, max_output_lines)
+    monkeypatch.setattr(ansible_api, 'run_ansible_playbook', run_ansible_playbook)
+    task = dc.DeploymentTask('t1')
+    full_log_files = {}
+    stdout, _, _ = dc.run_streamed_playbook(task, 'LCLS', str(tmp_path), full_log_files)
+    assert len(stdout.splitlines()) == 11
+    assert full_log_files == {'LCLS': str(tmp_path / 'ansible-LCLS.log')}
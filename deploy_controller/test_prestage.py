@@ -0,0 +1,71 @@
+"""
+Desc: TEST prestaged release registry (prestage.py) against fakeredis
+
+Usage: pytest test_prestage.py
+"""
+import json
+import time
+import fakeredis
+import pytest
+from prestage import PrestageRegistry
+
+PATH = '/var/tmp/adbs_prestage/comp/R1.tar.gz'
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+@pytest.fixture
+def registry(redis_client):
+    return PrestageRegistry(lambda: redis_client, ttl=3600)
+
+def age_copies(redis_client, hosts: list, seconds: float):
+    """ Pretend the copies on hosts were staged seconds ago """
+    for host in hosts:
+        entry = json.loads(redis_client.hget("prestage:comp:R1", host))
+        entry["staged_at"] -= seconds
+        redis_client.hset("prestage:comp:R1", host, json.dumps(entry))
+
+def test_staged_copy_needs_every_host(registry):
+    registry.record('comp', 'R1', ['host1', 'host2'], PATH, 'sha', 'content', 'tar.gz')
+    assert registry.staged_copy('comp', 'R1', ['host1', 'host2'], 'content', 'tar.gz')['path'] == PATH
+    assert registry.staged_copy('comp', 'R1', ['host1', 'host3'], 'content', 'tar.gz') is None
+    assert registry.staged_copy('comp', 'R1', ['host1'], 'reuploaded', 'tar.gz') is None
+    assert registry.staged_copy('comp', 'R1', ['host1'], 'content', 'tar') is None
+    assert registry.staged_copy('comp', 'R1', [], 'content', 'tar.gz') is None
+
+def test_forget_hosts(registry, redis_client):
+    registry.record('comp', 'R1', ['host1', 'host2'], PATH, 'sha', 'content', 'tar.gz')
+    registry.forget('comp', 'R1', ['host1'])
+    assert list(registry.staged('comp', 'R1')) == ['host2']
+    registry.forget('comp', 'R1', ['host2'])
+    assert registry.staged('comp', 'R1') == {}
+    assert redis_client.zcard("prestage:expiry") == 0
+
+def test_expired_copies_are_not_trusted(registry, redis_client):
+    registry.record('comp', 'R1', ['host1', 'host2'], PATH, 'sha', 'content', 'tar.gz')
+    age_copies(redis_client, ['host1'], 7200)
+    assert list(registry.staged('comp', 'R1')) == ['host2']
+    assert sorted(registry.staged('comp', 'R1', include_expired=True)) == ['host1', 'host2']
+    assert registry.staged_copy('comp', 'R1', ['host1', 'host2'], 'content', 'tar.gz') is None
+
+def test_expired_claims_once(registry, redis_client):
+    registry.record('comp', 'R1', ['host1', 'host2'], PATH, 'sha', 'content', 'tar.gz')
+    assert registry.expired() == []
+    age_copies(redis_client, ['host1', 'host2'], 7200)
+    redis_client.zadd("prestage:expiry", {json.dumps(['comp', 'R1']): time.time() - 1})
+    [(component, tag, host_entries)] = registry.expired()
+    assert (component, tag, sorted(host_entries)) == ('comp', 'R1', ['host1', 'host2'])
+    assert registry.expired() == [] # Claimed, other workers don't get it again
+
+def test_expired_requeues_later_copies(registry, redis_client):
+    registry.record('comp', 'R1', ['host1', 'host2'], PATH, 'sha', 'content', 'tar.gz')
+    age_copies(redis_client, ['host1'], 7200)
+    redis_client.zadd("prestage:expiry", {json.dumps(['comp', 'R1']): time.time() - 1})
+    [(_, _, host_entries)] = registry.expired()
+    assert list(host_entries) == ['host1']
+    assert redis_client.zscore("prestage:expiry", json.dumps(['comp', 'R1'])) > time.time() + 3000
+
+def test_record_keeps_entries_past_ttl_for_cleanup(registry, redis_client):
+    registry.record('comp', 'R1', ['host1'], PATH, 'sha', 'content', 'tar.gz')
+    assert redis_client.ttl("prestage:comp:R1") > 3600
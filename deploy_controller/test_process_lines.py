@@ -0,0 +1,88 @@
+"""
+Desc: TEST process output draining (read_process_lines, run_process) of both ansible_api.py copies,
+deploy_controller/ and build_scripts/, which have to stay identical
+
+Usage: pytest test_process_lines.py
+"""
+import os
+import sys
+import ast
+import threading
+import importlib.util
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ANSIBLE_API_COPIES = {'deploy_controller': os.path.join(HERE, 'ansible_api.py'),
+                      'build_scripts': os.path.join(HERE, '..', 'build_scripts', 'ansible_api.py')}
+SHARED_DEFINITIONS = ('ProcessOutputStats', 'read_process_lines', 'run_process')
+
+# 2MB per stream in interleaved 64KB writes, far past the pipe buffer, ends with a partial line
+INTERLEAVED_WRITES = """
+import sys
+line = 'x' * 1023 + '\\n'
+for i in range(32):
+    sys.stdout.write(line * 64)
+    sys.stdout.flush()
+    sys.stderr.write(line * 64)
+    sys.stderr.flush()
+sys.stdout.write('last stdout')
+sys.stderr.write('last stderr')
+sys.exit(5)
+"""
+
+def load_copy(name: str):
+    spec = importlib.util.spec_from_file_location(f"ansible_api_{name}", ANSIBLE_API_COPIES[name])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def definitions(path: str) -> dict:
+    with open(path) as file:
+        source = file.read()
+    return {node.name: ast.get_source_segment(source, node) for node in ast.parse(source).body
+            if getattr(node, 'name', None) in SHARED_DEFINITIONS}
+
+def run_with_timeout(func, timeout: float = 60):
+    """ func() in a thread, fails instead of hanging the suite when func deadlocks """
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(value=func()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "Process output reader deadlocked"
+    return result['value']
+
+def test_copies_are_identical():
+    deploy_copy, build_copy = (definitions(path) for path in ANSIBLE_API_COPIES.values())
+    assert sorted(deploy_copy) == sorted(SHARED_DEFINITIONS)
+    assert deploy_copy == build_copy
+
+@pytest.mark.parametrize('copy', sorted(ANSIBLE_API_COPIES))
+def test_interleaved_output(copy):
+    ansible_api = load_copy(copy)
+    stats = ansible_api.ProcessOutputStats()
+    stdout, stderr, return_code = run_with_timeout(lambda: ansible_api.run_process(
+        [sys.executable, '-c', INTERLEAVED_WRITES], None, return_output=True, stats=stats))
+    assert return_code == 5
+    for output, last_line in ((stdout, 'last stdout'), (stderr, 'last stderr')):
+        lines = output.split('\n')
+        assert len(lines) == 32 * 64 + 1
+        assert all(line == 'x' * 1023 for line in lines[:-1])
+        assert lines[-1] == last_line
+    assert stats.lines == {'stdout': 32 * 64 + 1, 'stderr': 32 * 64 + 1}
+    assert stats.bytes['stdout'] == len(stdout)
+
+@pytest.mark.parametrize('copy', sorted(ANSIBLE_API_COPIES))
+def test_arrival_order(copy):
+    ansible_api = load_copy(copy)
+    code = "import sys\nfor i in range(3):\n    print(i, flush=True)\n    print(i, file=sys.stderr, flush=True)\n"
+    process = ansible_api.subprocess.Popen([sys.executable, '-c', code], stdout=ansible_api.subprocess.PIPE,
+                                           stderr=ansible_api.subprocess.PIPE)
+    lines = run_with_timeout(lambda: list(ansible_api.read_process_lines(process)))
+    process.wait()
+    assert sorted(lines) == sorted([(stream, f'{i}\n') for i in range(3) for stream in ('stdout', 'stderr')])
+    assert [line for stream, line in lines if stream == 'stdout'] == ['0\n', '1\n', '2\n']
+
+@pytest.mark.parametrize('copy', sorted(ANSIBLE_API_COPIES))
+def test_return_code_only(copy):
+    ansible_api = load_copy(copy)
+    assert run_with_timeout(lambda: ansible_api.run_process([sys.executable, '-c', INTERLEAVED_WRITES], None)) == 5
@@ -0,0 +1,45 @@
+"""
+Desc: TEST deployment database read cache (read_cache.py), in memory and against fakeredis
+
+Usage: pytest test_read_cache.py
+"""
+import time
+import fakeredis
+import pytest
+from read_cache import TtlCache
+
+@pytest.fixture(params=['memory', 'redis'])
+def cache(request):
+    redis_client = fakeredis.FakeRedis(decode_responses=True)
+    return TtlCache("component", 30, (lambda: redis_client) if request.param == 'redis' else None)
+
+def test_get_set_invalidate(cache):
+    assert cache.get(('LCLS', 'comp')) == (False, None)
+    cache.set(('LCLS', 'comp'), {'tag': 'R1'})
+    assert cache.get(('LCLS', 'comp')) == (True, {'tag': 'R1'})
+    cache.invalidate(('LCLS', 'comp'))
+    assert cache.get(('LCLS', 'comp')) == (False, None)
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 2
+
+def test_not_found_is_cached(cache):
+    cache.set(('LCLS', 'missing'), None)
+    assert cache.get(('LCLS', 'missing')) == (True, None)
+
+def test_values_are_copies(cache):
+    cache.set(('LCLS', 'comp'), {'dependsOn': []})
+    found, component = cache.get(('LCLS', 'comp'))
+    component['dependsOn'].append({'name': 'sioc-1'})
+    assert cache.get(('LCLS', 'comp')) == (True, {'dependsOn': []})
+
+def test_memory_entries_expire():
+    cache = TtlCache("component", 0.05)
+    cache.set(('LCLS', 'comp'), {'tag': 'R1'})
+    time.sleep(0.1)
+    assert cache.get(('LCLS', 'comp')) == (False, None)
+
+def test_redis_errors_fall_through():
+    def broken_redis():
+        raise ConnectionError("redis down")
+    cache = TtlCache("component", 30, broken_redis)
+    cache.set(('LCLS', 'comp'), {'tag': 'R1'})
+    assert cache.get(('LCLS', 'comp')) == (False, None)
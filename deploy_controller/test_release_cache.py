@@ -0,0 +1,121 @@
+"""
+Desc: TEST release cache (release_cache.py), no backend needed
+
+Usage: pytest test_release_cache.py
+"""
+import os
+import threading
+from release_cache import ReleaseCache, link_tree, tree_index
+
+def make_fill(content: str, ok: bool = True):
+    """ fill_func writing a one file release """
+    def fill(tarball_path: str, tree_dir: str) -> bool:
+        if not ok:
+            return False
+        os.makedirs(os.path.join(tree_dir, 'R1', 'db'))
+        with open(os.path.join(tree_dir, 'R1', 'db', 'app.db'), 'w') as file:
+            file.write(content)
+        with open(tarball_path, 'w') as file:
+            file.write(content)
+        return True
+    return fill
+
+def test_fetch_fills_once_then_hits(tmp_path):
+    cache = ReleaseCache(str(tmp_path), 10**9)
+    calls = []
+    def fill(tarball_path, tree_dir):
+        calls.append(tarball_path)
+        return make_fill('x')(tarball_path, tree_dir)
+    first = cache.fetch('comp', 'R1', 'rocky9', fill)
+    second = cache.fetch('comp', 'R1', 'rocky9', fill)
+    assert len(calls) == 1
+    assert first == second
+    assert cache.members(first)[-1]['path'] == 'R1/db/app.db'
+
+def test_missing_release_is_not_cached(tmp_path):
+    cache = ReleaseCache(str(tmp_path), 10**9)
+    assert cache.fetch('comp', 'R1', None, make_fill('x', ok=False)) is None
+    assert cache.lookup('comp', 'R1') is None
+
+def test_cached_files_are_read_only(tmp_path):
+    cache = ReleaseCache(str(tmp_path), 10**9)
+    cached = cache.fetch('comp', 'R1', None, make_fill('x'))
+    mode = os.stat(os.path.join(cached.tree, 'R1', 'db', 'app.db')).st_mode
+    assert not mode & 0o222
+    assert cache.members(cached)[-1]['mode'] & 0o200 # Index keeps the released mode
+
+def test_evict_least_recently_used(tmp_path):
+    cache = ReleaseCache(str(tmp_path), 2500) # Room for two ~1KB objects (tarball + tree)
+    first = cache.fetch('comp', 'R1', None, make_fill('1' * 500))
+    second = cache.fetch('comp', 'R2', None, make_fill('2' * 500))
+    # Last use is the mtime of meta.json, set it explicitly: R1 is now more recent than R2
+    os.utime(os.path.join(os.path.dirname(second.tree), 'meta.json'), (1000, 1000))
+    os.utime(os.path.join(os.path.dirname(first.tree), 'meta.json'), (2000, 2000))
+    cache.fetch('comp', 'R3', None, make_fill('3' * 500))
+    assert cache.lookup('comp', 'R1') is not None
+    assert cache.lookup('comp', 'R2') is None
+    assert cache.lookup('comp', 'R3') is not None
+
+def test_pinned_objects_are_not_evicted(tmp_path):
+    cache = ReleaseCache(str(tmp_path), 1500)
+    first = cache.fetch('comp', 'R1', None, make_fill('1' * 500))
+    cache.pin('comp', 'LCLS', 'R1', [first.digest], keep=2)
+    cache.fetch('comp', 'R2', None, make_fill('2' * 500))
+    assert cache.lookup('comp', 'R1') is not None
+    assert cache.lookup('comp', 'R2') is not None # Kept as the object just filled, over budget
+
+def test_pins_keep_most_recent(tmp_path):
+    cache = ReleaseCache(str(tmp_path), 10**9)
+    for tag in ['R1', 'R2', 'R3']:
+        cache.pin('comp', 'LCLS', tag, [], keep=2)
+    cache.pin('comp', 'LCLS', 'R2', [], keep=2, details={'selective': True})
+    assert [pin['tag'] for pin in cache.pins('comp', 'LCLS')] == ['R2', 'R3']
+    assert cache.pins('comp', 'LCLS')[0]['details'] == {'selective': True}
+
+def test_evict_waits_for_readers(tmp_path):
+    cache = ReleaseCache(str(tmp_path), 10**9)
+    cached = cache.fetch('comp', 'R1', None, make_fill('1' * 500))
+    cache.max_bytes = 0
+    evicted = threading.Event()
+    def evict():
+        cache.evict()
+        evicted.set()
+    with cache.reading():
+        thread = threading.Thread(target=evict)
+        thread.start()
+        assert not evicted.wait(0.5) # Blocked while the tree is being linked
+        assert cache.is_present(cached)
+        link_tree(cached.tree, str(tmp_path / 'workspace'))
+    thread.join()
+    assert not cache.is_present(cached)
+    # Linked files outlive the evicted object
+    with open(tmp_path / 'workspace' / 'R1' / 'db' / 'app.db') as file:
+        assert file.read() == '1' * 500
+
+def test_link_tree_overlay_and_exclude(tmp_path):
+    for tree, content in (('a', 'first'), ('b', 'second')):
+        os.makedirs(tmp_path / tree / 'R1' / 'iocBoot' / 'sioc-1')
+        os.makedirs(tmp_path / tree / 'R1' / 'iocBoot' / 'sioc-2')
+        (tmp_path / tree / 'R1' / 'iocBoot' / 'sioc-1' / 'st.cmd').write_text(content)
+        (tmp_path / tree / 'R1' / 'iocBoot' / 'sioc-2' / 'st.cmd').write_text(content)
+    out = tmp_path / 'out'
+    link_tree(str(tmp_path / 'a'), str(out))
+    link_tree(str(tmp_path / 'b'), str(out), exclude={'R1/iocBoot/sioc-2'})
+    assert (out / 'R1' / 'iocBoot' / 'sioc-1' / 'st.cmd').read_text() == 'second'
+    assert (out / 'R1' / 'iocBoot' / 'sioc-2' / 'st.cmd').read_text() == 'first'
+
+def test_tree_index(tmp_path):
+    os.makedirs(tmp_path / 'R1' / 'db')
+    (tmp_path / 'R1' / 'db' / 'app.db').write_text('x')
+    os.symlink('app.db', tmp_path / 'R1' / 'db' / 'link')
+    members = {member['path']: member for member in tree_index(str(tmp_path))}
+    assert members['R1']['type'] == 'dir'
+    assert members['R1/db/app.db']['size'] == 1
+    assert members['R1/db/link'] == {'path': 'R1/db/link', 'type': 'symlink', 'size': 0,
+                                     'target': 'app.db', 'mode': members['R1/db/link']['mode']}
+
+def test_metadata_round_trip(tmp_path):
+    cache = ReleaseCache(str(tmp_path), 10**9)
+    assert cache.load_metadata('comp', 'R1', 'ioc_manifest.json') is None
+    cache.save_metadata('comp', 'R1', 'ioc_manifest.json', {'version': 1, 'iocs': []})
+    assert cache.load_metadata('comp', 'R1', 'ioc_manifest.json') == {'version': 1, 'iocs': []}
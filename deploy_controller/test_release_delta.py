@@ -0,0 +1,68 @@
+"""
+Desc: TEST file level release deltas (release_delta.py), no backend needed
+
+Usage: pytest test_release_delta.py
+"""
+import os
+import json
+import tarfile
+from release_cache import tree_index
+from release_delta import compute_delta, merge_members, same_member, write_delta
+
+def member(path: str, sha256: str = None, member_type: str = 'file', mode: int = 0o644, target: str = None) -> dict:
+    entry = {'path': path, 'type': member_type, 'size': 1 if member_type == 'file' else 0, 'mode': mode}
+    if sha256:
+        entry['sha256'] = sha256
+    if target:
+        entry['target'] = target
+    return entry
+
+def test_merge_members_strips_tag_and_overlays():
+    rhel7 = [member('R1', member_type='dir'), member('R1/db/a.db', 'rhel7'), member('R1/bin/app', 'rhel7')]
+    rocky9 = [member('R1', member_type='dir'), member('R1/bin/app', 'rocky9')]
+    merged = merge_members([rhel7, rocky9])
+    assert sorted(merged) == ['bin/app', 'db/a.db']
+    assert merged['bin/app']['sha256'] == 'rocky9'
+
+def test_same_member():
+    assert same_member(member('a', 'x'), member('a', 'x'))
+    assert not same_member(member('a', 'x'), member('a', 'y'))
+    assert not same_member(member('a', 'x'), member('a', 'x', mode=0o755))
+    assert not same_member(member('a', 'x'), member('a', member_type='symlink', target='b'))
+    assert not same_member(member('a', member_type='symlink', target='b'), member('a', member_type='symlink', target='c'))
+
+def test_compute_delta_changed_and_removed():
+    base = {'db/a.db': member('db/a.db', 'x'), 'db/old.db': member('db/old.db', 'o'), 'bin/app': member('bin/app', '1')}
+    new = {'db/a.db': member('db/a.db', 'x'), 'db/new.db': member('db/new.db', 'n'), 'bin/app': member('bin/app', '2')}
+    changed, removed = compute_delta(base, new)
+    assert changed == ['bin/app', 'db/new.db']
+    assert removed == ['db/old.db']
+
+def test_compute_delta_identical():
+    members = {'db/a.db': member('db/a.db', 'x')}
+    assert compute_delta(members, dict(members)) == ([], [])
+
+def test_write_delta(tmp_path):
+    release_dir = tmp_path / 'R2'
+    os.makedirs(release_dir / 'db')
+    (release_dir / 'db' / 'new.db').write_text('new')
+    os.chmod(release_dir / 'db' / 'new.db', 0o444) # Read-only like the release cache
+    os.symlink('new.db', release_dir / 'db' / 'link')
+    manifest = write_delta(str(release_dir), 'R2', 'R1', ['db/link', 'db/new.db'], ['db/old.db'], 5, 100,
+                           str(tmp_path / 'delta.tar.gz'), str(tmp_path / 'delta.json'))
+    assert manifest == json.load(open(tmp_path / 'delta.json'))
+    assert manifest['delta_bytes'] == 3 and manifest['removed'] == ['db/old.db'] and manifest['unchanged'] == 5
+    with tarfile.open(tmp_path / 'delta.tar.gz') as tar:
+        members = {tar_member.name: tar_member for tar_member in tar.getmembers()}
+    assert sorted(members) == ['R2/db/link', 'R2/db/new.db']
+    assert members['R2/db/link'].issym() and members['R2/db/link'].linkname == 'new.db'
+    assert members['R2/db/new.db'].mode & 0o200 # Owner write restored for the hosts
+
+def test_delta_from_tree_indexes(tmp_path):
+    for tag, content in (('R1', 'old'), ('R2', 'new')):
+        os.makedirs(tmp_path / tag / tag / 'db')
+        (tmp_path / tag / tag / 'db' / 'a.db').write_text('same')
+        (tmp_path / tag / tag / 'db' / f'{tag}.db').write_text(content)
+    base = merge_members([tree_index(str(tmp_path / 'R1'))])
+    new = merge_members([tree_index(str(tmp_path / 'R2'))])
+    assert compute_delta(base, new) == (['db/R2.db'], ['db/R1.db'])
@@ -0,0 +1,61 @@
+"""
+Desc: TEST deployment report store (report_store.py), no backend needed
+
+Usage: pytest test_report_store.py
+"""
+import gzip
+import time
+import sqlite3
+import pytest
+from report_store import ReportStore
+
+@pytest.fixture
+def store(tmp_path):
+    return ReportStore(str(tmp_path / 'reports' / 'reports.db'))
+
+def write_report(tmp_path, content: str) -> str:
+    path = tmp_path / 'report.log'
+    path.write_text(content)
+    return str(path)
+
+def test_save_and_read(store, tmp_path):
+    report_file = write_report(tmp_path, 'PLAY RECAP\n' * 100)
+    store.save('t1', 'comp', 'R1', 'alice', ['LCLS', 'FACET'], True, False, report_file)
+    metadata = store.get('t1')
+    assert metadata['facilities'] == ['LCLS', 'FACET'] and metadata['success'] is True
+    assert metadata['size'] == 1100 and metadata['compressed_size'] < metadata['size']
+    assert store.read('t1') == b'PLAY RECAP\n' * 100
+    assert gzip.decompress(store.read_compressed('t1')) == store.read('t1')
+    assert store.get('missing') is None and store.read('missing') is None
+
+def test_save_replaces_task_report(store, tmp_path):
+    store.save('t1', 'comp', 'R1', 'alice', ['LCLS'], False, False, write_report(tmp_path, 'first'))
+    store.save('t1', 'comp', 'R1', 'alice', ['FACET'], True, False, write_report(tmp_path, 'second'))
+    assert store.read('t1') == b'second'
+    assert store.search(facility='LCLS') == []
+    assert [report['task_id'] for report in store.search(facility='FACET')] == ['t1']
+
+def test_search_filters(store, tmp_path):
+    report_file = write_report(tmp_path, 'x')
+    store.save('t1', 'comp', 'R1', 'alice', ['LCLS'], True, False, report_file)
+    store.save('t2', 'comp', 'R2', 'bob', ['FACET'], True, False, report_file)
+    store.save('t3', 'other', 'R1', 'alice', ['LCLS'], True, False, report_file)
+    assert [report['task_id'] for report in store.search(component='comp')] == ['t2', 't1']
+    assert [report['task_id'] for report in store.search(user='alice', facility='LCLS', tag='R1')] == ['t3', 't1']
+    assert store.search(since=time.time() + 60) == []
+    assert len(store.search(limit=1)) == 1
+
+def test_prune(store, tmp_path):
+    store.save('t1', 'comp', 'R1', 'alice', ['LCLS'], True, False, write_report(tmp_path, 'x'))
+    assert store.prune(time.time() - 60) == 0
+    assert store.prune(time.time() + 60) == 1
+    assert store.search(facility='LCLS') == []
+
+def test_rollback_journal_by_default(store, tmp_path):
+    store.save('t1', 'comp', 'R1', 'alice', ['LCLS'], True, False, write_report(tmp_path, 'x'))
+    with sqlite3.connect(store.path) as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == 'delete'
+
+def test_invalid_journal_mode(tmp_path):
+    with pytest.raises(ValueError):
+        ReportStore(str(tmp_path / 'reports.db'), journal_mode='MEMORY')
@@ -0,0 +1,47 @@
+"""
+Desc: TEST revert fast path (revert_release_kept in deployment_controller.py), no backend needed
+
+Usage: pytest test_revert.py
+"""
+import os
+import pytest
+import deployment_controller as dc
+from release_cache import ReleaseCache
+
+def fill_release(tag: str, os_name: str):
+    def fill(tarball_path: str, tree_dir: str) -> bool:
+        os.makedirs(os.path.join(tree_dir, tag))
+        with open(os.path.join(tree_dir, tag, os_name), 'w') as file:
+            file.write(os_name)
+        with open(tarball_path, 'w') as file:
+            file.write(os_name)
+        return True
+    return fill
+
+@pytest.fixture
+def release_cache(tmp_path, monkeypatch):
+    cache = ReleaseCache(str(tmp_path / 'release_cache'), 10**9)
+    monkeypatch.setattr(dc, 'release_cache', cache)
+    for os_name in dc.USED_OS_LIST:
+        cache.fetch('comp', 'R1', os_name, fill_release('R1', os_name))
+    return cache
+
+def test_full_release_is_kept(release_cache):
+    dc.pin_deployed_release('comp', 'LCLS', 'R1')
+    assert dc.revert_release_kept('comp', 'LCLS', 'R1')
+    assert not dc.revert_release_kept('comp', 'FACET', 'R1')
+    assert not dc.revert_release_kept('comp', 'LCLS', 'R0')
+
+def test_selective_release_is_not_kept(release_cache):
+    dc.pin_deployed_release('comp', 'LCLS', 'R1', selective=True)
+    assert not dc.revert_release_kept('comp', 'LCLS', 'R1')
+
+def test_pin_without_details_is_not_kept(release_cache):
+    digests = [release_cache.lookup('comp', 'R1', os_name).digest for os_name in dc.USED_OS_LIST]
+    release_cache.pin('comp', 'LCLS', 'R1', digests, dc.REVERT_KEEP_RELEASES) # Pinned before selective was recorded
+    assert not dc.revert_release_kept('comp', 'LCLS', 'R1')
+
+def test_recached_release_is_not_kept(release_cache):
+    dc.pin_deployed_release('comp', 'LCLS', 'R1')
+    release_cache.pin('comp', 'LCLS', 'R1', ['other-digest'], dc.REVERT_KEEP_RELEASES, {'selective': False})
+    assert not dc.revert_release_kept('comp', 'LCLS', 'R1')
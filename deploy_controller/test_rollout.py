@@ -0,0 +1,64 @@
+"""
+Desc: TEST facility rollout scheduler (rollout.py)
+
+Usage: pytest test_rollout.py
+"""
+import time
+import threading
+from rollout import SKIPPED, plan_stages, run_rollout
+
+def test_plan_stages():
+    assert plan_stages(['LCLS', 'DEV', 'FACET'], ['DEV']) == [['DEV'], ['LCLS', 'FACET']]
+    assert plan_stages(['LCLS', 'FACET']) == [['LCLS', 'FACET']]
+    assert plan_stages(['DEV'], ['DEV']) == [['DEV']]
+
+def test_runs_facilities_in_parallel():
+    running, max_running = [0], [0]
+    lock = threading.Lock()
+    def deploy_facility(facility):
+        with lock:
+            running[0] += 1
+            max_running[0] = max(max_running[0], running[0])
+        time.sleep(0.1)
+        with lock:
+            running[0] -= 1
+        return f"{facility} output", True
+    done = []
+    results = run_rollout(['LCLS', 'FACET', 'TESTFAC', 'DEV'], deploy_facility, max_parallel=2,
+                          on_facility_done=lambda facility, count: done.append(count))
+    assert max_running[0] == 2
+    assert results['FACET'] == ("FACET output", True)
+    assert sorted(done) == [1, 2, 3, 4]
+
+def test_canary_stage_runs_first():
+    order = []
+    def deploy_facility(facility):
+        order.append(facility)
+        return "", True
+    run_rollout(['LCLS', 'FACET', 'DEV'], deploy_facility, max_parallel=4, canary_facilities=['DEV'])
+    assert order[0] == 'DEV'
+
+def test_abort_on_failure_skips_later_stages():
+    def deploy_facility(facility):
+        return "", facility != 'DEV'
+    results = run_rollout(['DEV', 'LCLS', 'FACET'], deploy_facility, canary_facilities=['DEV'], abort_on_failure=True)
+    assert results == {'DEV': ("", False), 'LCLS': SKIPPED, 'FACET': SKIPPED}
+
+def test_abort_on_failure_skips_queued_facilities():
+    started = []
+    def deploy_facility(facility):
+        started.append(facility)
+        return "", facility != 'LCLS'
+    results = run_rollout(['LCLS', 'FACET', 'TESTFAC'], deploy_facility, max_parallel=1, abort_on_failure=True)
+    assert started == ['LCLS']
+    assert results['FACET'] is SKIPPED and results['TESTFAC'] is SKIPPED
+
+def test_failure_without_abort_runs_everything():
+    results = run_rollout(['LCLS', 'FACET'], lambda facility: ("", facility == 'FACET'), max_parallel=1)
+    assert results == {'LCLS': ("", False), 'FACET': ("", True)}
+
+def test_exception_is_a_failed_facility():
+    def deploy_facility(facility):
+        raise RuntimeError("inventory missing")
+    output, success = run_rollout(['LCLS'], deploy_facility)['LCLS']
+    assert not success and "inventory missing" in output
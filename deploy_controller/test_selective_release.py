@@ -0,0 +1,57 @@
+"""
+Desc: TEST selective releases (unselected_release_paths in deployment_controller.py and the exclude of
+release_cache.link_tree), no backend needed
+
+Usage: pytest test_selective_release.py
+"""
+import os
+import deployment_controller as dc
+from release_cache import ReleaseCache, link_tree
+
+IOCS = [
+    {'folder_name': 'sioc-1', 'architecture': 'rhel7-x86_64', 'binary': 'app', 'boot_dir': 'iocBoot'},
+    {'folder_name': 'ioc-2', 'architecture': 'linuxRT-x86_64', 'binary': 'app', 'boot_dir': 'iocBoot'},
+    {'folder_name': 'cpu-3', 'architecture': 'rhel7-x86_64', 'binary': 'app', 'boot_dir': 'cpuBoot'},
+]
+RELEASE_FILES = ['iocBoot/sioc-1/st.cmd', 'iocBoot/ioc-2/st.cmd', 'cpuBoot/cpu-3/st.cmd',
+                 'bin/rhel7-x86_64/app', 'bin/linuxRT-x86_64/app', 'lib/linuxRT-x86_64/libapp.so',
+                 'db/app.db', 'dbd/app.dbd']
+
+def make_release(tree_dir: str, tag: str = 'R1'):
+    for path in RELEASE_FILES:
+        os.makedirs(os.path.join(tree_dir, tag, os.path.dirname(path)), exist_ok=True)
+        with open(os.path.join(tree_dir, tag, path), 'w') as file:
+            file.write(path)
+
+def released_files(release_dir: str) -> list:
+    return sorted(os.path.relpath(os.path.join(root, name), release_dir)
+                  for root, _, files in os.walk(release_dir) for name in files)
+
+def test_excludes_unselected_iocs(tmp_path):
+    make_release(str(tmp_path / 'tree'))
+    excluded = dc.unselected_release_paths('R1', IOCS, ['sioc-1'])
+    assert excluded == {'R1/iocBoot/ioc-2', 'R1/cpuBoot/cpu-3', 'R1/bin/linuxRT-x86_64', 'R1/lib/linuxRT-x86_64'}
+    link_tree(str(tmp_path / 'tree'), str(tmp_path / 'out'), exclude=excluded)
+    assert released_files(str(tmp_path / 'out' / 'R1')) == [
+        'bin/rhel7-x86_64/app', 'db/app.db', 'dbd/app.dbd', 'iocBoot/sioc-1/st.cmd']
+
+def test_shared_arch_dirs_are_kept():
+    excluded = dc.unselected_release_paths('R1', IOCS, ['ioc-2', 'cpu-3'])
+    assert excluded == {'R1/iocBoot/sioc-1'} # rhel7-x86_64 is still needed by cpu-3
+
+def test_ioc_missing_from_manifest():
+    assert dc.unselected_release_paths('R1', IOCS, ['sioc-1', 'sioc-9']) is None
+
+def test_missing_ioc_gets_full_release(tmp_path, monkeypatch):
+    cache = ReleaseCache(str(tmp_path / 'release_cache'), 10**9)
+    monkeypatch.setattr(dc, 'release_cache', cache)
+    monkeypatch.setattr(dc, 'USED_OS_LIST', ['rhel7'])
+    def fill(tarball_path: str, tree_dir: str) -> bool:
+        make_release(tree_dir)
+        open(tarball_path, 'w').close()
+        return True
+    cache.fetch('comp', 'R1', 'rhel7', fill)
+    cache.save_metadata('comp', 'R1', dc.IOC_MANIFEST_NAME, dc.new_ioc_manifest(IOCS))
+    assert dc.download_release('comp', 'R1', str(tmp_path / 'out'), all_os=True, extract_tarball=True,
+                               merged_format='directory', ioc_names=['sioc-9'], cached_only=True)
+    assert released_files(str(tmp_path / 'out' / 'R1')) == sorted(RELEASE_FILES)
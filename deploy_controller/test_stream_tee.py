@@ -0,0 +1,118 @@
+"""
+Desc: TEST extracting releases while they download (StreamTee, download_release_helper and
+fetch_release_to_cache in deployment_controller.py) with a fake backend response
+
+Usage: pytest test_stream_tee.py
+"""
+import io
+import os
+import tarfile
+import pytest
+import requests
+import deployment_controller as dc
+from release_cache import ReleaseCache, tree_index
+
+RELEASE_FILES = {'R1/db/app.db': b'record(ai, "X") {}\n' * 200, 'R1/bin/rhel7-x86_64/app': os.urandom(50000),
+                 'R1/iocBoot/sioc-1/st.cmd': b'#!../../bin/rhel7-x86_64/app\n'}
+
+def make_tarball(tmp_path) -> bytes:
+    source = tmp_path / 'source'
+    for path, content in RELEASE_FILES.items():
+        os.makedirs(source / os.path.dirname(path), exist_ok=True)
+        (source / path).write_bytes(content)
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        tar.add(source / 'R1', arcname='R1')
+    return buffer.getvalue()
+
+class FakeResponse(object):
+    def __init__(self, body: bytes, status_code: int = 200, fail_after: int = None):
+        self.body = body
+        self.status_code = status_code
+        self.fail_after = fail_after # Bytes sent before the connection drops
+        self.closed = False
+
+    def iter_content(self, chunk_size: int):
+        chunk_size = 777 # Small odd chunks, so reads straddle chunk boundaries
+        for start in range(0, len(self.body), chunk_size):
+            if self.fail_after is not None and start >= self.fail_after:
+                raise requests.exceptions.ChunkedEncodingError("Connection broken")
+            yield self.body[start:start + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+class FakeHttpClient(object):
+    def __init__(self, response: FakeResponse):
+        self.response = response
+
+    def get(self, url: str, endpoint_name: str = None, **kwargs) -> FakeResponse:
+        assert kwargs.get('stream')
+        return self.response
+
+@pytest.fixture
+def release_cache(tmp_path, monkeypatch):
+    cache = ReleaseCache(str(tmp_path / 'release_cache'), 10**9)
+    monkeypatch.setattr(dc, 'release_cache', cache)
+    return cache
+
+def serve(monkeypatch, response: FakeResponse) -> FakeResponse:
+    monkeypatch.setattr(dc, 'http_client', FakeHttpClient(response))
+    return response
+
+def test_stream_tee_reads_and_copies():
+    copy = io.BytesIO()
+    stream = dc.StreamTee([b'abc', b'', b'defg', b'hi'], copy)
+    assert stream.read(2) == b'ab'
+    assert stream.read(4) == b'cdef'
+    assert copy.getvalue() == b'abcdefg' # Only what was needed so far
+    stream.drain()
+    assert copy.getvalue() == b'abcdefghi'
+
+def test_stream_tee_read_all():
+    copy = io.BytesIO()
+    stream = dc.StreamTee(iter([b'abc', b'def']), copy)
+    assert stream.read(1) == b'a'
+    assert stream.read() == b'bcdef'
+    assert copy.getvalue() == b'abcdef'
+
+def test_cached_tarball_and_tree_match(tmp_path, release_cache, monkeypatch):
+    tarball = make_tarball(tmp_path)
+    response = serve(monkeypatch, FakeResponse(tarball))
+    cached = dc.fetch_release_to_cache('comp', 'R1', 'rhel7', 'https://backend/release/R1?os=rhel7')
+    assert response.closed
+    with open(cached.tarball, 'rb') as file:
+        assert file.read() == tarball # Including the gzip trailer tarfile doesn't read
+    for path, content in RELEASE_FILES.items():
+        with open(os.path.join(cached.tree, path), 'rb') as file:
+            assert file.read() == content
+    extracted = tmp_path / 'extracted'
+    with tarfile.open(cached.tarball) as tar:
+        tar.extractall(extracted, filter='data')
+    assert [member['path'] for member in tree_index(str(extracted))] == \
+           [member['path'] for member in release_cache.members(cached)]
+
+def test_mid_stream_failure_leaves_no_cache_entry(tmp_path, release_cache, monkeypatch):
+    tarball = make_tarball(tmp_path)
+    response = serve(monkeypatch, FakeResponse(tarball, fail_after=len(tarball) // 2))
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        dc.fetch_release_to_cache('comp', 'R1', 'rhel7', 'https://backend/release/R1?os=rhel7')
+    assert response.closed
+    assert release_cache.lookup('comp', 'R1', 'rhel7') is None
+    assert os.listdir(release_cache.objects_dir) == [] and os.listdir(release_cache.tmp_dir) == []
+    # The next fetch downloads again
+    serve(monkeypatch, FakeResponse(tarball))
+    assert dc.fetch_release_to_cache('comp', 'R1', 'rhel7', 'https://backend/release/R1?os=rhel7')
+
+def test_corrupt_tarball_leaves_no_cache_entry(release_cache, monkeypatch):
+    serve(monkeypatch, FakeResponse(b'not a tarball' * 100))
+    with pytest.raises(tarfile.TarError):
+        dc.fetch_release_to_cache('comp', 'R1', 'rhel7', 'https://backend/release/R1?os=rhel7')
+    assert release_cache.lookup('comp', 'R1', 'rhel7') is None
+    assert os.listdir(release_cache.tmp_dir) == []
+
+def test_missing_release(release_cache, monkeypatch):
+    response = serve(monkeypatch, FakeResponse(b'', status_code=404))
+    assert dc.fetch_release_to_cache('comp', 'R9', 'rhel7', 'https://backend/release/R9?os=rhel7') is None
+    assert response.closed
+    assert release_cache.lookup('comp', 'R9', 'rhel7') is None
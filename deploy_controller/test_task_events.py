@@ -0,0 +1,70 @@
+"""
+Desc: TEST task records and progress events (save_task, get_task, format_task_event and
+GET /deployment/{task_id}/events in deployment_controller.py) against fakeredis
+
+Usage: pytest test_task_events.py
+"""
+import json
+import fakeredis
+import pytest
+from fastapi.testclient import TestClient
+import deployment_controller as dc
+
+@pytest.fixture
+def redis_client(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(dc, 'redis_client', client)
+    return client
+
+def event_lines(response) -> list:
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+def test_task_round_trip(redis_client):
+    task = dc.DeploymentTask('t1', save_callback=dc.save_task)
+    dc.save_task(task)
+    task.update_progress("Downloading release artifacts", 25, "R1")
+    loaded = dc.get_task('t1')
+    assert loaded.status == 'running'
+    assert loaded.progress == {"current_step": "Downloading release artifacts", "percent": 25, "details": "R1"}
+    assert loaded.started_at == task.started_at and loaded.result is None
+    assert 0 < redis_client.ttl(dc.task_key('t1')) <= dc.TASK_TTL
+    assert dc.get_task('missing') is None
+
+def test_update_only_writes_changed_fields(redis_client):
+    task = dc.DeploymentTask('t1', save_callback=dc.save_task)
+    dc.save_task(task)
+    task.update_progress("Deploying", 40)
+    _, values = redis_client.xrange(dc.task_events_key('t1'))[-1]
+    assert sorted(values) == ["progress", "status", "updated_at"]
+
+def test_format_task_event():
+    result = {"summary": "ok", "elog_url": "https://elog/1", "elog_status": "sent", "output": "x" * 1000}
+    event = dc.format_task_event('1-0', {"status": json.dumps("completed"), "result": json.dumps(result)})
+    assert event == {"event_id": '1-0', "status": "completed",
+                     "result": {"summary": "ok", "elog_url": "https://elog/1", "elog_status": "sent"}}
+    assert dc.format_task_event('2-0', {"result": json.dumps(None)}) == {"event_id": '2-0', "result": None}
+
+def run_task(task_id: str) -> list:
+    """ Save a task through to completion, return its event ids """
+    task = dc.DeploymentTask(task_id, save_callback=dc.save_task)
+    dc.save_task(task)
+    task.update_progress("Deploying", 40)
+    task.complete({"summary": "done", "elog_status": "sent"})
+    return [event_id for event_id, _ in dc.redis_client.xrange(dc.task_events_key(task_id))]
+
+def test_events_replay_until_completed(redis_client):
+    event_ids = run_task('t1')
+    events = event_lines(TestClient(dc.app).get('/deployment/t1/events'))
+    assert [event['event_id'] for event in events] == event_ids
+    assert events[-1]['status'] == 'completed' and events[-1]['result']['summary'] == 'done'
+
+def test_events_resume_after_last_event_id(redis_client):
+    event_ids = run_task('t1')
+    client = TestClient(dc.app)
+    resumed = event_lines(client.get('/deployment/t1/events', headers={'Last-Event-ID': event_ids[1]}))
+    assert [event['event_id'] for event in resumed] == event_ids[2:]
+    resumed = event_lines(client.get('/deployment/t1/events', params={'last_event_id': event_ids[0]}))
+    assert [event['event_id'] for event in resumed] == event_ids[1:]
+
+def test_events_unknown_task(redis_client):
+    assert TestClient(dc.app).get('/deployment/missing/events').status_code == 404
@@ -0,0 +1,73 @@
+"""
+Desc: TEST task workspaces (workspace.py) against fakeredis
+
+Usage: pytest test_workspace.py
+"""
+import os
+import time
+import fakeredis
+import pytest
+from workspace import WorkspaceManager
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+@pytest.fixture
+def workspaces(tmp_path, redis_client):
+    return WorkspaceManager(str(tmp_path), lambda: redis_client, linger=60, max_age=3600, heartbeat_timeout=300)
+
+def age_workspace(redis_client, task_id: str, seconds: float, heartbeat_age: float = None):
+    """ Pretend the workspace was created seconds ago (and last heartbeat heartbeat_age seconds ago) """
+    now = time.time()
+    redis_client.hset(f"workspace:{task_id}", mapping={
+        "created_at": now - seconds, "heartbeat_at": now - (seconds if heartbeat_age is None else heartbeat_age)})
+
+def test_lingers_after_last_release(workspaces, redis_client):
+    path = workspaces.create('t1')
+    assert workspaces.acquire('t1') # Report download
+    workspaces.release('t1')
+    assert workspaces.sweep() == 0
+    workspaces.release('t1')
+    assert workspaces.sweep() == 0 # Still lingering
+    redis_client.hset("workspace:t1", "expires_at", time.time() - 1)
+    assert workspaces.sweep() == 1
+    assert not os.path.exists(path)
+    assert not workspaces.acquire('t1')
+
+def test_max_age_keeps_live_holder(workspaces, redis_client):
+    path = workspaces.create('t1')
+    age_workspace(redis_client, 't1', 7200, heartbeat_age=10)
+    assert workspaces.sweep() == 0
+    assert os.path.isdir(path)
+
+def test_max_age_deletes_dead_holder(workspaces, redis_client):
+    workspaces.create('t1')
+    age_workspace(redis_client, 't1', 7200, heartbeat_age=600)
+    assert workspaces.sweep() == 1
+
+def test_max_age_deletes_unreferenced(workspaces, redis_client):
+    workspaces.create('t1')
+    workspaces.release('t1')
+    age_workspace(redis_client, 't1', 7200, heartbeat_age=0)
+    assert workspaces.sweep() == 1
+
+def test_heartbeat(workspaces, redis_client):
+    workspaces.create('t1')
+    age_workspace(redis_client, 't1', 7200, heartbeat_age=600)
+    workspaces.heartbeat('t1')
+    assert workspaces.sweep() == 0
+
+def test_unknown_workspace_uses_dir_age(workspaces, tmp_path):
+    os.makedirs(tmp_path / 'orphan')
+    assert workspaces.sweep() == 0
+    os.utime(tmp_path / 'orphan', (time.time() - 7200, time.time() - 7200))
+    assert workspaces.sweep() == 1
+
+def test_prune_keeps_report(workspaces):
+    path = workspaces.create('t1')
+    os.makedirs(os.path.join(path, 'R1'))
+    report = os.path.join(path, 'report.log')
+    open(report, 'w').close()
+    workspaces.prune('t1', keep=[report])
+    assert os.listdir(path) == ['report.log']
@@ -0,0 +1,157 @@
+"""
+Desc: Per-task temp workspaces (/app/tmp/<task_id>) for the deployment controller, with reference counting.
+
+A running deployment holds a reference to its workspace, and so does a report download while the file is
+being sent. When the last reference is released the workspace lingers for `linger` seconds (so the report
+can still be downloaded), then the janitor (sweep()) deletes it. A running deployment also heartbeats its
+workspace (holding()). Workspaces older than max_age are deleted once unreferenced, or when their holder stopped
+heartbeating for heartbeat_timeout seconds, so a crashed worker can't leak disk while long deployments keep theirs.
+
+Reference counts live in redis (workspace:<task_id> hash) since the deployment, the report download and the
+janitor can each run in a different uvicorn worker.
+"""
+import os
+import time
+import uuid
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from release_cache import directory_size
+
+class WorkspaceManager(object):
+    def __init__(self, root: str, redis_getter, linger: int = 600, max_age: int = 6 * 3600,
+                 heartbeat_timeout: int = 300):
+        """ redis_getter: callable returning the redis client, resolved on every call """
+        self.root = root
+        self.redis_getter = redis_getter
+        self.linger = linger
+        self.max_age = max_age
+        self.heartbeat_timeout = heartbeat_timeout
+
+    def path(self, task_id: str) -> str:
+        return os.path.join(self.root, task_id)
+
+    def _key(self, task_id: str) -> str:
+        return f"workspace:{task_id}"
+
+    def create(self, task_id: str) -> str:
+        """ Create the workspace holding one reference (the deployment's), return its path """
+        path = self.path(task_id)
+        os.makedirs(path, exist_ok=True)
+        pipe = self.redis_getter().pipeline()
+        now = time.time()
+        pipe.hset(self._key(task_id), mapping={"refs": 1, "created_at": now, "heartbeat_at": now, "expires_at": 0})
+        pipe.expire(self._key(task_id), self.max_age)
+        pipe.execute()
+        return path
+
+    def heartbeat(self, task_id: str):
+        """ Mark the workspace as still in use by a live holder """
+        pipe = self.redis_getter().pipeline()
+        pipe.hset(self._key(task_id), "heartbeat_at", time.time())
+        pipe.expire(self._key(task_id), self.max_age + self.heartbeat_timeout)
+        pipe.execute()
+
+    @contextmanager
+    def holding(self, task_id: str):
+        """ Heartbeat the workspace from a background thread while the block runs (ex: the deployment) """
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(max(1.0, self.heartbeat_timeout / 3)):
+                try:
+                    self.heartbeat(task_id)
+                except Exception as e: # Redis hiccup, the next beat may still land in time
+                    logging.warning(f"Heartbeat for workspace {task_id} failed: {e}")
+        thread = threading.Thread(target=beat, name=f"workspace-{task_id}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def acquire(self, task_id: str) -> bool:
+        """ Take a reference, returns False if the workspace is gone """
+        if not os.path.isdir(self.path(task_id)):
+            return False
+        self.redis_getter().hincrby(self._key(task_id), "refs", 1)
+        return True
+
+    def release(self, task_id: str):
+        """ Drop a reference. The last one schedules the workspace for deletion after the linger time """
+        client = self.redis_getter()
+        refs = client.hincrby(self._key(task_id), "refs", -1)
+        if refs <= 0:
+            client.hset(self._key(task_id), "expires_at", time.time() + self.linger)
+            logging.debug(f"Workspace {task_id} released, deleting after {self.linger}s")
+
+    def prune(self, task_id: str, keep: list = None):
+        """ Delete everything in the workspace except the keep paths (ex: the report once deployed) """
+        path = self.path(task_id)
+        keep = set(os.path.abspath(file) for file in (keep or []))
+        if not os.path.isdir(path):
+            return
+        for name in os.listdir(path):
+            entry = os.path.join(path, name)
+            if os.path.abspath(entry) in keep:
+                continue
+            if os.path.isdir(entry) and not os.path.islink(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            else:
+                try:
+                    os.remove(entry)
+                except OSError as e:
+                    logging.warning(f"Unable to prune {entry}: {e}")
+
+    def _delete(self, task_id: str):
+        # Rename first so a concurrent acquire() sees the workspace as gone
+        trash = os.path.join(self.root, f".delete-{task_id}-{uuid.uuid4().hex}")
+        try:
+            os.rename(self.path(task_id), trash)
+        except OSError:
+            return
+        logging.info(f"Deleting workspace {task_id}")
+        shutil.rmtree(trash, ignore_errors=True)
+        self.redis_getter().delete(self._key(task_id))
+
+    def sweep(self) -> int:
+        """ Delete released workspaces past their linger time, and workspaces past max_age that are
+            unreferenced or whose holder stopped heartbeating. Returns the number of workspaces deleted """
+        if not os.path.isdir(self.root):
+            return 0
+        now = time.time()
+        deleted = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(".delete-"): # Left behind by an interrupted delete
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            if not os.path.isdir(path):
+                continue
+            state = self.redis_getter().hgetall(self._key(name))
+            try:
+                age = now - os.path.getmtime(path)
+            except OSError:
+                continue
+            if not state:
+                expired = age > self.max_age # Unknown to redis (ex: redis restarted), fall back to the dir age
+            else:
+                refs = int(state.get("refs", 0))
+                expires_at = float(state.get("expires_at", 0))
+                created_at = float(state.get("created_at", now))
+                heartbeat_stale = now - float(state.get("heartbeat_at", created_at)) > self.heartbeat_timeout
+                expired = (refs <= 0 and expires_at and expires_at <= now) or \
+                          (now - created_at > self.max_age and (refs <= 0 or heartbeat_stale))
+            if expired:
+                self._delete(name)
+                deleted += 1
+        return deleted
+
+    def usage(self) -> dict:
+        """ Return {task_id: bytes} for every workspace on disk """
+        if not os.path.isdir(self.root):
+            return {}
+        return {name: directory_size(os.path.join(self.root, name)) for name in os.listdir(self.root)
+                if os.path.isdir(os.path.join(self.root, name)) and not name.startswith(".delete-")}